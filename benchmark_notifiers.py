@@ -0,0 +1,510 @@
+"""
+Banc d'essai des notifiers (Twitch, YouTube, ancien cog YouTube) face à des faux services en mémoire.
+
+Chaque notifier est chargé tel quel, mais :
+  - MongoDB est remplacé par mongomock (pip install mongomock) ;
+  - Helix est servi par le faux Twitch de twitch_eventsub.py, les flux Atom par le serveur de youtube_feeds.py,
+    les pages de chaîne (ancien cog) par un serveur local, et l'API YouTube Data par un faux client ;
+  - les messages Discord sont envoyés dans un puits qui se contente de les compter.
+Pour chaque taille (nombre de créateurs suivis), trois passes de la boucle sont mesurées :
+  - cold : premier passage (initialisation, premières notifications) ;
+  - steady : rien n'a changé ;
+  - churn : une partie des créateurs lance un live / publie une vidéo.
+Mesures : durée de la passe, appels par API, messages Discord, temps de blocage de la boucle d'événements
+et mémoire. Le résultat est écrit en JSON pour comparer les versions entre elles.
+
+Usage :
+    python benchmark_notifiers.py --creators 10 1000 10000 --output benchmark.json
+    python benchmark_notifiers.py --notifiers twitch --creators 1000 --memory
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import platform
+import importlib
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from aiohttp import web
+
+NOTIFIERS = ("twitch", "youtube", "legacy")
+PHASES = ("cold", "steady", "churn")
+LOOP_PROBE_INTERVAL = 0.005 # secondes
+LOOP_BLOCK_THRESHOLD = 0.01 # Un retard de réveil au-delà de ce seuil compte comme du blocage
+LEGACY_PAGE_SIZE = 600 * 1024 # Taille approximative d'une page de chaîne YouTube
+LEGACY_VIDEO_ID_OFFSET = 0.3 # Position du premier "videoId" dans la page
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def max_rss_kib() -> int | None:
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+# --- Faux Discord ---
+
+class SinkMessage:
+    def __init__(self, sink, channel, message_id: int):
+        self.sink = sink
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, **kwargs):
+        self.sink.counts["edit"] += 1
+        return self
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+    async def publish(self):
+        self.sink.counts["publish"] += 1
+
+
+class SinkChannel:
+    def __init__(self, sink, channel_id: int):
+        self.sink = sink
+        self.id = channel_id
+        self.guild = None # Serveur hors cache : mentions de rôles brutes, comme en mode cluster
+
+    async def send(self, content=None, **kwargs):
+        self.sink.counts["send"] += 1
+        self.sink.next_id += 1
+        return SinkMessage(self.sink, self, self.sink.next_id)
+
+    def get_partial_message(self, message_id: int) -> SinkMessage:
+        return SinkMessage(self.sink, self, message_id)
+
+
+class DiscordSink:
+    def __init__(self):
+        self.counts = Counter()
+        self.next_id = 0
+
+    def channel(self, channel_id) -> SinkChannel:
+        return SinkChannel(self, int(channel_id))
+
+
+class BenchmarkLoop:
+    """Boucle du faux bot : les tâches lancées par les cogs (bot.loop.create_task) sont gardées pour être attendues explicitement."""
+    def __init__(self, loop):
+        self.loop = loop
+        self.deferred = []
+
+    def create_task(self, coro):
+        self.deferred.append(coro)
+        return coro
+
+    def __getattr__(self, name):
+        return getattr(self.loop, name)
+
+
+class BenchmarkBot:
+    def __init__(self, loop):
+        self.loop = BenchmarkLoop(loop)
+        self.sink = DiscordSink()
+
+    def get_channel(self, channel_id):
+        return self.sink.channel(channel_id)
+
+    def get_partial_messageable(self, channel_id, guild_id=None, type=None):
+        return self.sink.channel(channel_id)
+
+    def get_guild(self, guild_id):
+        return None
+
+    async def wait_until_ready(self):
+        pass
+
+    async def run_deferred(self):
+        while self.loop.deferred:
+            await self.loop.deferred.pop(0)
+
+
+# --- Faux services ---
+
+class BenchmarkTwitchAuth:
+    """Remplace twitchAPI.Twitch : jeton d'application fixe, aucune requête."""
+    app_id = "benchmark"
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __await__(self):
+        return self.ready().__await__()
+
+    async def ready(self):
+        return self
+
+    async def authenticate_app(self, scope):
+        pass
+
+    def get_app_token(self) -> str:
+        return "benchmark-token"
+
+    async def refresh_used_token(self):
+        pass
+
+
+class FakeYouTubeRequest:
+    def __init__(self, api, method_id: str, params: dict):
+        self.api = api
+        self.methodId = f"youtube.{method_id}"
+        self.params = params
+
+    def execute(self, http=None) -> dict:
+        self.api.calls[self.methodId] += 1
+        return self.api.respond(self.methodId.removeprefix("youtube."), self.params)
+
+
+class FakeYouTubeResource:
+    def __init__(self, api, name: str):
+        self.api = api
+        self.name = name
+
+    def list(self, **params) -> FakeYouTubeRequest:
+        return FakeYouTubeRequest(self.api, f"{self.name}.list", params)
+
+
+class FakeYouTubeAPI:
+    """Remplace le client googleapiclient : répond à partir des vidéos publiées sur le serveur de flux local."""
+    def __init__(self):
+        self.calls = Counter()
+        self.known_videos = {} # {video_id: (channel_id, titre, date)}
+        self.latest = {} # {channel_id: video_id}
+
+    def add_video(self, channel_id: str, video_id: str, title: str, published: datetime):
+        self.known_videos[video_id] = (channel_id, title, published)
+        self.latest[channel_id] = video_id
+
+    def snippet(self, video_id: str) -> dict:
+        channel_id, title, published = self.known_videos[video_id]
+        return {"title": title, "description": title, "publishedAt": published.isoformat().replace("+00:00", "Z"), "channelId": channel_id}
+
+    def respond(self, method: str, params: dict) -> dict:
+        if method == "videos.list":
+            return {"items": [{"id": params["id"], "snippet": self.snippet(params["id"])}] if params["id"] in self.known_videos else []}
+        if method == "playlistItems.list":
+            video_id = self.latest.get("UC" + params["playlistId"][2:])
+            return {"items": [{"snippet": self.snippet(video_id), "contentDetails": {"videoId": video_id}}] if video_id else []}
+        if method == "channels.list":
+            return {"items": [{"id": params["id"], "snippet": {"title": params["id"]}, "contentDetails": {"relatedPlaylists": {"uploads": "UU" + params["id"][2:]}}}]}
+        return {"items": []}
+
+    def videos(self) -> FakeYouTubeResource:
+        return FakeYouTubeResource(self, "videos")
+
+    def channels(self) -> FakeYouTubeResource:
+        return FakeYouTubeResource(self, "channels")
+
+    def playlistItems(self) -> FakeYouTubeResource:
+        return FakeYouTubeResource(self, "playlistItems")
+
+    def search(self) -> FakeYouTubeResource:
+        return FakeYouTubeResource(self, "search")
+
+
+class ChannelPageFixture:
+    """Pages de chaîne (onglets vidéos / shorts) pour l'ancien cog : remplissage, puis le "videoId" le plus récent."""
+    def __init__(self):
+        self.latest = {} # {(channel_id, onglet): video_id}
+        before = int(LEGACY_PAGE_SIZE * LEGACY_VIDEO_ID_OFFSET)
+        self.head = b"<html>" + b" " * before
+        self.tail = b" " * (LEGACY_PAGE_SIZE - before) + b"</html>"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        video_id = self.latest.get((request.match_info["channel_id"], request.match_info["tab"]))
+        if video_id is None:
+            return web.Response(body=self.head + self.tail, content_type="text/html")
+        return web.Response(body=self.head + f'"videoId":"{video_id}"'.encode() + self.tail, content_type="text/html")
+
+    def upload(self, channel_id: str, tab: str):
+        self.latest[(channel_id, tab)] = f"{tab[0]}{time.time_ns() % 10 ** 10:010d}"
+
+
+def counting_middleware(counter: Counter, name: str):
+    @web.middleware
+    async def count(request, handler):
+        counter[name] += 1
+        return await handler(request)
+    return count
+
+
+async def serve(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+# --- Mesures ---
+
+class LoopMonitor:
+    """Mesure le blocage de la boucle d'événements : retard de réveil d'une tâche qui dort à intervalle fixe."""
+    def __init__(self):
+        self.blocked = 0.0
+        self.max_lag = 0.0
+        self.task = None
+
+    async def probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_PROBE_INTERVAL)
+            lag = loop.time() - started - LOOP_PROBE_INTERVAL
+            self.max_lag = max(self.max_lag, lag)
+            if lag > LOOP_BLOCK_THRESHOLD:
+                self.blocked += lag
+
+    def __enter__(self):
+        self.task = asyncio.create_task(self.probe())
+        return self
+
+    def __exit__(self, *exc):
+        self.task.cancel()
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.calls = Counter() # Requêtes reçues par les faux services HTTP
+        self.ports = {"helix": free_port(), "feeds": free_port(), "pages": free_port()}
+        self.runners = []
+        self.results = []
+
+    def configure_environment(self):
+        """Variables lues à l'import des modules : à définir avant de charger les notifiers."""
+        os.environ.update({
+            "MONGO_URI": "mongodb://benchmark",
+            "TWITCH_CLIENT_ID": "benchmark",
+            "TWITCH_CLIENT_SECRET": "benchmark",
+            "YOUTUBE_API_KEY": "benchmark",
+            "TWITCH_HELIX_URL": f"http://127.0.0.1:{self.ports['helix']}/helix",
+            "YOUTUBE_FEED_URL": f"http://127.0.0.1:{self.ports['feeds']}/feeds/videos.xml",
+            "YOUTUBE_CHANNEL_URL": f"http://127.0.0.1:{self.ports['pages']}/channel",
+        })
+        # Mode polling : les récepteurs push ne font pas partie de la mesure
+        for name in ("TWITCH_EVENTSUB_CALLBACK", "TWITCH_EVENTSUB_SECRET", "YOUTUBE_WEBSUB_CALLBACK", "YOUTUBE_WEBSUB_SECRET"):
+            os.environ.pop(name, None)
+
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("mongomock est requis pour le banc d'essai : pip install mongomock")
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient # Avant l'import des cogs, qui font "from pymongo import MongoClient"
+
+    async def start_services(self):
+        from twitch_eventsub import FakeTwitch
+        from youtube_feeds import FeedFixtureServer
+
+        self.fake_twitch = FakeTwitch(callback="http://127.0.0.1:9/unused", secret="benchmark")
+        self.fake_twitch.points = 10 ** 9 # Le banc mesure le notifier, pas la limite de débit du faux Twitch
+        helix_app = self.fake_twitch.app()
+        helix_app.middlewares.insert(0, counting_middleware(self.calls, "helix"))
+
+        self.feed_fixture = FeedFixtureServer()
+        feeds_app = web.Application(middlewares=[counting_middleware(self.calls, "feeds")])
+        feeds_app.router.add_get("/feeds/videos.xml", self.feed_fixture.handle)
+
+        self.page_fixture = ChannelPageFixture()
+        pages_app = web.Application(middlewares=[counting_middleware(self.calls, "pages")])
+        pages_app.router.add_get("/channel/{channel_id}/{tab}", self.page_fixture.handle)
+
+        for app, name in ((helix_app, "helix"), (feeds_app, "feeds"), (pages_app, "pages")):
+            self.runners.append(await serve(app, self.ports[name]))
+
+    async def stop_services(self):
+        for runner in self.runners:
+            await runner.cleanup()
+
+    async def measure(self, notifier: str, creators: int, phase: str, poll, bot: BenchmarkBot, api_calls=lambda: {}):
+        self.calls.clear()
+        bot.sink.counts.clear()
+        if self.args.memory:
+            tracemalloc.start()
+        with LoopMonitor() as monitor:
+            started = time.perf_counter()
+            await poll()
+            duration = time.perf_counter() - started
+        peak = None
+        if self.args.memory:
+            peak = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+
+        result = {
+            "notifier": notifier,
+            "creators": creators,
+            "phase": phase,
+            "duration_s": round(duration, 4),
+            "http_requests": dict(self.calls),
+            "api_calls": api_calls(),
+            "discord": dict(bot.sink.counts),
+            "loop_blocked_s": round(monitor.blocked, 4),
+            "max_loop_lag_s": round(monitor.max_lag, 4),
+            "memory_peak_kib": peak,
+            "max_rss_kib": max_rss_kib(),
+        }
+        self.results.append(result)
+        logging.warning(f"{notifier:>7} {creators:>6} {phase:>6} : {duration:.3f}s, blocage {monitor.blocked:.3f}s, "
+                        f"HTTP {dict(self.calls)}, Discord {dict(bot.sink.counts)}")
+
+    def churn_count(self, creators: int) -> int:
+        return max(1, int(creators * self.args.churn))
+
+    # --- Scénarios ---
+
+    async def bench_twitch(self, creators: int):
+        module = importlib.import_module("cogs.notifications.twitch_notifier")
+        module.Twitch = BenchmarkTwitchAuth
+        bot = BenchmarkBot(asyncio.get_running_loop())
+        cog = module.TwitchNotifier(bot)
+        cog.client.drop_database("askar_bot")
+        await bot.run_deferred() # initialize_twitch_and_start_loop
+        cog.check_streams.cancel() # Les passes sont déclenchées par le banc
+
+        logins = [f"streamer{i}" for i in range(creators)]
+        cog.collection.insert_many([
+            {"guild_id": 1000 + i % 50, "twitch_username": login, "discord_channel_id": 2000 + i % 50, "role_id": None, "custom_message": None}
+            for i, login in enumerate(logins)
+        ])
+        self.fake_twitch.live.clear()
+        for login in logins[:self.churn_count(creators)]:
+            self.fake_twitch.start_stream(login)
+
+        async def poll():
+            cog.cadence.next_due.clear() # Passe complète : tous les streamers sont dus
+            await cog.check_streams()
+
+        for phase in PHASES:
+            if phase == "churn":
+                # Les streamers en live terminent, d'autres commencent
+                self.fake_twitch.live.clear()
+                for login in logins[-self.churn_count(creators):]:
+                    self.fake_twitch.start_stream(login)
+            await self.measure("twitch", creators, phase, poll, bot)
+
+        cog.cog_unload()
+        await bot.run_deferred()
+
+    async def bench_youtube(self, creators: int):
+        module = importlib.import_module("cogs.notifications.youtube_notifier")
+        api = FakeYouTubeAPI()
+        module.googleapiclient.discovery.build = lambda *args, **kwargs: api
+        bot = BenchmarkBot(asyncio.get_running_loop())
+        cog = module.YouTubeNotifier(bot)
+        cog.client.drop_database("askar_bot")
+        await cog.cog_load()
+        cog.check_videos.cancel()
+
+        channel_ids = [f"UC{i:022d}" for i in range(creators)]
+        cog.collection.insert_many([
+            {"guild_id": 1000 + i % 50, "youtube_channel_id": channel_id, "youtube_channel_name": channel_id,
+             "uploads_playlist_id": "UU" + channel_id[2:], "discord_channel_id": 2000 + i % 50,
+             "video_role_id": None, "short_role_id": None, "custom_video_message": None, "custom_short_message": None}
+            for i, channel_id in enumerate(channel_ids)
+        ])
+
+        def upload(channel_id: str):
+            self.feed_fixture.upload(channel_id)
+            video_id, title, published = self.feed_fixture.videos[channel_id][0]
+            api.add_video(channel_id, video_id, title, published)
+
+        self.feed_fixture.videos.clear()
+        for channel_id in channel_ids:
+            upload(channel_id)
+
+        async def poll():
+            cog.cadence.next_due.clear()
+            await cog.check_videos()
+
+        for phase in PHASES:
+            if phase == "churn":
+                for channel_id in channel_ids[:self.churn_count(creators)]:
+                    upload(channel_id)
+            api.calls.clear()
+            await self.measure("youtube", creators, phase, poll, bot, lambda: dict(api.calls))
+
+        cog.cog_unload()
+        await bot.run_deferred()
+
+    async def bench_legacy(self, creators: int):
+        module = importlib.import_module("cogs.youtube")
+        module.collection.delete_many({})
+        bot = BenchmarkBot(asyncio.get_running_loop())
+        cog = module.YouTubeNotifier(bot)
+        cog.checkforvideos.cancel()
+
+        channel_ids = [f"UC{i:022d}" for i in range(creators)]
+        module.collection.insert_many([
+            {"_id": channel_id, "channel_name": channel_id, "latest_video_url": "none", "latest_short_url": "none",
+             "notifying_discord_channel": str(2000 + i % 50), "video_role_id": None, "short_role_id": None}
+            for i, channel_id in enumerate(channel_ids)
+        ])
+        self.page_fixture.latest.clear()
+        for channel_id in channel_ids:
+            self.page_fixture.upload(channel_id, "videos")
+            self.page_fixture.upload(channel_id, "shorts")
+
+        for phase in PHASES:
+            if phase == "churn":
+                for channel_id in channel_ids[:self.churn_count(creators)]:
+                    self.page_fixture.upload(channel_id, "videos")
+            await self.measure("legacy", creators, phase, cog.checkforvideos, bot)
+
+        cog.cog_unload()
+        await bot.run_deferred()
+
+    async def run(self):
+        await self.start_services()
+        try:
+            for notifier in self.args.notifiers:
+                for creators in self.args.creators:
+                    await getattr(self, f"bench_{notifier}")(creators)
+        finally:
+            await self.stop_services()
+
+    def report(self) -> dict:
+        return {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "settings": {"notifiers": self.args.notifiers, "creators": self.args.creators, "churn": self.args.churn, "memory": self.args.memory},
+            "results": self.results,
+        }
+
+
+if __name__ == "__main__":
+    # Les journaux des notifiers (une ligne par notification) fausseraient les mesures
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%d-%m-%Y %H:%M:%S')
+    parser = argparse.ArgumentParser(description="Banc d'essai des notifiers Twitch / YouTube avec des faux services.")
+    parser.add_argument("--notifiers", nargs="+", choices=NOTIFIERS, default=list(NOTIFIERS))
+    parser.add_argument("--creators", nargs="+", type=int, default=[10, 1000])
+    parser.add_argument("--churn", type=float, default=0.05, help="Part des créateurs qui passent en live / publient entre deux passes")
+    parser.add_argument("--memory", action="store_true", help="Mesure le pic d'allocation Python (tracemalloc, ralentit les passes)")
+    parser.add_argument("--output", help="Fichier JSON de sortie (sortie standard par défaut)")
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args)
+    benchmark.configure_environment()
+    asyncio.run(benchmark.run())
+
+    report = json.dumps(benchmark.report(), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
@@ -0,0 +1,181 @@
+"""
+Configuration du client Discord : extensions chargées, intents et caches.
+
+Les intents sont calculés à partir des extensions réellement chargées (au lieu de Intents.all()),
+et chaque profil fixe les caches (membres, messages) et la stratégie de chunking.
+Lancer `python bot_config.py [membres] [serveurs]` affiche une estimation mémoire de chaque profil.
+"""
+import os
+import sys
+import logging
+import discord
+
+# --- Chargement des extensions ---
+# Les extensions d'une même vague ne dépendent pas les unes des autres et sont chargées en parallèle.
+# Les vagues sont chargées dans l'ordre (xp_system fournit les permissions, log_core les logs).
+EXTENSION_WAVES = [
+    ['xp_system', 'logs.log_core'],
+    ['notifications.youtube_notifier', 'notifications.twitch_notifier', 'twitch_follower',
+     'server.join_server', 'server.leave_server', 'moderation.kick', 'moderation.ban',
+     'moderation.softban', 'moderation.tempban', 'moderation.unban', 'moderation.warn', 'moderation.mass',
+     'logs.events_messages', 'logs.events_server', 'logs.events_members', 'logs.events_voice',
+     'logs.events_commands'],
+]
+# Extensions secondaires chargées en arrière-plan, sans retarder la connexion à la gateway
+DEFERRED_EXTENSIONS = ['fun.random', 'fun.ping', 'fun.mimir', 'fun.poke', 'fun.sun']
+
+# Intents nécessaires à chaque extension (en plus de "guilds", toujours actif).
+# Les commandes à préfixe (hybrides) ont besoin de guild_messages + message_content.
+PREFIX_COMMANDS = ('guild_messages', 'message_content')
+EXTENSION_INTENTS = {
+    'xp_system': ('guild_messages', 'guild_reactions', 'voice_states', 'members'),
+    'genance': PREFIX_COMMANDS,
+    'status': (),
+    'auto_message': (),
+    'bug_report': ('guild_reactions',),
+    'messages': PREFIX_COMMANDS,
+    'youtube': (),
+    'notifications.youtube_notifier': (),
+    'notifications.twitch_notifier': (),
+    'twitch_follower': (),
+    'server.join_server': ('members',),
+    'server.leave_server': ('members',),
+    'moderation.kick': PREFIX_COMMANDS + ('members',),
+    'moderation.ban': PREFIX_COMMANDS + ('members',),
+    'moderation.softban': PREFIX_COMMANDS + ('members',),
+    'moderation.tempban': PREFIX_COMMANDS + ('members',),
+    'moderation.unban': PREFIX_COMMANDS,
+    'moderation.warn': PREFIX_COMMANDS + ('members',),
+    'moderation.mass': PREFIX_COMMANDS + ('members',),
+    'logs.log_core': (),
+    'logs.events_messages': PREFIX_COMMANDS,
+    'logs.events_server': ('auto_moderation_configuration',),
+    'logs.events_members': ('members',),
+    'logs.events_voice': ('voice_states',),
+    'logs.events_commands': PREFIX_COMMANDS,
+    'fun.random': PREFIX_COMMANDS,
+    'fun.ping': PREFIX_COMMANDS,
+    'fun.mimir': (),
+    'fun.poke': (),
+    'fun.sun': (),
+}
+
+# Profils de cache. "full" reproduit l'ancien comportement (Intents.all() + chunking complet).
+# - member_cache : "all" (tous les membres), "default" (membres arrivés/en vocal, selon les intents), "voice"
+# - max_messages : taille du cache de messages (None = désactivé, les logs de suppression/édition deviennent partiels)
+# - chunk_at_startup : False = les serveurs sont chunkés à la demande (voir ensure_chunked)
+PROFILES = {
+    'full': {'intents': 'all', 'member_cache': 'all', 'max_messages': 1000, 'chunk_at_startup': True},
+    'standard': {'intents': 'computed', 'member_cache': 'default', 'max_messages': 1000, 'chunk_at_startup': False},
+    'minimal': {'intents': 'computed', 'member_cache': 'voice', 'max_messages': None, 'chunk_at_startup': False},
+}
+DEFAULT_PROFILE = 'standard'
+
+# Tailles moyennes approximatives (octets) des objets gardés en cache par discord.py
+MEMBER_SIZE = 1200
+PRESENCE_SIZE = 700
+MESSAGE_SIZE = 2500
+GUILD_SIZE = 60000
+# Part des membres gardés en cache sans chunking (arrivées récentes, vocal, auteurs d'interactions)
+PARTIAL_MEMBER_RATIO = 0.05
+
+
+def all_extensions() -> list[str]:
+    return [ext for wave in EXTENSION_WAVES for ext in wave] + DEFERRED_EXTENSIONS
+
+
+def build_intents(extensions: list[str]) -> discord.Intents:
+    """Calcule les intents minimaux nécessaires aux extensions données."""
+    intents = discord.Intents.none()
+    intents.guilds = True
+    for extension in extensions:
+        required = EXTENSION_INTENTS.get(extension)
+        if required is None:
+            # Extension inconnue : on reste prudent plutôt que de casser ses événements
+            logging.warning(f"Intents inconnus pour l'extension '{extension}', utilisation des intents par défaut.")
+            intents |= discord.Intents.default()
+            intents.message_content = True
+            intents.members = True
+            continue
+        for flag in required:
+            setattr(intents, flag, True)
+    return intents
+
+
+def get_profile_name() -> str:
+    name = os.getenv('BOT_PROFILE', DEFAULT_PROFILE).lower()
+    if name not in PROFILES:
+        logging.warning(f"Profil '{name}' inconnu, utilisation du profil '{DEFAULT_PROFILE}'.")
+        name = DEFAULT_PROFILE
+    return name
+
+
+def build_client_options(profile_name: str, extensions: list[str] = None) -> dict:
+    """Retourne les arguments du constructeur du bot (intents, caches, chunking) pour un profil."""
+    profile = PROFILES[profile_name]
+    if profile['intents'] == 'all':
+        intents = discord.Intents.all()
+    else:
+        intents = build_intents(extensions if extensions is not None else all_extensions())
+
+    if profile['member_cache'] == 'all':
+        member_cache_flags = discord.MemberCacheFlags.all()
+    elif profile['member_cache'] == 'voice':
+        member_cache_flags = discord.MemberCacheFlags.none()
+        member_cache_flags.voice = intents.voice_states
+    else:
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+
+    return {
+        'intents': intents,
+        'member_cache_flags': member_cache_flags,
+        'max_messages': profile['max_messages'],
+        'chunk_guilds_at_startup': profile['chunk_at_startup'],
+    }
+
+
+def estimate_memory(profile_name: str, member_count: int, guild_count: int = 1) -> int:
+    """Estimation grossière (octets) de la mémoire occupée par les caches discord.py pour un profil."""
+    options = build_client_options(profile_name)
+    intents = options['intents']
+    if options['chunk_guilds_at_startup'] and intents.members:
+        cached_members = member_count
+    else:
+        cached_members = int(member_count * PARTIAL_MEMBER_RATIO)
+
+    total = guild_count * GUILD_SIZE + cached_members * MEMBER_SIZE
+    if intents.presences:
+        total += cached_members * PRESENCE_SIZE
+    total += (options['max_messages'] or 0) * MESSAGE_SIZE
+    return total
+
+
+def format_memory_report(member_count: int, guild_count: int = 1) -> str:
+    lines = [f"Estimation mémoire des caches ({member_count} membres, {guild_count} serveur(s)) :"]
+    for name in PROFILES:
+        options = build_client_options(name)
+        enabled = [flag for flag, value in options['intents'] if value]
+        lines.append(
+            f"  {name:<9} ~{estimate_memory(name, member_count, guild_count) / 1024 / 1024:>8.1f} Mo"
+            f" | chunking au démarrage: {'oui' if options['chunk_guilds_at_startup'] else 'non'}"
+            f" | max_messages: {options['max_messages']} | intents: {', '.join(enabled)}"
+        )
+    return "\n".join(lines)
+
+
+async def ensure_chunked(guild: discord.Guild):
+    """Charge la liste complète des membres d'un serveur la première fois qu'on en a besoin."""
+    if guild.chunked:
+        return
+    logging.info(f"Chunking à la demande du serveur {guild.name} ({guild.member_count} membres)...")
+    try:
+        await guild.chunk(cache=True)
+    except discord.ClientException as e:
+        # Intent "members" désactivé dans ce profil
+        logging.warning(f"Chunking impossible pour {guild.name} : {e}")
+
+
+if __name__ == '__main__':
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    guilds = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    print(format_memory_report(members, guilds))
@@ -0,0 +1,138 @@
+"""
+Cadence de polling adaptative pour les notifiers (Twitch, YouTube).
+
+Chaque source (streamer, chaîne) a son propre intervalle de vérification :
+  - plus court autour des heures où elle publie / lance ses lives d'habitude (histogramme par heure de la
+    semaine, appris des détections passées et stocké dans askar_bot.notifier_activity) ;
+  - plus long pour les sources inactives depuis longtemps ;
+  - le tout étiré si l'ensemble dépasse le budget global de requêtes par heure.
+La boucle du notifier tourne à intervalle fixe court et n'interroge que les sources arrivées à échéance.
+"""
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+
+HOURS_PER_WEEK = 168
+HOT_WINDOW = 1 # heures de part et d'autre de l'heure courante prises en compte
+HOT_FACTOR = 3 # Une fenêtre "chaude" concentre au moins 3x plus d'événements qu'une répartition uniforme
+MIN_EVENTS = 3 # En dessous, l'historique n'est pas assez fiable : intervalle de base
+DORMANT_DAYS = 30 # Sans événement depuis cette durée (ou depuis le début du suivi) : intervalle maximum
+DUE_SLACK = 1 # secondes : une source due juste après le tick est vérifiée à ce tick plutôt qu'au suivant
+
+
+def hour_of_week(moment: datetime) -> int:
+    return moment.weekday() * 24 + moment.hour
+
+
+class AdaptiveCadence:
+    def __init__(self, collection, source: str, min_interval: float, base_interval: float, max_interval: float,
+                 budget_per_hour: float, cost_per_poll: float = 1.0):
+        self.collection = collection
+        self.source = source
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.budget_per_hour = budget_per_hour
+        self.cost_per_poll = cost_per_poll # Coût d'une vérification (fraction de requête si les sources sont groupées)
+        self.profiles = {} # {clé: {"hours": [168 compteurs], "events": n, "last_event": datetime, "first_seen": datetime}}
+        self.next_due = {} # {clé: horodatage de la prochaine vérification}
+        self.tasks = set() # Enregistrements en cours (une tâche non référencée peut être détruite)
+
+    async def load(self):
+        docs = await asyncio.to_thread(lambda: list(self.collection.find({"source": self.source})))
+        for doc in docs:
+            last_event, first_seen = (
+                moment.replace(tzinfo=timezone.utc) if moment is not None and moment.tzinfo is None else moment
+                for moment in (doc.get("last_event"), doc.get("first_seen"))
+            )
+            self.profiles[doc["key"]] = {"hours": doc.get("hours") or [0] * HOURS_PER_WEEK, "events": doc.get("events", 0),
+                                         "last_event": last_event, "first_seen": first_seen or last_event}
+        logging.info(f"Cadence '{self.source}' : historique chargé pour {len(docs)} source(s).")
+
+    def interval(self, key: str, now: datetime) -> float:
+        """Intervalle idéal (secondes) pour une source, avant application du budget."""
+        profile = self.profiles.get(key)
+        if not profile:
+            return self.base_interval
+        # Inactive depuis l'historique complet, quel que soit le nombre d'événements (y compris jamais active)
+        last_activity = profile["last_event"] or profile.get("first_seen")
+        if last_activity and (now - last_activity).days >= DORMANT_DAYS:
+            return self.max_interval
+        if profile["events"] < MIN_EVENTS:
+            return self.base_interval
+
+        slot = hour_of_week(now)
+        window = [profile["hours"][(slot + offset) % HOURS_PER_WEEK] for offset in range(-HOT_WINDOW, HOT_WINDOW + 1)]
+        expected = profile["events"] * len(window) / HOURS_PER_WEEK
+        if sum(window) >= HOT_FACTOR * expected:
+            return self.min_interval
+        if sum(window) == 0:
+            # Jamais d'activité à cette heure-ci : entre la base et le maximum
+            return (self.base_interval + self.max_interval) / 2
+        return self.base_interval
+
+    def due(self, keys, active=()) -> list:
+        """
+        Retourne les sources à vérifier maintenant et planifie leur prochaine vérification.
+        Les sources `active` (live en cours...) gardent au moins l'intervalle de base.
+        """
+        now_ts = time.time()
+        now = datetime.now(timezone.utc)
+        keys = set(keys)
+        for key in list(self.next_due):
+            if key not in keys:
+                del self.next_due[key]
+        new_keys = [key for key in keys if key not in self.profiles]
+        if new_keys:
+            # Début du suivi : une source qui ne publie jamais finit par être considérée inactive
+            for key in new_keys:
+                self.profiles[key] = {"hours": [0] * HOURS_PER_WEEK, "events": 0, "last_event": None, "first_seen": now}
+            task = asyncio.create_task(self.save_first_seen(new_keys, now))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        intervals = {key: min(self.interval(key, now), self.base_interval) if key in active else self.interval(key, now) for key in keys}
+        # Coût horaire projeté ; au-delà du budget, tous les intervalles sont étirés du même facteur
+        projected = sum(self.cost_per_poll * 3600 / interval for interval in intervals.values())
+        stretch = max(1.0, projected / self.budget_per_hour) if self.budget_per_hour else 1.0
+
+        due_keys = [key for key in keys if self.next_due.get(key, 0) <= now_ts + DUE_SLACK]
+        for key in due_keys:
+            self.next_due[key] = now_ts + intervals[key] * stretch
+        return due_keys
+
+    async def record(self, key: str, moment: datetime):
+        """Enregistre une détection (live, vidéo) pour affiner la cadence de la source."""
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        slot = hour_of_week(moment)
+        profile = self.profiles.setdefault(key, {"hours": [0] * HOURS_PER_WEEK, "events": 0, "last_event": None, "first_seen": moment})
+        profile["hours"][slot] += 1
+        profile["events"] += 1
+        profile["last_event"] = moment
+        try:
+            await asyncio.to_thread(
+                self.collection.update_one,
+                {"_id": f"{self.source}:{key}"},
+                {"$set": {"hours": profile["hours"], "events": profile["events"], "last_event": moment, "source": self.source, "key": key},
+                 "$setOnInsert": {"first_seen": profile["first_seen"]}},
+                upsert=True
+            )
+        except Exception as e:
+            logging.error(f"Cadence '{self.source}' : impossible d'enregistrer l'activité de {key} : {e}")
+
+    async def save_first_seen(self, keys: list, moment: datetime):
+        """Enregistre le début du suivi des nouvelles sources (sans écraser une date déjà connue)."""
+        try:
+            await asyncio.to_thread(self.collection.bulk_write, [
+                UpdateOne(
+                    {"_id": f"{self.source}:{key}"},
+                    {"$setOnInsert": {"first_seen": moment, "hours": [0] * HOURS_PER_WEEK, "events": 0, "source": self.source, "key": key}},
+                    upsert=True
+                )
+                for key in keys
+            ], ordered=False)
+        except Exception as e:
+            logging.error(f"Cadence '{self.source}' : impossible d'enregistrer le début du suivi de {len(keys)} source(s) : {e}")
@@ -0,0 +1,287 @@
+"""
+Mode cluster : plusieurs processus, chacun responsable d'une plage de shards.
+
+Usage :
+    python cluster.py --shards 4 --clusters 2              # 2 processus de 2 shards (AutoShardedBot)
+    python cluster.py --shards 4 --clusters 2 --simulate   # test local, sans connexion à Discord
+
+Le lanceur démarre `start.py` une fois par cluster en lui transmettant sa plage de shards et la liste
+des pairs par variables d'environnement. Dans chaque processus, ClusterNode :
+  - élit un seul processus "leader" via un verrou MongoDB (askar_bot.cluster_locks) : c'est lui qui
+    exécute les tâches de fond globales (pollers Twitch/YouTube, cycle de statut...) ;
+  - diffuse les invalidations de cache aux autres processus par datagrammes UDP locaux.
+Sans lanceur (python start.py), le nœud est autonome : toujours leader, diffusion sans effet.
+"""
+import os
+import sys
+import json
+import socket
+import asyncio
+import logging
+import argparse
+import subprocess
+from datetime import datetime, timedelta, timezone
+import discord
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+LOCK_NAME = "background_tasks"
+LOCK_TTL = 30 # secondes : un leader qui ne renouvelle plus son verrou est remplacé après ce délai
+LOCK_RENEW_INTERVAL = 10
+BASE_PORT = 47800
+
+
+def is_leader(bot) -> bool:
+    """Indique si ce processus doit exécuter les tâches de fond globales."""
+    node = getattr(bot, "cluster", None)
+    return node is None or node.is_leader
+
+
+def cluster_id(bot) -> int:
+    """Numéro du processus dans le cluster (0 en mode autonome)."""
+    node = getattr(bot, "cluster", None)
+    return node.cluster_id if node is not None else 0
+
+
+def get_messageable(bot, channel_id: int, guild_id: int = None):
+    """
+    Retourne le salon s'il est dans le cache de ce processus, sinon un PartialMessageable.
+    En mode cluster, le leader envoie ainsi (via REST) dans des salons gérés par les shards d'un autre processus.
+    """
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        channel = bot.get_partial_messageable(channel_id, guild_id=guild_id, type=discord.ChannelType.text)
+    return channel
+
+
+def role_mention(guild, role_id: int) -> str:
+    """Mention d'un rôle ; si le serveur est géré par un autre processus du cluster, mention brute par ID."""
+    if not role_id:
+        return ""
+    if guild is None:
+        return f"<@&{role_id}>"
+    role = guild.get_role(role_id)
+    return role.mention if role else ""
+
+
+def publish(bot, topic: str, payload):
+    """Diffuse un message aux autres processus du cluster (sans effet hors cluster)."""
+    node = getattr(bot, "cluster", None)
+    if node is not None:
+        node.publish(topic, payload)
+
+
+def subscribe(bot, topic: str, callback):
+    node = getattr(bot, "cluster", None)
+    if node is not None:
+        node.subscribe(topic, callback)
+
+
+class ClusterProtocol(asyncio.DatagramProtocol):
+    def __init__(self, node):
+        self.node = node
+
+    def datagram_received(self, data, addr):
+        try:
+            message = json.loads(data.decode("utf-8"))
+        except ValueError:
+            logging.warning(f"Cluster : datagramme invalide reçu de {addr}.")
+            return
+        if message.get("from") == self.node.cluster_id:
+            return
+        self.node.dispatch(message.get("topic"), message.get("payload"))
+
+
+class ClusterNode:
+    def __init__(self, cluster_id: int = 0, shard_ids: list[int] = None, shard_count: int = None, peers: list[tuple[str, int]] = None):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.peers = peers or []
+        self.owner = f"{socket.gethostname()}:{cluster_id}"
+
+        self.is_leader = self.standalone # Un nœud autonome est toujours leader
+        self.subscribers = {} # {topic: [callback]}
+        self.transport = None
+        self.lock_task = None
+        self.locks = None
+
+    @classmethod
+    def from_env(cls):
+        """Construit le nœud à partir des variables transmises par le lanceur (nœud autonome sinon)."""
+        if not os.getenv("CLUSTER_ID"):
+            return cls()
+        peers = []
+        for peer in filter(None, os.getenv("CLUSTER_PEERS", "").split(",")):
+            host, port = peer.rsplit(":", 1)
+            peers.append((host, int(port)))
+        return cls(
+            cluster_id=int(os.getenv("CLUSTER_ID")),
+            shard_ids=[int(s) for s in os.getenv("CLUSTER_SHARD_IDS", "").split(",") if s],
+            shard_count=int(os.getenv("SHARD_COUNT", "1")),
+            peers=peers
+        )
+
+    @property
+    def standalone(self) -> bool:
+        return self.shard_count is None
+
+    def shard_options(self) -> dict:
+        """Arguments de plage de shards pour AutoShardedBot (vide en mode autonome)."""
+        if self.standalone:
+            return {}
+        return {"shard_ids": self.shard_ids, "shard_count": self.shard_count}
+
+    # --- Élection du leader ---
+
+    def try_acquire_lock(self) -> bool:
+        """Prend ou renouvelle le verrou (requête bloquante, à exécuter dans un thread)."""
+        now = datetime.now(timezone.utc)
+        try:
+            doc = self.locks.find_one_and_update(
+                {"_id": LOCK_NAME, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=LOCK_TTL)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return doc is not None and doc["owner"] == self.owner
+        except DuplicateKeyError:
+            # Le verrou existe et appartient à un autre processus encore vivant
+            return False
+
+    async def refresh_leadership(self):
+        try:
+            leader = await asyncio.to_thread(self.try_acquire_lock)
+        except Exception as e:
+            # Sans accès à la base, on ne peut pas garantir l'unicité : on cède la place
+            logging.error(f"Cluster {self.cluster_id} : impossible de renouveler le verrou : {e}")
+            leader = False
+        if leader != self.is_leader:
+            state = "devient leader" if leader else "n'est plus leader"
+            logging.info(f"Cluster {self.cluster_id} : {state} des tâches de fond.")
+        self.is_leader = leader
+
+    async def lock_loop(self):
+        while True:
+            await asyncio.sleep(LOCK_RENEW_INTERVAL)
+            await self.refresh_leadership()
+
+    # --- Canal d'invalidation ---
+
+    def subscribe(self, topic: str, callback):
+        """Enregistre un callback(payload) appelé quand un autre processus publie sur ce sujet."""
+        self.subscribers.setdefault(topic, []).append(callback)
+
+    def dispatch(self, topic: str, payload):
+        for callback in self.subscribers.get(topic, []):
+            try:
+                callback(payload)
+            except Exception as e:
+                logging.error(f"Cluster : erreur dans un abonné au sujet '{topic}' : {e}")
+
+    def publish(self, topic: str, payload):
+        """Envoie un message aux autres processus (sans effet en mode autonome)."""
+        if self.transport is None:
+            return
+        data = json.dumps({"from": self.cluster_id, "topic": topic, "payload": payload}).encode("utf-8")
+        for index, peer in enumerate(self.peers):
+            if index != self.cluster_id:
+                self.transport.sendto(data, peer)
+
+    # --- Cycle de vie ---
+
+    async def start(self):
+        if self.standalone:
+            return
+        mongo_uri = os.getenv("MONGO_URI")
+        if not mongo_uri:
+            raise ValueError("La variable d'environnement MONGO_URI est obligatoire en mode cluster.")
+        self.locks = MongoClient(mongo_uri)["askar_bot"]["cluster_locks"]
+
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(lambda: ClusterProtocol(self), local_addr=self.peers[self.cluster_id])
+
+        # Première tentative immédiate pour que les cogs connaissent le leader dès leur chargement
+        await self.refresh_leadership()
+        self.lock_task = asyncio.create_task(self.lock_loop())
+        logging.info(f"Cluster {self.cluster_id} démarré : shards {self.shard_ids} / {self.shard_count}.")
+
+    async def stop(self):
+        if self.lock_task:
+            self.lock_task.cancel()
+        if self.transport:
+            self.transport.close()
+        if self.locks is not None and self.is_leader:
+            # Libère le verrou pour qu'un autre processus prenne le relais sans attendre l'expiration
+            await asyncio.to_thread(self.locks.delete_one, {"_id": LOCK_NAME, "owner": self.owner})
+        self.is_leader = self.standalone
+
+
+# --- Lanceur ---
+
+def shard_ranges(shard_count: int, cluster_count: int) -> list[list[int]]:
+    """Répartit les shards en plages contiguës, une par cluster."""
+    per_cluster, extra = divmod(shard_count, cluster_count)
+    ranges, start = [], 0
+    for index in range(cluster_count):
+        size = per_cluster + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+async def simulate_worker():
+    """Processus de test : élection + canal d'invalidation, sans passerelle Discord."""
+    node = ClusterNode.from_env()
+    node.subscribe("ping", lambda payload: logging.info(f"Cluster {node.cluster_id} : ping reçu de {payload}"))
+    await node.start()
+    try:
+        while True:
+            logging.info(f"Cluster {node.cluster_id} (shards {node.shard_ids}) : leader={node.is_leader}")
+            node.publish("ping", node.cluster_id)
+            await asyncio.sleep(LOCK_RENEW_INTERVAL)
+    finally:
+        await node.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lance le bot en plusieurs processus, chacun sur une plage de shards.")
+    parser.add_argument("--shards", type=int, required=True, help="Nombre total de shards")
+    parser.add_argument("--clusters", type=int, default=1, help="Nombre de processus")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT, help="Premier port UDP du canal d'invalidation")
+    parser.add_argument("--simulate", action="store_true", help="Teste l'élection et le canal sans se connecter à Discord")
+    args = parser.parse_args()
+
+    if args.clusters < 1 or args.shards < args.clusters:
+        parser.error("Il faut au moins un shard par cluster.")
+
+    peers = ",".join(f"127.0.0.1:{args.base_port + i}" for i in range(args.clusters))
+    target = [sys.executable, os.path.abspath(__file__), "--worker-simulate"] if args.simulate else [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "start.py")]
+
+    processes = []
+    for index, shard_ids in enumerate(shard_ranges(args.shards, args.clusters)):
+        env = dict(os.environ,
+                   CLUSTER_ID=str(index),
+                   CLUSTER_SHARD_IDS=",".join(map(str, shard_ids)),
+                   SHARD_COUNT=str(args.shards),
+                   CLUSTER_PEERS=peers)
+        processes.append(subprocess.Popen(target, env=env))
+        logging.info(f"Cluster {index} lancé (PID {processes[-1].pid}) avec les shards {shard_ids}.")
+
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%d-%m-%Y %H:%M:%S')
+    if "--worker-simulate" in sys.argv:
+        try:
+            asyncio.run(simulate_worker())
+        except KeyboardInterrupt:
+            pass
+    else:
+        main()
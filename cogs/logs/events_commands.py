@@ -1,11 +1,59 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
+import logging
+import re
+
+# Liste des préfixes courants à surveiller
+COMMON_PREFIXES = ('!', '?', '/', '.', ';', '$', '-')
+
+# Un préfixe suivi directement d'un nom de commande plausible (lettre puis lettres/chiffres/-/_).
+# Écarte sans autre calcul "...", "? pourquoi", "-- note", "$5", ":)"...
+COMMAND_PATTERN = re.compile(r"[!?/.;$-]([A-Za-z][\w-]{0,31})(?:\s|$)")
+
+# Intervalle d'envoi des résumés de commandes d'autres bots, et nombre de lignes par embed
+FOREIGN_SUMMARY_MINUTES = 5
+FOREIGN_SUMMARY_LINES = 20
+# Nombre maximal de détections gardées en mémoire par serveur entre deux résumés
+FOREIGN_BUFFER_MAX = 100
 
 class EventsCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+        # Noms + alias de nos commandes à préfixe, recalculés si la liste change
+        self.own_commands = frozenset()
+        self.own_commands_size = -1
+
+        # Détections en attente de résumé {guild_id: {"entries": [...], "dropped": int}}
+        self.foreign_buffer = {}
+        self.flush_foreign_commands.start()
+
+    def cog_unload(self):
+        self.flush_foreign_commands.cancel()
+
+    def get_own_commands(self) -> frozenset:
+        """Retourne l'ensemble précalculé des noms et alias de nos commandes à préfixe."""
+        # bot.all_commands contient déjà noms et alias : sa taille change dès qu'un cog est (dé)chargé
+        if len(self.bot.all_commands) != self.own_commands_size:
+            self.own_commands = frozenset(self.bot.all_commands)
+            self.own_commands_size = len(self.bot.all_commands)
+        return self.own_commands
+
+    def classify_message(self, content: str) -> str | None:
+        """
+        Pré-classifie un message sans construire de contexte.
+        Retourne le nom de la commande supposée d'un autre bot, ou None (texte normal ou commande à nous).
+        """
+        match = COMMAND_PATTERN.match(content)
+        if not match:
+            return None
+        name = match.group(1)
+        # Le préfixe "." est le nôtre : la commande est déjà loggée par on_command_completion
+        if content[0] == self.bot.command_prefix and name in self.get_own_commands():
+            return None
+        return name
+
     # --- Commandes de TON Bot (Prefix) ---
     @commands.Cog.listener()
     async def on_command_completion(self, ctx):
@@ -35,25 +83,62 @@ class EventsCommands(commands.Cog):
         if not message.guild:
             return
 
-        # Liste des préfixes courants à surveiller
-        common_prefixes = ('!', '?', '/', '.', ';', '$', '-')
-        
-        # Si le message commence par un préfixe mais N'EST PAS une commande de ton bot
-        # (on vérifie si le bot a déjà traité ce message via get_context)
-        if message.content.startswith(common_prefixes):
-            ctx = await self.bot.get_context(message)
-            if ctx.valid:
-                return # C'est une commande de TON bot, déjà gérée par on_command_completion
-
-            # C'est probablement une commande pour un autre bot
-            embed = discord.Embed(title="❓ Commande Autre Bot (Détectée)", description=f"Message : `{message.content}`", color=discord.Color.light_grey())
-            embed.add_field(name="Utilisateur", value=f"{message.author.mention} ({message.author.id})", inline=True)
-            embed.add_field(name="Salon", value=message.channel.mention, inline=True)
-            embed.set_footer(text="Détection basée sur le préfixe")
-
-            log_core = self.bot.get_cog("LogCore")
-            # On utilise le même canal "command_use"
-            if log_core: await log_core.send_log(message.guild, "command_use", embed)
+        # Filtre le plus économique d'abord : la grande majorité des messages s'arrête ici
+        if not message.content.startswith(COMMON_PREFIXES):
+            return
+
+        log_core = self.bot.get_cog("LogCore")
+        # On utilise le même canal "command_use" : inutile d'analyser si il n'est pas configuré
+        if not log_core or not log_core.is_event_enabled(message.guild, "command_use"):
+            return
+
+        if self.classify_message(message.content) is None:
+            return
+
+        # C'est probablement une commande pour un autre bot : on l'ajoute au prochain résumé
+        buffer = self.foreign_buffer.setdefault(message.guild.id, {"entries": [], "dropped": 0})
+        if len(buffer["entries"]) >= FOREIGN_BUFFER_MAX:
+            buffer["dropped"] += 1
+            return
+        buffer["entries"].append(
+            f"{message.author.mention} dans {message.channel.mention} : `{message.content[:80]}`"
+        )
+
+    @tasks.loop(minutes=FOREIGN_SUMMARY_MINUTES)
+    async def flush_foreign_commands(self):
+        """Envoie un résumé groupé des commandes d'autres bots détectées depuis le dernier passage."""
+        if not self.foreign_buffer:
+            return
+
+        pending, self.foreign_buffer = self.foreign_buffer, {}
+        log_core = self.bot.get_cog("LogCore")
+        if not log_core:
+            return
+
+        for guild_id, buffer in pending.items():
+            guild = self.bot.get_guild(guild_id)
+            if not guild:
+                continue
+
+            entries = buffer["entries"]
+            for i in range(0, len(entries), FOREIGN_SUMMARY_LINES):
+                chunk = entries[i:i + FOREIGN_SUMMARY_LINES]
+                embed = discord.Embed(
+                    title="❓ Commandes Autres Bots (Détectées)",
+                    description="\n".join(chunk),
+                    color=discord.Color.light_grey()
+                )
+                footer = f"Détection basée sur le préfixe • {len(entries)} commande(s) sur les {FOREIGN_SUMMARY_MINUTES} dernières minutes"
+                if buffer["dropped"]:
+                    footer += f" (+{buffer['dropped']} non listées)"
+                embed.set_footer(text=footer)
+                await log_core.send_log(guild, "command_use", embed)
+
+            logging.debug(f"Résumé des commandes d'autres bots envoyé pour {guild.name} ({len(entries)} entrées).")
+
+    @flush_foreign_commands.before_loop
+    async def before_flush_foreign_commands(self):
+        await self.bot.wait_until_ready()
 
 async def setup(bot):
     await bot.add_cog(EventsCommands(bot))
\ No newline at end of file
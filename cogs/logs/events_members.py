@@ -1,10 +1,21 @@
 import discord
 from discord.ext import commands
+from bot_config import ensure_chunked
+
+# Ces événements ne sont émis que pour les membres présents dans le cache
+CACHED_MEMBER_EVENTS = ("member_leave", "member_update", "member_role_update")
 
 class EventsMembers(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        # Sans chunking au démarrage, on ne charge les membres que des serveurs qui loggent ces événements
+        log_core = self.bot.get_cog("LogCore")
+        if log_core and any(log_core.is_event_enabled(guild, event) for event in CACHED_MEMBER_EVENTS):
+            await ensure_chunked(guild)
+
     @commands.Cog.listener()
     async def on_member_join(self, member):
         # Log technique (compte créé quand ?)
@@ -5,6 +5,7 @@ from pymongo import MongoClient
 import os
 import logging
 from datetime import datetime
+from cluster import publish, subscribe
 
 # Liste des événements configurables
 LOG_EVENTS = [
@@ -37,18 +38,37 @@ class LogCore(commands.Cog):
             logging.error(f"Cog 'LogCore': Erreur MongoDB : {e}")
             raise
 
+        # Cache des configurations {guild_id: {event_type: channel_id}}
+        # Évite un find_one à chaque événement (messages, vocal, XP...).
+        self.config_cache = {}
+        # Les autres processus du cluster signalent les changements de configuration
+        subscribe(self.bot, "log_config", lambda guild_id: self.config_cache.pop(guild_id, None))
+
+    def get_log_channels(self, guild_id: int) -> dict:
+        """Retourne (depuis le cache) le mapping événement -> salon d'un serveur."""
+        channels = self.config_cache.get(guild_id)
+        if channels is None:
+            config = self.collection.find_one({"guild_id": guild_id}, {"channels": 1})
+            channels = config.get("channels", {}) if config else {}
+            self.config_cache[guild_id] = channels
+        return channels
+
+    def is_event_enabled(self, guild: discord.Guild, event_type: str) -> bool:
+        """Indique si un salon de logs est configuré pour cet événement (sans requête si déjà en cache)."""
+        try:
+            return bool(self.get_log_channels(guild.id).get(event_type))
+        except Exception as e:
+            logging.error(f"LogCore: Erreur lors de la lecture de la configuration ({event_type}): {e}")
+            return False
+
     async def send_log(self, guild: discord.Guild, event_type: str, embed: discord.Embed, file: discord.File = None):
         """
         Fonction centrale pour envoyer un log.
         Cherche si un salon est configuré pour cet event_type précis.
         """
         try:
-            config = self.collection.find_one({"guild_id": guild.id})
-            if not config:
-                return
-
             # On cherche l'ID du salon pour cet événement précis
-            channel_id = config.get("channels", {}).get(event_type)
+            channel_id = self.get_log_channels(guild.id).get(event_type)
             
             if channel_id:
                 channel = guild.get_channel(channel_id)
@@ -83,7 +103,9 @@ class LogCore(commands.Cog):
                 {"$set": {f"channels.{event}": channel.id}},
                 upsert=True
             )
-            
+            self.config_cache.pop(interaction.guild_id, None)
+            publish(self.bot, "log_config", interaction.guild_id)
+
             await interaction.response.send_message(
                 f"✅ Les logs pour **{event}** seront envoyés dans {channel.mention}.",
                 ephemeral=True
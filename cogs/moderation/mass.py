@@ -0,0 +1,268 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+import re
+import asyncio
+import logging
+from typing import Optional
+from datetime import datetime, timedelta, timezone
+from bot_config import ensure_chunked
+from moderation_utils import BanDuration, DeleteMessagesDuration, JoinWindow, format_duration, duration_error_message
+
+MAX_TARGETS = 200 # Limite d'un bannissement groupé côté Discord
+DM_CONCURRENCY = 5 # Les MP ont leur propre limite de débit, plus stricte
+ACTION_CONCURRENCY = 5
+SUMMARY_MAX_IDS = 40 # IDs affichés dans le log récapitulatif
+ID_PATTERN = re.compile(r"\d{15,20}") # IDs bruts et mentions <@123>
+# Forme à préfixe : les mentions/IDs en tête du texte sont les cibles, la suite est la raison
+LEADING_TARGETS = re.compile(r"(?:\s*(?:<@!?\d{15,20}>|\d{15,20})(?=\s|$))*")
+USAGE = {
+    "massban": ".massban [joined_within] [delete_messages] <mentions/IDs> [raison]",
+    "masskick": ".masskick [joined_within] <mentions/IDs> [raison]",
+    "masstempban": ".masstempban <durée> [joined_within] [delete_messages] <mentions/IDs> [raison]",
+}
+
+
+def split_targets(text: str) -> tuple[str, str]:
+    """Sépare les mentions/IDs en tête du texte (forme à préfixe) de la raison qui suit."""
+    match = LEADING_TARGETS.match(text)
+    return match.group().strip(), text[match.end():].strip()
+
+
+class MassModeration(commands.Cog):
+    """Sanctions groupées (raids) : une seule validation, MP et actions en parallèle, un seul log récapitulatif."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    async def resolve_targets(self, ctx: commands.Context, targets: str | None, window: int | None, members_only: bool) -> tuple[list, list[str]] | None:
+        """
+        Cibles à partir d'une liste de mentions/IDs et/ou d'une fenêtre d'arrivée (en secondes).
+        Retourne (cibles valides, lignes "ignoré"), ou None si aucune cible n'est indiquée (message déjà envoyé).
+        """
+        guild = ctx.guild
+        ids = list(dict.fromkeys(int(match) for match in ID_PATTERN.findall(targets or "")))
+        if not ids and window is None:
+            await ctx.send(f"❌ Indiquez des membres (mentions ou IDs) et/ou une fenêtre d'arrivée (`joined_within`).\nUsage : `{USAGE[ctx.command.name]}`", ephemeral=True)
+            return None
+
+        # Membres absents du cache : on charge la liste une fois plutôt que de les récupérer un par un
+        if window is not None or any(guild.get_member(user_id) is None for user_id in ids):
+            await ensure_chunked(guild)
+
+        candidates = {}
+        skipped = []
+        for user_id in ids:
+            member = guild.get_member(user_id)
+            if member is not None:
+                candidates[user_id] = member
+            elif members_only:
+                skipped.append(f"`{user_id}` : pas membre du serveur")
+            else:
+                candidates[user_id] = discord.Object(id=user_id) # Bannissement préventif d'un compte hors serveur
+        if window is not None:
+            since = datetime.now(timezone.utc) - timedelta(seconds=window)
+            for member in guild.members:
+                if member.joined_at and member.joined_at >= since and not member.bot:
+                    candidates.setdefault(member.id, member)
+
+        # Hiérarchie validée une seule fois pour tout le lot
+        author_is_owner = ctx.author.id == guild.owner_id
+        valid = []
+        for user_id, target in candidates.items():
+            if user_id in (ctx.author.id, guild.owner_id, guild.me.id):
+                skipped.append(f"`{user_id}` : auteur, propriétaire ou bot")
+            elif isinstance(target, discord.Member) and not author_is_owner and ctx.author.top_role <= target.top_role:
+                skipped.append(f"`{user_id}` : rôle égal ou supérieur au vôtre")
+            elif isinstance(target, discord.Member) and guild.me.top_role <= target.top_role:
+                skipped.append(f"`{user_id}` : rôle égal ou supérieur à celui du bot")
+            else:
+                valid.append(target)
+
+        if len(valid) > MAX_TARGETS:
+            skipped.append(f"{len(valid) - MAX_TARGETS} cible(s) au-delà de la limite de {MAX_TARGETS}")
+            valid = valid[:MAX_TARGETS]
+        return valid, skipped
+
+    async def notify_targets(self, targets: list, message: str):
+        """Envoie le MP de sanction aux membres ciblés, en parallèle sous limite."""
+        limit = asyncio.Semaphore(DM_CONCURRENCY)
+
+        async def notify(member: discord.Member):
+            async with limit:
+                try:
+                    await member.send(message)
+                except discord.HTTPException:
+                    logging.warning(f"Impossible d'envoyer le MP de sanction groupée à {member} (DMs fermés).")
+
+        await asyncio.gather(*(notify(target) for target in targets if isinstance(target, discord.Member)))
+
+    async def ban_targets(self, guild: discord.Guild, targets: list, reason: str, delete_seconds: int) -> tuple[list[int], list[tuple[int, str]]]:
+        """Bannit le lot en une requête ; sans la permission requise, bannissements individuels en parallèle."""
+        try:
+            result = await guild.bulk_ban(targets, reason=reason, delete_message_seconds=delete_seconds)
+            return [user.id for user in result.banned], [(user.id, "refusé par Discord") for user in result.failed]
+        except discord.Forbidden:
+            # Le bannissement groupé demande aussi "Gérer le serveur"
+            logging.warning(f"Bannissement groupé refusé sur {guild.name}, bannissements individuels.")
+        except discord.HTTPException as e:
+            # "Banning failed" (aucune cible bannissable), erreur serveur, limite de débit... : le lot entier
+            # est compté en échec pour que le récapitulatif liste les membres prévenus mais non bannis
+            logging.error(f"Erreur lors du bannissement groupé sur {guild.name} : {e}")
+            return [], [(target.id, str(e)) for target in targets]
+
+        limit = asyncio.Semaphore(ACTION_CONCURRENCY)
+
+        async def ban(target):
+            async with limit:
+                await guild.ban(target, reason=reason, delete_message_seconds=delete_seconds)
+
+        results = await asyncio.gather(*(ban(target) for target in targets), return_exceptions=True)
+        banned = [target.id for target, result in zip(targets, results) if not isinstance(result, Exception)]
+        failed = [(target.id, str(result)) for target, result in zip(targets, results) if isinstance(result, Exception)]
+        return banned, failed
+
+    async def send_summary(self, ctx: commands.Context, event_type: str, title: str, color: discord.Color, done: list[int],
+                           failed: list[tuple[int, str]], skipped: list[str], reason: str, extra: dict = None):
+        """Un seul log et une seule réponse pour tout le lot."""
+        logging.info(f"{title} par {ctx.author} (ID: {ctx.author.id}) sur {ctx.guild.name} : {len(done)} réussi(s), {len(failed)} échec(s), {len(skipped)} ignoré(s).")
+
+        log_core = self.bot.get_cog("LogCore")
+        if log_core and done:
+            embed = discord.Embed(title=title, color=color)
+            ids = ", ".join(str(user_id) for user_id in done[:SUMMARY_MAX_IDS])
+            if len(done) > SUMMARY_MAX_IDS:
+                ids += f" … (+{len(done) - SUMMARY_MAX_IDS})"
+            embed.add_field(name=f"Membres ({len(done)})", value=ids, inline=False)
+            embed.add_field(name="Modérateur", value=ctx.author.mention, inline=False)
+            for name, value in (extra or {}).items():
+                embed.add_field(name=name, value=value, inline=True)
+            embed.add_field(name="Raison", value=reason, inline=False)
+            if failed:
+                embed.add_field(name="Échecs", value=str(len(failed)), inline=True)
+            await log_core.send_log(ctx.guild, event_type, embed)
+
+        lines = [f"✅ **{len(done)}** membre(s) sanctionné(s). Raison : *{reason}*"]
+        if failed:
+            lines.append(f"❌ {len(failed)} échec(s) : " + ", ".join(f"`{user_id}`" for user_id, _ in failed[:10]))
+        if skipped:
+            lines.append(f"⚠️ {len(skipped)} ignoré(s) :\n" + "\n".join(f"- {line}" for line in skipped[:10]))
+        await ctx.send("\n".join(lines)[:2000], ephemeral=True)
+
+    def prefix_arguments(self, ctx: commands.Context, targets: str | None, reason: str) -> tuple[str | None, str]:
+        """
+        Forme à préfixe : tout le texte après les durées facultatives arrive dans `targets` (les durées non
+        reconnues sont passées grâce à Optional), on en sépare les cibles en tête et la raison qui suit.
+        En slash, `targets` et `reason` sont deux options distinctes.
+        """
+        if ctx.interaction or not targets:
+            return targets, reason
+        targets, rest = split_targets(targets)
+        return targets or None, rest or reason
+
+    @commands.hybrid_command(name="massban", description="Bannir plusieurs membres d'un coup (raid).")
+    @app_commands.describe(targets="Mentions ou IDs séparés par des espaces", joined_within="Cibler les membres arrivés depuis (ex: 10m, 1h)", delete_messages="Durée des messages à supprimer (ex: 1h, 2d, 0s). Max 7d.", reason="La raison du bannissement")
+    @commands.has_permissions(ban_members=True)
+    async def massban(self, ctx: commands.Context, joined_within: Optional[JoinWindow] = None, delete_messages: Optional[DeleteMessagesDuration] = 0, *, targets: str = None, reason: str = "Aucune raison fournie"):
+        """Bannit un lot de membres (mentions, IDs ou arrivées récentes)."""
+        targets, reason = self.prefix_arguments(ctx, targets, reason)
+        logging.info(f"Action Massban demandée par {ctx.author} (ID: {ctx.author.id}). Cibles: {targets}, arrivés depuis: {joined_within}, Raison: {reason}")
+        if ctx.interaction:
+            await ctx.defer(ephemeral=True)
+
+        resolved = await self.resolve_targets(ctx, targets, joined_within, members_only=False)
+        if resolved is None:
+            return
+        valid, skipped = resolved
+        if not valid:
+            await self.send_summary(ctx, "ban", "🔨 Bannissement groupé", discord.Color.dark_red(), [], [], skipped, reason)
+            return
+
+        # MP avant le bannissement : ensuite le membre ne partage plus de serveur avec le bot
+        await self.notify_targets(valid, f"Tu as été banni du serveur **{ctx.guild.name}**.\nRaison : *{reason}*")
+        banned, failed = await self.ban_targets(ctx.guild, valid, reason, delete_messages)
+        await self.send_summary(ctx, "ban", "🔨 Bannissement groupé", discord.Color.dark_red(), banned, failed, skipped, reason)
+
+    @commands.hybrid_command(name="masskick", description="Exclure plusieurs membres d'un coup (raid).")
+    @app_commands.describe(targets="Mentions ou IDs séparés par des espaces", joined_within="Cibler les membres arrivés depuis (ex: 10m, 1h)", reason="La raison de l'exclusion")
+    @commands.has_permissions(kick_members=True)
+    async def masskick(self, ctx: commands.Context, joined_within: Optional[JoinWindow] = None, *, targets: str = None, reason: str = "Aucune raison fournie"):
+        """Exclut un lot de membres (mentions, IDs ou arrivées récentes)."""
+        targets, reason = self.prefix_arguments(ctx, targets, reason)
+        logging.info(f"Action Masskick demandée par {ctx.author} (ID: {ctx.author.id}). Cibles: {targets}, arrivés depuis: {joined_within}, Raison: {reason}")
+        if ctx.interaction:
+            await ctx.defer(ephemeral=True)
+
+        resolved = await self.resolve_targets(ctx, targets, joined_within, members_only=True)
+        if resolved is None:
+            return
+        valid, skipped = resolved
+
+        # Pipeline par membre : le MP du suivant part pendant l'exclusion du précédent
+        dm_limit, kick_limit = asyncio.Semaphore(DM_CONCURRENCY), asyncio.Semaphore(ACTION_CONCURRENCY)
+
+        async def kick(member: discord.Member):
+            async with dm_limit:
+                try:
+                    await member.send(f"Tu as été exclu du serveur **{ctx.guild.name}**.\nRaison : *{reason}*")
+                except discord.HTTPException:
+                    logging.warning(f"Impossible d'envoyer le MP d'exclusion à {member} (DMs fermés).")
+            async with kick_limit:
+                await member.kick(reason=reason)
+
+        results = await asyncio.gather(*(kick(member) for member in valid), return_exceptions=True)
+        kicked = [member.id for member, result in zip(valid, results) if not isinstance(result, Exception)]
+        failed = [(member.id, str(result)) for member, result in zip(valid, results) if isinstance(result, Exception)]
+        await self.send_summary(ctx, "kick", "👢 Exclusion groupée", discord.Color.orange(), kicked, failed, skipped, reason)
+
+    @commands.hybrid_command(name="masstempban", description="Bannir temporairement plusieurs membres d'un coup (raid).")
+    @app_commands.describe(duration="Durée du ban (ex: 1d, 2h, 30m)", targets="Mentions ou IDs séparés par des espaces", joined_within="Cibler les membres arrivés depuis (ex: 10m, 1h)", delete_messages="Durée des messages à supprimer (ex: 1h, 2d, 0s). Max 7d.", reason="La raison")
+    @commands.has_permissions(ban_members=True)
+    async def masstempban(self, ctx: commands.Context, duration: BanDuration, joined_within: Optional[JoinWindow] = None, delete_messages: Optional[DeleteMessagesDuration] = 0, *, targets: str = None, reason: str = "Aucune raison fournie"):
+        """Bannit temporairement un lot de membres ; la fin des bans est gérée par le cog Tempban."""
+        targets, reason = self.prefix_arguments(ctx, targets, reason)
+        logging.info(f"Action Masstempban demandée par {ctx.author} (ID: {ctx.author.id}). Durée: {duration}, Cibles: {targets}, arrivés depuis: {joined_within}, Raison: {reason}")
+        if ctx.interaction:
+            await ctx.defer(ephemeral=True)
+
+        tempban_cog = self.bot.get_cog("Tempban")
+        if not tempban_cog:
+            await ctx.send("❌ Le module de tempban n'est pas chargé.", ephemeral=True)
+            return
+        seconds, duration = duration, format_duration(duration)
+        resolved = await self.resolve_targets(ctx, targets, joined_within, members_only=False)
+        if resolved is None:
+            return
+        valid, skipped = resolved
+        if not valid:
+            await self.send_summary(ctx, "tempban", "⏳ Tempban groupé", discord.Color.dark_red(), [], [], skipped, reason)
+            return
+
+        await self.notify_targets(valid, f"Tu as été banni temporairement du serveur **{ctx.guild.name}**.\nDurée : **{duration}**\nRaison : *{reason}*")
+        banned, failed = await self.ban_targets(ctx.guild, valid, f"Tempban ({duration}): {reason}", delete_messages)
+
+        # Une seule écriture pour tout le lot
+        unban_time = datetime.now(timezone.utc) + timedelta(seconds=seconds)
+        if banned:
+            try:
+                await tempban_cog.record_tempbans([
+                    {"guild_id": ctx.guild.id, "user_id": user_id, "unban_time": unban_time, "reason": reason}
+                    for user_id in banned
+                ])
+            except Exception as e:
+                logging.error(f"Erreur lors de l'enregistrement des tempbans groupés en DB : {e}")
+                await ctx.send("⚠️ Les membres ont été bannis mais la fin des bans n'a pas pu être enregistrée.", ephemeral=True)
+        await self.send_summary(ctx, "tempban", "⏳ Tempban groupé", discord.Color.dark_red(), banned, failed, skipped, reason, {"Durée": duration})
+
+    @massban.error
+    @masskick.error
+    @masstempban.error
+    async def mass_error(self, ctx: commands.Context, error: commands.CommandError):
+        """Gestionnaire d'erreurs des commandes groupées."""
+        if isinstance(error, commands.MissingRequiredArgument):
+            await ctx.send(f"❌ **Erreur :** Argument manquant. Usage : `{USAGE[ctx.command.name]}`", ephemeral=True)
+        elif message := duration_error_message(error):
+            await ctx.send(f"{message}\nUsage : `{USAGE[ctx.command.name]}`" if not ctx.interaction else message, ephemeral=True)
+
+async def setup(bot):
+    await bot.add_cog(MassModeration(bot))
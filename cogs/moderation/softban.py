@@ -2,35 +2,16 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import logging # --- AJOUT IMPORT LOGGING ---
-import re
-
-def parse_duration_for_softban(duration: str):
-    """
-    Convertit une durée (ex: 1d, 2h, 30m, 0s) en secondes.
-    Spécifique pour le softban, retourne 0 si la durée est invalide ou nulle.
-    """
-    if duration.strip() in ['0', '0s']:
-        return 0
-    regex = re.compile(r"(\d+)([smhd])")
-    matches = regex.findall(duration.lower())
-    if not matches:
-        return None
-    total_seconds = 0
-    for value, unit in matches:
-        if unit == 's': total_seconds += int(value)
-        elif unit == 'm': total_seconds += int(value) * 60
-        elif unit == 'h': total_seconds += int(value) * 3600
-        elif unit == 'd': total_seconds += int(value) * 86400
-    return total_seconds
+from moderation_utils import DeleteMessagesDuration, format_duration, duration_error_message
 
 class Softban(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     @commands.hybrid_command(name="softban", description="Ban puis unban un membre pour supprimer ses messages récents.")
-    @app_commands.describe(member="Le membre à softban", delete_duration="Durée des messages à supprimer (défaut: 7d, max: 7d)", reason="La raison du softban")
+    @app_commands.describe(member="Le membre à softban", delete_duration="Durée des messages à supprimer (défaut et max: 7d, 'all' = 7d)", reason="La raison du softban")
     @commands.has_permissions(ban_members=True)
-    async def softban(self, ctx: commands.Context, member: discord.Member, delete_duration: str = "7d", *, reason: str = "Aucune raison fournie"):
+    async def softban(self, ctx: commands.Context, member: discord.Member, delete_duration: DeleteMessagesDuration = 604800, *, reason: str = "Aucune raison fournie"):
         """Bannit puis débannit un membre pour effacer ses messages."""
         # --- LOGGING DEBUT ACTION ---
         logging.info(f"Action Softban demandée par {ctx.author} (ID: {ctx.author.id}) sur {member} (ID: {member.id}). Raison: {reason}")
@@ -49,19 +30,9 @@ class Softban(commands.Cog):
             await ctx.send("❌ Vous ne pouvez pas softban un membre avec un rôle égal ou supérieur au vôtre.", ephemeral=True)
             return
 
-        # --- PARSE ET VALIDATION DE LA DUREE DE SUPPRESSION ---
-        if "all" in delete_duration.lower():
-             await ctx.send("ℹ️ L'option 'all' n'est pas supportée par Discord. La durée maximale de suppression est de 7 jours (`7d`), qui sera appliquée.", ephemeral=True)
-             delete_seconds = 604800 # On met le max si l'utilisateur demande "all"
-        else:
-            delete_seconds = parse_duration_for_softban(delete_duration)
-            if delete_seconds is None:
-                await ctx.send("❌ Format de durée invalide pour `delete_duration`. Utilisez `s`, `m`, `h`, `d` (ex: `1d`, `2h30m`, `0s`).", ephemeral=True)
-                return
-            if delete_seconds > 604800: # 7 jours
-                await ctx.send("❌ La durée de suppression des messages ne peut pas dépasser 7 jours. C'est une limite de Discord.", ephemeral=True)
-                return
-        
+        # Durée validée et convertie par DeleteMessagesDuration ("all" = 7 jours, le maximum de Discord)
+        delete_seconds = delete_duration
+
         # Envoi du message privé
         try:
             await member.send(
@@ -95,7 +66,7 @@ class Softban(commands.Cog):
                 await log_core.send_log(ctx.guild, "softban", embed)
 
             # Message de confirmation
-            delete_msg_confirmation = f"Suppression des messages des {delete_duration}." if delete_seconds > 0 else "Aucun message supprimé."
+            delete_msg_confirmation = f"Suppression des messages des {format_duration(delete_seconds)}." if delete_seconds > 0 else "Aucun message supprimé."
             await ctx.send(f"✅ **{member.name}** a été softban. {delete_msg_confirmation} Raison : *{reason}*")
         except discord.Forbidden:
             logging.error(f"Erreur Forbidden lors du softban de {member}.")
@@ -112,6 +83,8 @@ class Softban(commands.Cog):
             await ctx.send(f"❌ **Erreur :** Argument manquant. Usage : `.softban <membre> [durée_suppr] [raison]`", ephemeral=True)
         elif isinstance(error, commands.MemberNotFound):
             await ctx.send(f"❌ **Erreur :** Membre `{error.argument}` introuvable.", ephemeral=True)
+        elif message := duration_error_message(error):
+            await ctx.send(message, ephemeral=True)
 
 async def setup(bot):
     await bot.add_cog(Softban(bot))
@@ -3,9 +3,20 @@ from discord.ext import commands, tasks
 from discord import app_commands
 from pymongo import MongoClient
 import os
+import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
-import re
+from scheduler import DelayedJobQueue
+from moderation_utils import BanDuration, DeleteMessagesDuration, format_duration, duration_error_message
+
+# Les fins de ban sont planifiées en mémoire (tas) ; la base n'est relue qu'à cette fréquence, pour
+# rattraper les bans ajoutés par un autre processus ou arrivés dans l'horizon de chargement
+RECONCILE_INTERVAL_MINUTES = 30
+LOAD_HORIZON = timedelta(hours=1) # Seuls les bans qui expirent avant cet horizon sont gardés en mémoire
+UNBAN_BATCH_WINDOW = 1 # secondes : les bans qui expirent ensemble sont traités en un lot
+UNBANS_PER_GUILD = 5 # Débannissements simultanés par serveur
+RETRY_BASE_DELAY = 60 # secondes, doublé à chaque échec
+RETRY_MAX_DELAY = 6 * 3600
 
 class Tempban(commands.Cog):
     def __init__(self, bot):
@@ -20,40 +31,49 @@ class Tempban(commands.Cog):
             self.client = MongoClient(self.mongo_uri)
             self.db = self.client["askar_bot"]
             self.collection = self.db["tempbans"]
+            # Résultat de chaque tentative de débannissement automatique
+            self.outcomes = self.db["tempban_outcomes"]
         except Exception as e:
             logging.error(f"Cog 'Tempban': Erreur MongoDB : {e}")
             raise
 
-        # Démarrage de la boucle de vérification
+        # Fins de ban à venir : une seule tâche qui dort jusqu'à la prochaine échéance
+        self.unbans = DelayedJobQueue(self.expire_tempbans, UNBAN_BATCH_WINDOW, name="tempbans")
+        self.guild_limits = {} # {guild_id: Semaphore}
+
+    async def cog_load(self):
+        # Requête de chargement : égalité sur le serveur, puis plage sur la date de fin
+        # (création bloquante, hors de la boucle pour ne pas retarder les autres extensions)
+        await asyncio.to_thread(self.collection.create_index, [("guild_id", 1), ("unban_time", 1)])
+        self.unbans.start()
         self.check_tempbans.start()
 
     def cog_unload(self):
         self.check_tempbans.cancel()
-
-    def parse_duration(self, duration: str):
-        """Convertit une durée (ex: 1d, 2h, 30m) en secondes."""
-        regex = re.compile(r"(\d+)([smhd])")
-        matches = regex.findall(duration.lower())
-        total_seconds = 0
-        
-        if not matches:
-            return None
-            
-        for value, unit in matches:
-            if unit == 's': total_seconds += int(value)
-            elif unit == 'm': total_seconds += int(value) * 60
-            elif unit == 'h': total_seconds += int(value) * 3600
-            elif unit == 'd': total_seconds += int(value) * 86400
-            
-        return total_seconds
+        self.unbans.stop()
+
+    def schedule_unban(self, ban: dict):
+        # Un ban dont le débannissement a échoué est replanifié à sa prochaine tentative
+        due = ban.get("retry_at") or ban["unban_time"]
+        if due.tzinfo is None: # pymongo renvoie des dates UTC naïves
+            due = due.replace(tzinfo=timezone.utc)
+        self.unbans.schedule(ban["_id"], due.timestamp(), ban)
+
+    async def record_tempbans(self, bans: list[dict]):
+        """Enregistre plusieurs tempbans en une seule requête et planifie leur fin (commandes groupées)."""
+        await asyncio.to_thread(self.collection.insert_many, bans) # Ajoute l'_id à chaque document
+        horizon = datetime.now(timezone.utc) + LOAD_HORIZON
+        for ban in bans:
+            if ban["unban_time"] <= horizon:
+                self.schedule_unban(ban)
 
     @commands.hybrid_command(name="tempban", description="Bannir temporairement un membre.")
     @app_commands.describe(member="Le membre à bannir", duration="Durée du ban (ex: 1d, 2h, 30m)", delete_messages="Durée des messages à supprimer (ex: 1h, 2d, 0s). Max 7d.", reason="La raison")
     @commands.has_permissions(ban_members=True)
-    async def tempban(self, ctx: commands.Context, member: discord.Member, duration: str, delete_messages: str = "0s", *, reason: str = "Aucune raison fournie"):
+    async def tempban(self, ctx: commands.Context, member: discord.Member, duration: BanDuration, delete_messages: DeleteMessagesDuration = 0, *, reason: str = "Aucune raison fournie"):
         """Bannit un membre pour une durée déterminée."""
         # --- LOGGING DEBUT ACTION ---
-        logging.info(f"Action Tempban demandée par {ctx.author} (ID: {ctx.author.id}) sur {member} (ID: {member.id}). Durée: {duration}, Raison: {reason}")
+        logging.info(f"Action Tempban demandée par {ctx.author} (ID: {ctx.author.id}) sur {member} (ID: {member.id}). Durée: {format_duration(duration)}, Raison: {reason}")
 
         if ctx.interaction:
             await ctx.defer(ephemeral=True)
@@ -69,16 +89,9 @@ class Tempban(commands.Cog):
             await ctx.send("❌ Vous ne pouvez pas bannir un membre avec un rôle égal ou supérieur au vôtre.", ephemeral=True)
             return
 
-        # --- PARSE DURATIONS ---
-        seconds = self.parse_duration(duration)
-        if not seconds:
-            await ctx.send("❌ Format de durée invalide. Utilisez `s` (secondes), `m` (minutes), `h` (heures), `d` (jours). Ex: `1d`, `2h30m`.")
-            return
-        
-        delete_seconds = self.parse_duration(delete_messages) if delete_messages not in ["0", "0s"] else 0
-        if delete_seconds is None or delete_seconds > 604800:
-            await ctx.send("❌ Durée de suppression de messages invalide ou supérieure à 7 jours.", ephemeral=True)
-            return
+        # Durées déjà validées et converties en secondes (BanDuration, DeleteMessagesDuration)
+        seconds, delete_seconds = duration, delete_messages
+        duration = format_duration(seconds) # Texte affiché dans le MP, la raison et les logs
 
         unban_time = datetime.now(timezone.utc) + timedelta(seconds=seconds)
 
@@ -111,12 +124,15 @@ class Tempban(commands.Cog):
 
         # Enregistrement dans la BDD
         try:
-            self.collection.insert_one({
+            ban = {
                 "guild_id": ctx.guild.id,
                 "user_id": member.id,
                 "unban_time": unban_time,
                 "reason": reason
-            })
+            }
+            self.collection.insert_one(ban) # Ajoute l'_id au document
+            if unban_time <= datetime.now(timezone.utc) + LOAD_HORIZON:
+                self.schedule_unban(ban)
             # --- LOGGING SUCCES DB ---
             logging.info(f"Tempban: Enregistrement DB réussi pour {member} (Fin: {unban_time}).")
         except Exception as e:
@@ -134,7 +150,7 @@ class Tempban(commands.Cog):
             await log_core.send_log(ctx.guild, "tempban", embed)
 
         # Message de confirmation
-        delete_msg_confirmation = f"Suppression des messages des {delete_messages}." if delete_seconds > 0 else "Aucun message supprimé."
+        delete_msg_confirmation = f"Suppression des messages des {format_duration(delete_seconds)}." if delete_seconds > 0 else "Aucun message supprimé."
         await ctx.send(f"✅ **{member.name}** a été banni pour **{duration}**. {delete_msg_confirmation} Raison : *{reason}*")
 
     @tempban.error
@@ -144,33 +160,80 @@ class Tempban(commands.Cog):
             await ctx.send(f"❌ **Erreur :** Argument manquant. Usage : `.tempban <membre> <durée> [durée_suppr_msg] [raison]`", ephemeral=True)
         elif isinstance(error, commands.MemberNotFound):
             await ctx.send(f"❌ **Erreur :** Membre `{error.argument}` introuvable.", ephemeral=True)
+        elif message := duration_error_message(error):
+            await ctx.send(message, ephemeral=True)
 
-    @tasks.loop(minutes=1)
+    @tasks.loop(minutes=RECONCILE_INTERVAL_MINUTES)
     async def check_tempbans(self):
-        """Vérifie périodiquement les bannissements expirés."""
+        """Recharge depuis la base les bans qui expirent avant l'horizon et les planifie."""
+        horizon = datetime.now(timezone.utc) + LOAD_HORIZON
+        # Limité aux serveurs de ce processus (en mode cluster, chaque processus gère ses propres shards)
+        guild_ids = [guild.id for guild in self.bot.guilds]
+        upcoming = await asyncio.to_thread(lambda: list(self.collection.find({"guild_id": {"$in": guild_ids}, "unban_time": {"$lte": horizon}})))
+        for ban in upcoming:
+            self.schedule_unban(ban)
+
+    async def expire_tempbans(self, jobs: list):
+        """Débannit les membres dont le ban vient d'expirer (appelé par la file au moment exact de l'échéance)."""
+        # Relecture : un ban retiré de la base entre-temps n'est pas traité
+        ids = [ban_id for ban_id, _ in jobs]
+        expired_bans = await asyncio.to_thread(lambda: list(self.collection.find({"_id": {"$in": ids}})))
+        # Serveurs d'un autre processus du cluster ou quittés : le ban reste en base
+        expired_bans = [ban for ban in expired_bans if self.bot.get_guild(ban["guild_id"])]
+        if not expired_bans:
+            return
+
+        outcomes = await asyncio.gather(*(self.unban_expired(ban) for ban in expired_bans))
+
         now = datetime.now(timezone.utc)
-        # On cherche tous les bans dont la date de fin est passée (inférieure à maintenant)
-        expired_bans = list(self.collection.find({"unban_time": {"$lte": now}}))
+        records = []
+        done, retries = [], []
+        for ban, (outcome, error) in zip(expired_bans, outcomes):
+            attempt = ban.get("attempts", 0) + 1
+            records.append({"tempban_id": ban["_id"], "guild_id": ban["guild_id"], "user_id": ban["user_id"],
+                            "attempt": attempt, "outcome": outcome, "error": error, "at": now})
+            if outcome == "failed":
+                # Échec : nouvel essai avec un délai doublé à chaque fois, le ban n'est jamais abandonné
+                retry_at = now + timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempt - 1), RETRY_MAX_DELAY))
+                ban.update(attempts=attempt, retry_at=retry_at)
+                self.schedule_unban(ban)
+                retries.append(ban)
+            else:
+                done.append(ban["_id"])
+
+        def save():
+            if done:
+                self.collection.delete_many({"_id": {"$in": done}})
+            for ban in retries:
+                self.collection.update_one({"_id": ban["_id"]}, {"$set": {"attempts": ban["attempts"], "retry_at": ban["retry_at"]}})
+            self.outcomes.insert_many(records)
+        try:
+            await asyncio.to_thread(save)
+        except Exception as e:
+            logging.error(f"Erreur lors de l'enregistrement des débannissements automatiques : {e}")
 
-        for ban in expired_bans:
-            guild = self.bot.get_guild(ban["guild_id"])
-            if not guild:
-                continue
+        unbanned = sum(1 for outcome, _ in outcomes if outcome == "unbanned")
+        logging.info(f"Tempbans expirés : {unbanned} débanni(s), {len(done) - unbanned} déjà levé(s), {len(retries)} en échec (nouvel essai planifié).")
 
+    async def unban_expired(self, ban: dict) -> tuple[str, str | None]:
+        """Débannit par ID (sans récupérer l'utilisateur). Retourne (résultat, erreur)."""
+        guild = self.bot.get_guild(ban["guild_id"])
+        limit = self.guild_limits.setdefault(guild.id, asyncio.Semaphore(UNBANS_PER_GUILD))
+        async with limit:
             try:
-                # On essaie de débannir l'utilisateur via son ID
-                user = await self.bot.fetch_user(ban["user_id"])
-                await guild.unban(user, reason="Fin du Tempban automatique")
-                logging.info(f"Tempban expiré : {user.name} débanni du serveur {guild.name}.")
+                await guild.unban(discord.Object(id=ban["user_id"]), reason="Fin du Tempban automatique")
+                logging.info(f"Tempban expiré : {ban['user_id']} débanni du serveur {guild.name}.")
+                return "unbanned", None
             except discord.NotFound:
-                logging.warning(f"Utilisateur {ban['user_id']} introuvable pour l'unban.")
-            except discord.Forbidden:
-                logging.warning(f"Permission manquante pour débannir sur {guild.name}.")
+                # Déjà débanni manuellement (ou compte supprimé) : rien à réessayer
+                logging.warning(f"Utilisateur {ban['user_id']} n'est plus banni de {guild.name}.")
+                return "not_banned", None
+            except discord.Forbidden as e:
+                logging.warning(f"Permission manquante pour débannir {ban['user_id']} sur {guild.name}, nouvel essai plus tard.")
+                return "failed", str(e)
             except Exception as e:
-                logging.error(f"Erreur lors de l'unban automatique : {e}")
-            finally:
-                # On retire l'entrée de la BDD qu'il ait été débanni ou non (pour éviter de boucler sur une erreur)
-                self.collection.delete_one({"_id": ban["_id"]})
+                logging.error(f"Erreur lors de l'unban automatique de {ban['user_id']} sur {guild.name} : {e}")
+                return "failed", str(e)
 
     @check_tempbans.before_loop
     async def before_check_tempbans(self):
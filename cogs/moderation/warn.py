@@ -1,12 +1,238 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+from pymongo import MongoClient, ReturnDocument
+import os
+import asyncio
 import logging
+from datetime import datetime, timedelta, timezone
+from cluster import publish, subscribe
+from moderation_utils import BanDuration, format_duration, duration_error_message
+
+PAGE_SIZE = 10 # Avertissements affichés par page de /warnings
+PAGE_TIMEOUT = 300 # secondes avant désactivation des boutons de pagination
+MAX_TIMEOUT = 28 * 86400 # Limite imposée par Discord pour une exclusion temporaire
+# Sanctions possibles d'une règle d'escalade, et si elles demandent une durée
+ESCALATION_ACTIONS = {"timeout": True, "kick": False, "tempban": True, "ban": False}
+ACTION_NAMES = {"timeout": "Exclusion temporaire", "kick": "Expulsion", "tempban": "Ban temporaire", "ban": "Bannissement"}
+# Permission que l'auteur du warn doit avoir pour que la sanction automatique s'applique
+ACTION_PERMISSIONS = {"timeout": "moderate_members", "kick": "kick_members", "tempban": "ban_members", "ban": "ban_members"}
+
+
+class WarningsView(discord.ui.View):
+    """Pagination de l'historique d'un membre : chaque page est lue depuis l'index, à partir du dernier avertissement affiché."""
+
+    def __init__(self, cog, author_id: int, guild_id: int, user: discord.abc.User, total: int):
+        super().__init__(timeout=PAGE_TIMEOUT)
+        self.cog = cog
+        self.author_id = author_id
+        self.guild_id = guild_id
+        self.user = user
+        self.total = total
+        self.pages = max(1, -(-total // PAGE_SIZE))
+        self.page = 0
+        self.cursors = [None] # (date, _id) du dernier avertissement avant chaque page déjà visitée
+        self.message = None
+
+    async def load(self) -> discord.Embed:
+        warnings = await self.cog.fetch_warnings(self.guild_id, self.user.id, self.cursors[self.page])
+        if warnings and len(self.cursors) == self.page + 1:
+            self.cursors.append((warnings[-1]["created_at"], warnings[-1]["_id"]))
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page + 1 >= self.pages or len(warnings) < PAGE_SIZE
+        return self.build_embed(warnings)
+
+    def build_embed(self, warnings: list[dict]) -> discord.Embed:
+        embed = discord.Embed(title=f"⚠️ Avertissements de {self.user}", color=discord.Color.yellow())
+        if not warnings:
+            embed.description = "Aucun avertissement enregistré."
+        for number, warning in enumerate(warnings, start=self.page * PAGE_SIZE + 1):
+            created_at = warning["created_at"].replace(tzinfo=timezone.utc) # pymongo renvoie des dates UTC naïves
+            embed.add_field(
+                name=f"#{number} — {discord.utils.format_dt(created_at, 'f')}",
+                value=f"Par <@{warning['moderator_id']}> : {warning['reason'][:900]}",
+                inline=False
+            )
+        embed.set_footer(text=f"Page {self.page + 1}/{self.pages} — {self.total} avertissement(s) au total")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ Seul l'auteur de la commande peut changer de page.", ephemeral=True)
+            return False
+        return True
+
+    async def show(self, interaction: discord.Interaction):
+        embed = await self.load()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Précédent", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        await self.show(interaction)
+
+    @discord.ui.button(label="Suivant ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await self.show(interaction)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
 
 class Warn(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+        self.mongo_uri = os.getenv("MONGO_URI")
+        if not self.mongo_uri:
+            raise ValueError("La variable d'environnement MONGO_URI est obligatoire.")
+
+        try:
+            self.client = MongoClient(self.mongo_uri)
+            self.db = self.client["askar_bot"]
+            self.warnings = self.db["warnings"]
+            # Compteur par membre ({_id: "guild_id:user_id", count}), incrémenté à chaque avertissement
+            self.counters = self.db["warning_counts"]
+            # Règles d'escalade : une sanction par palier d'avertissements
+            self.escalations = self.db["warn_escalations"]
+        except Exception as e:
+            logging.error(f"Cog 'Warn': Erreur MongoDB : {e}")
+            raise
+
+        # Caches : {(guild_id, user_id): nombre d'avertissements} et {guild_id: {palier: règle}}
+        self.counts = {}
+        self.rules = {}
+        # Les autres processus du cluster signalent les changements de règles
+        subscribe(self.bot, "warn_escalations", lambda guild_id: self.rules.pop(guild_id, None))
+
+    async def cog_load(self):
+        # Créations d'index bloquantes (sélection du serveur) : hors de la boucle, pour ne pas retarder les autres extensions
+        def create_indexes():
+            # Historique : égalité sur le serveur et le membre, puis tri par date et _id (pagination sans skip)
+            self.warnings.create_index([("guild_id", 1), ("user_id", 1), ("created_at", -1), ("_id", -1)])
+            self.escalations.create_index([("guild_id", 1), ("threshold", 1)], unique=True)
+        await asyncio.to_thread(create_indexes)
+
+    # --- Historique et compteur ---
+
+    async def get_count(self, guild_id: int, user_id: int) -> int:
+        """Nombre d'avertissements d'un membre, depuis le cache ou le compteur (jamais de comptage sur l'historique)."""
+        key = (guild_id, user_id)
+        if key not in self.counts:
+            counter = await asyncio.to_thread(self.counters.find_one, {"_id": f"{guild_id}:{user_id}"})
+            self.counts[key] = counter["count"] if counter else 0
+        return self.counts[key]
+
+    async def record_warning(self, guild_id: int, user_id: int, moderator_id: int, reason: str) -> int:
+        """Enregistre un avertissement et retourne le nouveau total du membre."""
+        def save():
+            self.warnings.insert_one({
+                "guild_id": guild_id,
+                "user_id": user_id,
+                "moderator_id": moderator_id,
+                "reason": reason,
+                "created_at": datetime.now(timezone.utc)
+            })
+            return self.counters.find_one_and_update(
+                {"_id": f"{guild_id}:{user_id}"},
+                {"$inc": {"count": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )["count"]
+        count = await asyncio.to_thread(save)
+        self.counts[(guild_id, user_id)] = count
+        return count
+
+    async def fetch_warnings(self, guild_id: int, user_id: int, before: tuple | None) -> list[dict]:
+        """Une page d'historique, du plus récent au plus ancien, après le curseur (date, _id) exclu."""
+        query = {"guild_id": guild_id, "user_id": user_id}
+        if before is not None:
+            # L'_id départage les avertissements de même date : aucun n'est sauté en limite de page
+            created_at, warning_id = before
+            query["$or"] = [{"created_at": {"$lt": created_at}}, {"created_at": created_at, "_id": {"$lt": warning_id}}]
+        return await asyncio.to_thread(lambda: list(self.warnings.find(query).sort([("created_at", -1), ("_id", -1)]).limit(PAGE_SIZE)))
+
+    # --- Escalade ---
+
+    async def get_rules(self, guild_id: int) -> dict:
+        """Règles d'escalade d'un serveur {palier: règle}, depuis le cache."""
+        rules = self.rules.get(guild_id)
+        if rules is None:
+            docs = await asyncio.to_thread(lambda: list(self.escalations.find({"guild_id": guild_id})))
+            rules = {doc["threshold"]: doc for doc in docs}
+            self.rules[guild_id] = rules
+        return rules
+
+    async def escalate(self, ctx: commands.Context, member: discord.Member, count: int) -> str | None:
+        """Applique la sanction prévue pour ce palier ; retourne sa description, ou None si aucune règle ne s'applique."""
+        rule = (await self.get_rules(ctx.guild.id)).get(count)
+        if rule is None:
+            return None
+
+        action, duration = rule["action"], rule.get("duration")
+        reason = f"Escalade automatique : {count} avertissements"
+        description = ACTION_NAMES[action] + (f" ({format_duration(duration)})" if duration else "")
+
+        # /warn ne demande que "Gérer les messages" et accepte un rôle égal : la sanction exige les droits de l'auteur
+        if not getattr(ctx.permissions, ACTION_PERMISSIONS[action]):
+            logging.warning(f"Escalade Warn : {ctx.author} n'a pas la permission '{ACTION_PERMISSIONS[action]}', '{action}' non appliqué à {member}.")
+            return f"{description} non appliqué (permission `{ACTION_PERMISSIONS[action]}` requise)"
+        if ctx.author.top_role <= member.top_role and ctx.author.id != ctx.guild.owner_id:
+            logging.warning(f"Escalade Warn : {ctx.author} n'a pas un rôle supérieur à {member}, '{action}' non appliqué.")
+            return f"{description} non appliqué (rôle égal ou supérieur au vôtre)"
+
+        logging.info(f"Escalade Warn : {description} appliquée à {member} (ID: {member.id}) sur {ctx.guild.name} ({count} avertissements).")
+        note = None
+        try:
+            if action == "timeout":
+                await member.timeout(timedelta(seconds=duration), reason=reason)
+            elif action == "kick":
+                await member.kick(reason=reason)
+            elif action == "ban":
+                await member.ban(reason=reason, delete_message_seconds=0)
+            elif action == "tempban":
+                tempban = self.bot.get_cog("Tempban")
+                if tempban is None:
+                    logging.error("Escalade Warn : le cog 'Tempban' n'est pas chargé, ban temporaire impossible.")
+                    return f"{description} non appliqué (module Tempban indisponible)"
+                await member.ban(reason=f"Tempban ({format_duration(duration)}): {reason}", delete_message_seconds=0)
+                try:
+                    await tempban.record_tempbans([{
+                        "guild_id": ctx.guild.id,
+                        "user_id": member.id,
+                        "unban_time": datetime.now(timezone.utc) + timedelta(seconds=duration),
+                        "reason": reason
+                    }])
+                except Exception as e:
+                    # Le membre est banni : l'échec ne concerne que la fin du ban, à lever manuellement
+                    logging.error(f"Escalade Warn : erreur lors de l'enregistrement du tempban de {member} en DB : {e}")
+                    note = "⚠️ Le membre est banni mais la fin du ban n'a pas pu être enregistrée."
+        except discord.Forbidden:
+            logging.error(f"Escalade Warn : permissions insuffisantes pour appliquer '{action}' à {member}.")
+            return f"{description} non appliqué (permissions insuffisantes)"
+        except Exception as e:
+            logging.error(f"Escalade Warn : erreur lors de l'application de '{action}' à {member} : {e}")
+            return f"{description} non appliqué (erreur)"
+
+        log_core = self.bot.get_cog("LogCore")
+        if log_core:
+            embed = discord.Embed(title="🚨 Sanction automatique (Warn)", color=discord.Color.orange())
+            embed.add_field(name="Membre", value=f"{member.mention} ({member.id})", inline=False)
+            embed.add_field(name="Sanction", value=description, inline=True)
+            embed.add_field(name="Avertissements", value=str(count), inline=True)
+            embed.add_field(name="Déclenchée par", value=ctx.author.mention, inline=False)
+            if note:
+                embed.add_field(name="Attention", value=note, inline=False)
+            await log_core.send_log(ctx.guild, "warn", embed)
+        return f"{description} — {note}" if note else description
+
     @commands.hybrid_command(name="warn", description="Envoyer un avertissement à un membre.")
     @app_commands.describe(member="Le membre à avertir", reason="La raison de l'avertissement (obligatoire)")
     @commands.has_permissions(manage_messages=True)
@@ -45,23 +271,39 @@ class Warn(commands.Cog):
         except Exception as e:
             logging.error(f"Erreur lors de l'envoi du MP de warn à {member}: {e}")
 
-        # Confirmation et Logging
+        # Enregistrement dans la BDD (même si le MP n'a pas pu être envoyé)
+        count = None
+        try:
+            count = await self.record_warning(ctx.guild.id, member.id, ctx.author.id, reason)
+            logging.info(f"Warn: Enregistrement DB réussi pour {member} ({count} avertissement(s)).")
+        except Exception as e:
+            logging.error(f"Erreur lors de l'enregistrement du warn en DB pour {member} : {e}")
+
+        # --- ENVOI LOG DISCORD ---
+        log_core = self.bot.get_cog("LogCore")
+        if log_core:
+            embed = discord.Embed(title="⚠️ Membre Averti (Warn)", color=discord.Color.yellow())
+            embed.add_field(name="Membre", value=f"{member.mention} ({member.id})", inline=False)
+            embed.add_field(name="Modérateur", value=ctx.author.mention, inline=False)
+            embed.add_field(name="Raison", value=reason, inline=False)
+            if count is not None:
+                embed.add_field(name="Avertissements", value=str(count), inline=True)
+            await log_core.send_log(ctx.guild, "warn", embed)
+
+        # Escalade : la règle du palier atteint est lue dans le cache, à partir du compteur renvoyé
+        escalation = await self.escalate(ctx, member, count) if count is not None else None
+
+        # Confirmation
+        total = f" ({count} avertissement(s) au total)" if count is not None else ""
         if sent_dm:
             logging.info(f"Succès : Warn envoyé à {member}.")
-            
-            # --- ENVOI LOG DISCORD ---
-            log_core = self.bot.get_cog("LogCore")
-            if log_core:
-                embed = discord.Embed(title="⚠️ Membre Averti (Warn)", color=discord.Color.yellow())
-                embed.add_field(name="Membre", value=f"{member.mention} ({member.id})", inline=False)
-                embed.add_field(name="Modérateur", value=ctx.author.mention, inline=False)
-                embed.add_field(name="Raison", value=reason, inline=False)
-                await log_core.send_log(ctx.guild, "warn", embed)
-
-            await ctx.send(f"⚠️ **{member.name}** a été averti(e). Raison : *{reason}*")
+            message = f"⚠️ **{member.name}** a été averti(e){total}. Raison : *{reason}*"
         else:
             logging.info(f"Succès (Partiel) : Warn enregistré pour {member} (MP non envoyé).")
-            await ctx.send(f"⚠️ **{member.name}** a été averti(e) (Impossible de lui envoyer un MP). Raison : *{reason}*")
+            message = f"⚠️ **{member.name}** a été averti(e){total} (Impossible de lui envoyer un MP). Raison : *{reason}*"
+        if escalation:
+            message += f"\n🚨 Sanction automatique : **{escalation}**."
+        await ctx.send(message)
 
     @warn.error
     async def warn_error(self, ctx, error):
@@ -72,5 +314,153 @@ class Warn(commands.Cog):
             elif error.param.name == 'member':
                 await ctx.send("❌ **Erreur :** Vous devez mentionner un membre.\nUsage : `.warn @membre <raison>`", ephemeral=True)
 
+    @commands.hybrid_command(name="warnings", description="Afficher l'historique des avertissements d'un membre.")
+    @app_commands.describe(member="Le membre (ou son ID, s'il a quitté le serveur)")
+    @commands.has_permissions(manage_messages=True)
+    async def warnings_list(self, ctx: commands.Context, member: discord.User):
+        """Affiche les avertissements d'un membre, page par page."""
+        if ctx.interaction:
+            await ctx.defer(ephemeral=True)
+
+        try:
+            total = await self.get_count(ctx.guild.id, member.id)
+            view = WarningsView(self, ctx.author.id, ctx.guild.id, member, total)
+            embed = await view.load()
+        except Exception as e:
+            logging.error(f"Erreur lors de la lecture des avertissements de {member} : {e}")
+            await ctx.send("❌ Impossible de lire l'historique des avertissements.", ephemeral=True)
+            return
+
+        if view.pages == 1:
+            await ctx.send(embed=embed, ephemeral=True)
+        else:
+            view.message = await ctx.send(embed=embed, view=view, ephemeral=True)
+
+    @commands.hybrid_command(name="warnings-clear", description="Effacer tous les avertissements d'un membre.")
+    @app_commands.describe(member="Le membre (ou son ID, s'il a quitté le serveur)")
+    @commands.has_permissions(ban_members=True)
+    async def warnings_clear(self, ctx: commands.Context, member: discord.User):
+        """Efface l'historique et remet le compteur d'un membre à zéro."""
+        logging.info(f"Action Warnings-clear demandée par {ctx.author} (ID: {ctx.author.id}) sur {member} (ID: {member.id}).")
+
+        if ctx.interaction:
+            await ctx.defer(ephemeral=True)
+
+        def clear():
+            deleted = self.warnings.delete_many({"guild_id": ctx.guild.id, "user_id": member.id}).deleted_count
+            self.counters.delete_one({"_id": f"{ctx.guild.id}:{member.id}"})
+            return deleted
+        try:
+            deleted = await asyncio.to_thread(clear)
+            self.counts[(ctx.guild.id, member.id)] = 0
+        except Exception as e:
+            logging.error(f"Erreur lors de l'effacement des avertissements de {member} : {e}")
+            await ctx.send("❌ Impossible d'effacer les avertissements.", ephemeral=True)
+            return
+
+        log_core = self.bot.get_cog("LogCore")
+        if log_core and deleted:
+            embed = discord.Embed(title="🧹 Avertissements effacés", color=discord.Color.light_grey())
+            embed.add_field(name="Membre", value=f"{member.mention} ({member.id})", inline=False)
+            embed.add_field(name="Modérateur", value=ctx.author.mention, inline=False)
+            embed.add_field(name="Avertissements effacés", value=str(deleted), inline=True)
+            await log_core.send_log(ctx.guild, "warn", embed)
+
+        await ctx.send(f"✅ {deleted} avertissement(s) de **{member.name}** effacé(s).", ephemeral=True)
+
+    @warnings_list.error
+    @warnings_clear.error
+    async def warnings_error(self, ctx, error):
+        if isinstance(error, commands.MissingRequiredArgument):
+            await ctx.send(f"❌ **Erreur :** Vous devez indiquer un membre.\nUsage : `.{ctx.command.name} @membre`", ephemeral=True)
+        elif isinstance(error, commands.UserNotFound):
+            await ctx.send(f"❌ **Erreur :** Utilisateur `{error.argument}` introuvable.", ephemeral=True)
+
+    # --- Configuration de l'escalade ---
+
+    @app_commands.command(name="warn-escalation-set", description="Définir la sanction appliquée à un nombre d'avertissements.")
+    @app_commands.describe(
+        threshold="Nombre d'avertissements qui déclenche la sanction",
+        action="La sanction (timeout, kick, tempban, ban)",
+        duration="Durée pour timeout / tempban (ex: 1h, 1d)"
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    async def escalation_set(self, interaction: discord.Interaction, threshold: app_commands.Range[int, 1, 100], action: str, duration: app_commands.Transform[int, BanDuration] = None):
+        """Ajoute ou remplace la règle d'un palier."""
+        if action not in ESCALATION_ACTIONS:
+            await interaction.response.send_message("❌ Sanction inconnue. Choisissez parmi la liste proposée.", ephemeral=True)
+            return
+        if ESCALATION_ACTIONS[action] and duration is None:
+            await interaction.response.send_message(f"❌ Une durée est obligatoire pour la sanction **{action}**.", ephemeral=True)
+            return
+        if action == "timeout" and duration > MAX_TIMEOUT:
+            await interaction.response.send_message("❌ Une exclusion temporaire ne peut pas dépasser 28 jours.", ephemeral=True)
+            return
+        if not ESCALATION_ACTIONS[action]:
+            duration = None
+
+        try:
+            await asyncio.to_thread(
+                self.escalations.update_one,
+                {"guild_id": interaction.guild_id, "threshold": threshold},
+                {"$set": {"action": action, "duration": duration}},
+                upsert=True
+            )
+            self.rules.pop(interaction.guild_id, None)
+            publish(self.bot, "warn_escalations", interaction.guild_id)
+        except Exception as e:
+            logging.error(f"Erreur configuration escalade Warn : {e}")
+            await interaction.response.send_message("❌ Une erreur est survenue.", ephemeral=True)
+            return
+
+        description = ACTION_NAMES[action] + (f" ({format_duration(duration)})" if duration else "")
+        await interaction.response.send_message(f"✅ À **{threshold}** avertissements : **{description}**.", ephemeral=True)
+
+    @escalation_set.autocomplete('action')
+    async def action_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [
+            app_commands.Choice(name=f"{action} ({name})", value=action)
+            for action, name in ACTION_NAMES.items()
+            if current.lower() in action
+        ]
+
+    @escalation_set.error
+    async def escalation_set_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if message := duration_error_message(error):
+            await interaction.response.send_message(message, ephemeral=True)
+
+    @app_commands.command(name="warn-escalation-remove", description="Supprimer la sanction d'un palier d'avertissements.")
+    @app_commands.describe(threshold="Le palier à supprimer")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def escalation_remove(self, interaction: discord.Interaction, threshold: int):
+        try:
+            result = await asyncio.to_thread(self.escalations.delete_one, {"guild_id": interaction.guild_id, "threshold": threshold})
+            self.rules.pop(interaction.guild_id, None)
+            publish(self.bot, "warn_escalations", interaction.guild_id)
+        except Exception as e:
+            logging.error(f"Erreur suppression escalade Warn : {e}")
+            await interaction.response.send_message("❌ Une erreur est survenue.", ephemeral=True)
+            return
+
+        if result.deleted_count:
+            await interaction.response.send_message(f"✅ Règle du palier **{threshold}** supprimée.", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"❌ Aucune règle pour le palier **{threshold}**.", ephemeral=True)
+
+    @app_commands.command(name="warn-escalation-list", description="Afficher les sanctions automatiques liées aux avertissements.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def escalation_list(self, interaction: discord.Interaction):
+        rules = await self.get_rules(interaction.guild_id)
+        if not rules:
+            await interaction.response.send_message("Aucune sanction automatique configurée.", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="🚨 Escalade des avertissements", color=discord.Color.orange())
+        embed.description = "\n".join(
+            f"**{threshold}** avertissements → {ACTION_NAMES[rule['action']]}" + (f" ({format_duration(rule['duration'])})" if rule.get("duration") else "")
+            for threshold, rule in sorted(rules.items())
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 async def setup(bot):
-    await bot.add_cog(Warn(bot))
\ No newline at end of file
+    await bot.add_cog(Warn(bot))
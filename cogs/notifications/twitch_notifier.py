@@ -5,9 +5,28 @@ from pymongo import MongoClient
 import asyncio
 import os
 import logging
-from twitchAPI.helper import first
 from twitchAPI.twitch import Twitch
 from datetime import datetime, timezone
+from cluster import is_leader, get_messageable, role_mention, publish, subscribe, cluster_id
+from twitch_api import HelixClient, get_user_cache
+from twitch_eventsub import EventSubReceiver, eventsub_config, sync_subscriptions
+from scheduler import DelayedJobQueue
+from cadence import AdaptiveCadence
+from twitch_api import MAX_LOGINS_PER_REQUEST
+
+# Cadence adaptative : la boucle tourne toutes les 30s mais chaque streamer a son propre intervalle
+POLL_TICK_SECONDS = 30
+POLL_MIN_INTERVAL = 30 # Autour des heures de live habituelles du streamer
+POLL_BASE_INTERVAL = 60
+POLL_MAX_INTERVAL = 600 # Streamers inactifs depuis longtemps
+POLL_BUDGET_PER_HOUR = int(os.getenv("TWITCH_POLL_BUDGET", "1200")) # Requêtes get_streams par heure
+# En mode EventSub, le polling ne sert plus qu'à rattraper les événements manqués
+RECONCILE_INTERVAL_MINUTES = 10
+# stream.online arrive parfois avant que Helix ne liste le stream : nouvelles tentatives après ces délais (s)
+ONLINE_FETCH_DELAYS = (0, 2, 5)
+# La miniature d'un stream n'est générée qu'après quelques minutes : elle est rafraîchie après ce délai
+IMAGE_UPDATE_DELAY = 120
+IMAGE_UPDATE_BATCH_WINDOW = 5 # secondes : les rafraîchissements proches sont regroupés en une requête
 
 class TwitchNotifier(commands.Cog):
     def __init__(self, bot):
@@ -23,6 +42,12 @@ class TwitchNotifier(commands.Cog):
             self.client = MongoClient(self.mongo_uri)
             self.db = self.client["askar_bot"] # Utilisation de la BDD principale
             self.collection = self.db["twitch_notifications"]
+            # Sessions de live en cours, pour ne rien perdre ni renvoyer après un redémarrage
+            self.sessions_collection = self.db["twitch_live_sessions"]
+            self.cadence = AdaptiveCadence(
+                self.db["notifier_activity"], "twitch", POLL_MIN_INTERVAL, POLL_BASE_INTERVAL, POLL_MAX_INTERVAL,
+                POLL_BUDGET_PER_HOUR, cost_per_poll=1 / MAX_LOGINS_PER_REQUEST
+            )
             logging.info("Cog 'TwitchNotifier': Connexion à MongoDB réussie.")
         except Exception as e:
             logging.error(f"Cog 'TwitchNotifier': Erreur lors de la connexion à MongoDB : {e}")
@@ -36,9 +61,17 @@ class TwitchNotifier(commands.Cog):
             raise ValueError("Les variables d'environnement TWITCH_CLIENT_ID et TWITCH_CLIENT_SECRET sont requises.")
         
         self.twitch = None # Sera initialisé de manière asynchrone
-
-        # Dictionnaire pour suivre les sessions de stream déjà notifiées {user_login: {stream_id, message, start_time}}
-        self.notified_streams = {} # {user_login: {'stream_id', 'message', 'start_time', 'image_update_task'}}
+        self.helix = None # Client Helix pour les requêtes par lots (limite de débit suivie)
+        self.users = None # Cache des utilisateurs Twitch partagé avec TwitchFollower
+        self.eventsub = eventsub_config() # None = mode polling seul
+        self.eventsub_receiver = None
+
+        # Sessions de stream déjà notifiées, par serveur : un même streamer peut être suivi par plusieurs serveurs
+        # Le message est gardé sous forme d'IDs et reconstruit en PartialMessage (sans appel API) quand on y répond
+        self.notified_streams = {} # {(guild_id, user_login): {'stream_id', 'channel_id', 'message_id', 'start_time'}}
+        # Rafraîchissements de miniature planifiés : une seule tâche pour tous les streams
+        self.image_updates = DelayedJobQueue(self.refresh_thumbnails, IMAGE_UPDATE_BATCH_WINDOW, name="miniatures Twitch")
+        self.sending = set() # {(guild_id, user_login, stream_id)} notifications en cours d'envoi (polling et EventSub)
 
         # Démarrage de la tâche en arrière-plan
         self.bot.loop.create_task(self.initialize_twitch_and_start_loop())
@@ -48,7 +81,14 @@ class TwitchNotifier(commands.Cog):
         try:
             self.twitch = await Twitch(self.twitch_client_id, self.twitch_client_secret, target_app_auth_scope=None)
             await self.twitch.authenticate_app([]) # Force l'authentification de l'application au démarrage
+            self.helix = HelixClient(self.twitch)
+            self.users = get_user_cache(self.bot, self.helix)
             logging.info("Cog 'TwitchNotifier': Client Twitch API initialisé avec succès.")
+            await self.load_sessions()
+            await self.cadence.load()
+            self.image_updates.start()
+            if self.eventsub:
+                await self.start_eventsub()
             self.check_streams.start()
         except Exception as e:
             logging.error(f"Cog 'TwitchNotifier': Échec de l'initialisation du client Twitch API : {e}")
@@ -56,163 +96,285 @@ class TwitchNotifier(commands.Cog):
     def cog_unload(self):
         """Arrête la tâche lorsque le cog est déchargé."""
         self.check_streams.cancel()
-
-    @tasks.loop(minutes=1)
+        self.image_updates.stop()
+        if self.helix:
+            self.bot.loop.create_task(self.helix.close())
+        if self.eventsub_receiver:
+            self.bot.loop.create_task(self.eventsub_receiver.stop())
+
+    async def load_sessions(self):
+        """Recharge les sessions de live notifiées avant le redémarrage."""
+        sessions = await asyncio.to_thread(lambda: list(self.sessions_collection.find({})))
+        for session in sessions:
+            start_time = session['started_at']
+            if start_time.tzinfo is None: # pymongo renvoie des dates UTC naïves
+                start_time = start_time.replace(tzinfo=timezone.utc)
+            self.notified_streams[(session['guild_id'], session['login'])] = {
+                'stream_id': session['stream_id'],
+                'channel_id': session['channel_id'],
+                'message_id': session['message_id'],
+                'start_time': start_time
+            }
+        if sessions:
+            logging.info(f"Cog 'TwitchNotifier': {len(sessions)} session(s) de live restaurée(s).")
+
+    def session_message(self, key: tuple) -> discord.PartialMessage:
+        """Message de notification d'une session, sans le récupérer depuis l'API."""
+        session = self.notified_streams[key]
+        return get_messageable(self.bot, session['channel_id'], key[0]).get_partial_message(session['message_id'])
+
+    async def start_eventsub(self):
+        """Démarre le récepteur EventSub ; le polling passe en réconciliation basse fréquence."""
+        # Un port par processus du cluster ; un récepteur qui n'est pas leader transmet les événements au leader
+        self.eventsub_receiver = EventSubReceiver(self.eventsub['secret'], self.handle_eventsub, port=self.eventsub['port'] + cluster_id(self.bot))
+        await self.eventsub_receiver.start()
+        subscribe(self.bot, "twitch_eventsub", self.on_remote_eventsub)
+        self.check_streams.change_interval(minutes=RECONCILE_INTERVAL_MINUTES)
+        logging.info(f"Cog 'TwitchNotifier': mode EventSub activé, réconciliation toutes les {RECONCILE_INTERVAL_MINUTES} minutes.")
+
+    @tasks.loop(seconds=POLL_TICK_SECONDS)
     async def check_streams(self):
         """Vérifie périodiquement si les streamers enregistrés sont en live."""
+        # En mode cluster, un seul processus interroge l'API Twitch
+        if not is_leader(self.bot):
+            return
+
         all_alerts = list(self.collection.find({}))
         if not all_alerts:
             return
 
-        streamer_logins = [alert['twitch_username'] for alert in all_alerts]
-        
+        # Index login -> alertes : un streamer suivi par plusieurs serveurs n'est demandé qu'une fois
+        alerts_by_login = {}
+        for alert in all_alerts:
+            alerts_by_login.setdefault(alert['twitch_username'].lower(), []).append(alert)
+
+        if self.eventsub:
+            await self.sync_eventsub(list(alerts_by_login))
+
+        logins = list(alerts_by_login)
+        if not self.eventsub:
+            # Seuls les streamers arrivés à échéance sont interrogés ; ceux en live gardent l'intervalle de base
+            logins = self.cadence.due(logins, active={key[1] for key in self.notified_streams})
+            if not logins:
+                return
+
+        # Lots de 100 logins interrogés en parallèle ; les logins d'un lot en échec sont ignorés pour ce cycle
+        live_streams, failed_logins = await self.helix.get_streams(logins)
+        if failed_logins and len(failed_logins) == len(logins):
+            return
+        polled = set(logins) - failed_logins
+
+        notifications = [self.notify_live(stream_data, alerts_by_login.get(login, [])) for login, stream_data in live_streams.items()]
+
+        # Streams terminés (ou alertes supprimées) : réponse "live terminé"
+        # (un streamer non interrogé ou dont le lot a échoué n'est pas considéré hors ligne)
+        for key in [key for key in self.notified_streams if (key[1] in polled or key[1] not in alerts_by_login) and key[1] not in live_streams and key[1] not in failed_logins]:
+            notifications.append(self.send_offline_notification(key))
+
+        await self.run_notifications(notifications)
+
+    async def run_notifications(self, notifications: list):
+        """Envoie les notifications en parallèle ; une erreur sur un serveur n'affecte pas les autres."""
+        results = await asyncio.gather(*notifications, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"Erreur lors de l'envoi d'une notification Twitch : {result}")
+
+    async def notify_live(self, stream_data, alerts: list[dict]):
+        """Notifie un live aux serveurs abonnés qui ne l'ont pas encore été pour cette session."""
+        login = stream_data.user_login.lower()
+        pending = [
+            alert for alert in alerts
+            if self.notified_streams.get((alert['guild_id'], login), {}).get('stream_id') != stream_data.id
+            and (alert['guild_id'], login, stream_data.id) not in self.sending
+        ]
+        if not pending:
+            return
+
+        # Premier serveur notifié pour ce stream (ni déjà notifié, ni en cours d'envoi) : l'heure de début nourrit la cadence adaptative
+        first_notification = not any(
+            session['stream_id'] == stream_data.id for key, session in self.notified_streams.items() if key[1] == login
+        ) and not any(key[1] == login and key[2] == stream_data.id for key in self.sending)
+
+        # Réserve les envois avant toute attente : un cycle de polling et un événement EventSub simultanés ne notifient qu'une fois
+        sending = {(alert['guild_id'], login, stream_data.id) for alert in pending}
+        self.sending |= sending
         try:
-            # Appel API pour récupérer les informations de tous les streams en une seule fois
-            live_streams = {stream.user_login.lower(): stream async for stream in self.twitch.get_streams(user_login=streamer_logins)}
+            if first_notification:
+                try:
+                    await self.cadence.record(login, stream_data.started_at)
+                except Exception as e:
+                    logging.error(f"Erreur lors de l'enregistrement de la cadence de {login} : {e}")
+            logging.info(f"{login} est en live ! Envoi de la notification à {len(pending)} serveur(s).")
+            # Une seule requête pour la photo de profil, partagée par tous les serveurs abonnés
+            profile_image_url = await self.get_user_profile_image(stream_data.user_login)
+            await self.run_notifications([self.send_live_notification(alert, stream_data, profile_image_url) for alert in pending])
+        finally:
+            self.sending -= sending
+
+    async def sync_eventsub(self, logins: list[str]):
+        """Crée/supprime les abonnements stream.online/offline pour coller aux alertes configurées."""
+        try:
+            users = await self.users.get_users(logins)
+            await sync_subscriptions(self.helix, self.eventsub['callback'], self.eventsub['secret'], {user.id for user in users.values() if user})
         except Exception as e:
-            logging.error(f"Erreur lors de la récupération des streams Twitch : {e}")
+            logging.error(f"Erreur lors de la synchronisation des abonnements EventSub : {e}")
+
+    async def handle_eventsub(self, subscription_type: str, event: dict):
+        """Événement reçu par le récepteur de ce processus."""
+        if not is_leader(self.bot):
+            # L'état des notifications est tenu par le leader : on lui transmet l'événement
+            publish(self.bot, "twitch_eventsub", {"type": subscription_type, "event": event})
             return
+        await self.process_eventsub(subscription_type, event)
 
-        for alert in all_alerts:
-            username = alert['twitch_username']
-            stream_data = live_streams.get(username.lower())
-
-            if stream_data: # Le streamer est en live
-                # Vérifie si on a déjà notifié pour cette session de stream
-                if username not in self.notified_streams or self.notified_streams[username]['stream_id'] != stream_data.id:
-                    logging.info(f"{username} est en live ! Envoi de la notification.")
-                    
-                    # Préparation et envoi de la notification
-                    channel = self.bot.get_channel(alert['discord_channel_id'])
-                    role = channel.guild.get_role(alert['role_id']) if alert.get('role_id') else None
-                    
-                    custom_message = alert.get('custom_message')
-                    role_mention = role.mention if role else ""
-
-                    if custom_message is not None: # Si un message perso est défini (même vide)
-                        content_message = custom_message.format(
-                            streamer=stream_data.user_name,
-                            game=stream_data.game_name or "Non spécifié",
-                            mention=role_mention
-                        )
-                    else:
-                        # Message par défaut
-                        game_name = stream_data.game_name or "Non spécifié"
-                        content_message = f"🟣 **{stream_data.user_name}**: *Stream On* sur **\"{game_name}\"** !"
-                        if role:
-                            content_message += f"\n-# Hey {role_mention} !"
-
-                    if channel:
-                        embed = discord.Embed(
-                            title=f"🔴 {stream_data.user_name} est en live sur Twitch !",
-                            description=f"**{stream_data.title}**",
-                            url=f"https://twitch.tv/{stream_data.user_login}",
-                            color=discord.Color.purple()
-                        )
-                        # Utilise la miniature du stream comme image principale
-                        embed.add_field(name="Jeu", value=stream_data.game_name or "Non spécifié", inline=True)
-                        thumbnail_url = stream_data.thumbnail_url.replace('{width}', '440').replace('{height}', '248')
-                        embed.set_image(url=f"{thumbnail_url}?_={int(datetime.now().timestamp())}")
-                        
-                        # On récupère la photo de profil via une autre méthode pour éviter l'erreur d'authentification
-                        profile_image_url = await self.get_user_profile_image(stream_data.user_login)
-                        if profile_image_url:
-                            embed.set_thumbnail(url=profile_image_url)
-
-                        embed.set_footer(text=f"Rejoignez le live !")
-                        try:
-                            sent_message = await channel.send(content=content_message, embed=embed)
-                            # Stocker les informations pour la notification de fin
-                            self.notified_streams[username] = {
-                                'stream_id': stream_data.id,
-                                'message': sent_message,
-                                'start_time': stream_data.started_at,
-                                'image_update_task': None # Initialise la tâche de mise à jour d'image
-                            }
-                            # Planifier la mise à jour de l'image après un court délai
-                            self.notified_streams[username]['image_update_task'] = self.bot.loop.create_task(
-                                self.schedule_image_update(username, stream_data.id, sent_message)
-                            )
-                        except discord.Forbidden:
-                            logging.warning(f"Permission manquante pour envoyer un message dans le salon {channel.id}")
-            else: # Le streamer n'est pas en live
-                # Si le streamer était dans notre liste de notifiés, on le retire
-                if username in self.notified_streams:
-                    notification_data = self.notified_streams[username]
-                    original_message = notification_data['message']
-                    # Annuler la tâche de mise à jour d'image si elle est toujours en attente
-                    if notification_data['image_update_task'] and not notification_data['image_update_task'].done():
-                        notification_data['image_update_task'].cancel()
-                        logging.debug(f"Tâche de mise à jour d'image annulée pour {username}.")
-                    start_time = notification_data['start_time']
-                    duration = datetime.now(timezone.utc) - start_time
-
-                    # Formatter la durée en H/M/S
-                    hours, remainder = divmod(int(duration.total_seconds()), 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    duration_str = f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m {seconds}s"
-
-                    offline_embed = discord.Embed(
-                        description=f"Le live est terminé. Durée : **{duration_str}**",
-                        color=discord.Color.dark_grey()
-                    )
-                    try:
-                        await original_message.reply(embed=offline_embed)
-                    except (discord.Forbidden, discord.NotFound):
-                        logging.warning(f"Impossible de répondre au message de notification pour {username}.")
-                    del self.notified_streams[username]
+    def on_remote_eventsub(self, payload: dict):
+        if is_leader(self.bot):
+            self.bot.loop.create_task(self.process_eventsub(payload["type"], payload["event"]))
+
+    async def process_eventsub(self, subscription_type: str, event: dict):
+        login = event["broadcaster_user_login"].lower()
+        if subscription_type == "stream.offline":
+            await self.run_notifications([self.send_offline_notification(key) for key in list(self.notified_streams) if key[1] == login])
+            return
+
+        alerts = list(self.collection.find({"twitch_username": login}))
+        if not alerts:
+            return
+        # stream.online ne contient ni titre ni jeu : on récupère le stream complet
+        for delay in ONLINE_FETCH_DELAYS:
+            await asyncio.sleep(delay)
+            live_streams, _ = await self.helix.get_streams([login])
+            if login in live_streams:
+                await self.notify_live(live_streams[login], alerts)
+                return
+        logging.warning(f"EventSub : {login} annoncé en live mais introuvable via Helix, la réconciliation prendra le relais.")
+
+    def build_live_embed(self, stream_data, profile_image_url: str | None) -> discord.Embed:
+        embed = discord.Embed(
+            title=f"🔴 {stream_data.user_name} est en live sur Twitch !",
+            description=f"**{stream_data.title}**",
+            url=f"https://twitch.tv/{stream_data.user_login}",
+            color=discord.Color.purple()
+        )
+        # Utilise la miniature du stream comme image principale
+        embed.add_field(name="Jeu", value=stream_data.game_name or "Non spécifié", inline=True)
+        thumbnail_url = stream_data.thumbnail_url.replace('{width}', '440').replace('{height}', '248')
+        embed.set_image(url=f"{thumbnail_url}?_={int(datetime.now().timestamp())}")
+        if profile_image_url:
+            embed.set_thumbnail(url=profile_image_url)
+
+        embed.set_footer(text=f"Rejoignez le live !")
+        return embed
+
+    async def send_live_notification(self, alert: dict, stream_data, profile_image_url: str | None):
+        """Envoie la notification de live d'un streamer dans le salon configuré d'un serveur."""
+        login = alert['twitch_username'].lower()
+        key = (alert['guild_id'], login)
+
+        # Préparation et envoi de la notification
+        channel = get_messageable(self.bot, alert['discord_channel_id'], alert.get('guild_id'))
+        mention = role_mention(channel.guild, alert.get('role_id'))
+        
+        custom_message = alert.get('custom_message')
+
+        if custom_message is not None: # Si un message perso est défini (même vide)
+            content_message = custom_message.format(
+                streamer=stream_data.user_name,
+                game=stream_data.game_name or "Non spécifié",
+                mention=mention
+            )
+        else:
+            # Message par défaut
+            game_name = stream_data.game_name or "Non spécifié"
+            content_message = f"🟣 **{stream_data.user_name}**: *Stream On* sur **\"{game_name}\"** !"
+            if mention:
+                content_message += f"\n-# Hey {mention} !"
+
+        embed = self.build_live_embed(stream_data, profile_image_url)
+        try:
+            sent_message = await channel.send(content=content_message, embed=embed)
+            # Stocker les informations pour la notification de fin
+            self.notified_streams[key] = {
+                'stream_id': stream_data.id,
+                'channel_id': sent_message.channel.id,
+                'message_id': sent_message.id,
+                'start_time': stream_data.started_at
+            }
+            await asyncio.to_thread(
+                self.sessions_collection.replace_one,
+                {"_id": f"{key[0]}:{key[1]}"},
+                {"guild_id": key[0], "login": key[1], "stream_id": stream_data.id, "channel_id": sent_message.channel.id,
+                 "message_id": sent_message.id, "started_at": stream_data.started_at},
+                upsert=True
+            )
+            # Planifier la mise à jour de l'image après un court délai
+            self.image_updates.schedule_in(key, IMAGE_UPDATE_DELAY, stream_data.id)
+        except discord.Forbidden:
+            logging.warning(f"Permission manquante pour envoyer un message dans le salon {channel.id}")
+
+    async def send_offline_notification(self, key: tuple):
+        """Répond "live terminé" au message de notification d'un serveur et oublie la session."""
+        if key not in self.notified_streams:
+            return
+        original_message = self.session_message(key)
+        notification_data = self.notified_streams.pop(key)
+        await asyncio.to_thread(self.sessions_collection.delete_one, {"_id": f"{key[0]}:{key[1]}"})
+        login = key[1]
+        # Annuler la mise à jour d'image si elle est toujours en attente
+        self.image_updates.cancel(key)
+        start_time = notification_data['start_time']
+        duration = datetime.now(timezone.utc) - start_time
+
+        # Formatter la durée en H/M/S
+        hours, remainder = divmod(int(duration.total_seconds()), 3600)
+        minutes, seconds = divmod(remainder, 60)
+        duration_str = f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m {seconds}s"
+
+        offline_embed = discord.Embed(
+            description=f"Le live est terminé. Durée : **{duration_str}**",
+            color=discord.Color.dark_grey()
+        )
+        try:
+            await original_message.reply(embed=offline_embed)
+        except (discord.Forbidden, discord.NotFound):
+            logging.warning(f"Impossible de répondre au message de notification pour {login} (serveur {key[0]}).")
 
     @check_streams.before_loop
     async def before_check_streams(self):
         await self.bot.wait_until_ready()
 
-    async def schedule_image_update(self, twitch_username: str, stream_id: str, message_to_edit: discord.Message):
+    async def refresh_thumbnails(self, jobs: list[tuple]):
         """
-        Planifie une mise à jour de l'image de l'embed après un délai,
-        pour s'assurer que la miniature du stream est bien générée.
+        Met à jour l'image des notifications dont le délai est écoulé, pour s'assurer que la miniature
+        du stream est bien générée. Une seule requête get_streams pour tout le lot, édition sans fetch.
         """
-        try:
-            await asyncio.sleep(120) # Attendre 2 minutes
-
-            # Vérifier si le stream est toujours en cours et est le même
-            # On utilise self.notified_streams pour s'assurer que le stream n'a pas été dénotifié ou remplacé
-            if twitch_username not in self.notified_streams or self.notified_streams[twitch_username]['stream_id'] != stream_id:
-                logging.debug(f"Mise à jour d'image annulée pour {twitch_username}: stream non trouvé ou ID différent.")
-                return
-
-            # Re-récupérer les informations du stream
-            streams = await self.twitch.get_streams(user_login=[twitch_username])
-            latest_stream_data = await first(streams)
+        # On ignore les sessions terminées ou remplacées depuis la planification
+        jobs = [(key, stream_id) for key, stream_id in jobs if self.notified_streams.get(key, {}).get('stream_id') == stream_id]
+        if not jobs:
+            return
+        live_streams, _ = await self.helix.get_streams([key[1] for key, _ in jobs])
 
+        edits = []
+        for key, stream_id in jobs:
+            latest_stream_data = live_streams.get(key[1])
             if latest_stream_data and latest_stream_data.id == stream_id:
-                # Récupérer le message original pour édition
-                fetched_message = await message_to_edit.channel.fetch_message(message_to_edit.id)
-                if fetched_message.embeds:
-                    current_embed = fetched_message.embeds[0]
-                    new_thumbnail_url = latest_stream_data.thumbnail_url.replace('{width}', '440').replace('{height}', '248')
-                    new_thumbnail_url_with_cache_buster = f"{new_thumbnail_url}?_={int(datetime.now().timestamp())}"
-
-                    # Mettre à jour l'image si elle est différente de celle actuellement dans l'embed
-                    # Cela garantit que l'édition ne se fait qu'une seule fois si l'image change
-                    if not current_embed.image or current_embed.image.url != new_thumbnail_url_with_cache_buster:
-                        current_embed.set_image(url=new_thumbnail_url_with_cache_buster)
-                        await fetched_message.edit(embed=current_embed)
-                        logging.info(f"Image de notification mise à jour pour {twitch_username} (stream ID: {stream_id}).")
-                else:
-                    logging.warning(f"Message {message_to_edit.id} pour {twitch_username} n'a pas d'embed à mettre à jour.")
+                edits.append(self.refresh_thumbnail(key, latest_stream_data))
+        await self.run_notifications(edits)
+
+    async def refresh_thumbnail(self, key: tuple, stream_data):
+        # L'embed est reconstruit à l'identique (la photo de profil vient du cache) avec une nouvelle miniature
+        profile_image_url = await self.get_user_profile_image(stream_data.user_login)
+        try:
+            await self.session_message(key).edit(embed=self.build_live_embed(stream_data, profile_image_url))
+            logging.info(f"Image de notification mise à jour pour {key[1]} (stream ID: {stream_data.id}).")
         except discord.NotFound:
-            logging.warning(f"Message de notification {message_to_edit.id} pour {twitch_username} introuvable lors de la mise à jour de l'image.")
-        except Exception as e:
-            logging.error(f"Erreur lors de la mise à jour de l'image pour {twitch_username} (stream ID: {stream_id}): {e}")
-        finally:
-            # Nettoyer la référence de la tâche une fois qu'elle est terminée (ou annulée)
-            if twitch_username in self.notified_streams and self.notified_streams[twitch_username]['stream_id'] == stream_id:
-                self.notified_streams[twitch_username]['image_update_task'] = None
+            logging.warning(f"Message de notification pour {key[1]} introuvable lors de la mise à jour de l'image.")
 
     async def get_user_profile_image(self, user_login: str) -> str | None:
         """Récupère l'URL de l'image de profil d'un utilisateur pour éviter les problèmes d'authentification."""
         try:
-            user = await first(self.twitch.get_users(logins=[user_login]))
+            user = await self.users.get_user(user_login)
             if user:
                 return user.profile_image_url
         except Exception as e:
@@ -250,8 +412,9 @@ class TwitchNotifier(commands.Cog):
 
         if result.deleted_count > 0:
             # Retire aussi de la liste des notifiés en mémoire si présent
-            if twitch_username in self.notified_streams:
-                del self.notified_streams[twitch_username]
+            self.notified_streams.pop((interaction.guild_id, twitch_username), None)
+            self.image_updates.cancel((interaction.guild_id, twitch_username))
+            self.sessions_collection.delete_one({"_id": f"{interaction.guild_id}:{twitch_username}"})
             await interaction.response.send_message(f"✅ L'alerte pour **{twitch_username}** a été supprimée.", ephemeral=True)
         else:
             await interaction.response.send_message(f"❌ Aucune alerte trouvée pour **{twitch_username}** sur ce serveur.", ephemeral=True)
@@ -368,14 +531,7 @@ class TwitchNotifier(commands.Cog):
         role_mention_text = role.name if role else "" # Pour le test, on ne mentionne pas, on affiche le nom
 
         # Récupération de la photo de profil pour le test
-        profile_image_url = None
-        try:
-            async for user in self.twitch.get_users(logins=[twitch_username]):
-                profile_image_url = user.profile_image_url
-                break
-        except Exception as e:
-            logging.warning(f"Impossible de récupérer la photo de profil pour le test de {twitch_username}: {e}")
-
+        profile_image_url = await self.get_user_profile_image(twitch_username)
 
         # --- Logique de message identique à la notification réelle ---
         custom_message = alert.get('custom_message')
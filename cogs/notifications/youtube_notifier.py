@@ -4,10 +4,35 @@ from discord import ui
 from discord import app_commands
 from pymongo import MongoClient
 import os
+import time
+import asyncio
 import logging
-from datetime import datetime, timezone
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+from datetime import datetime, timedelta, timezone
 import googleapiclient.discovery
 import googleapiclient.errors
+from cluster import is_leader, get_messageable, role_mention, publish, subscribe, cluster_id
+from cadence import AdaptiveCadence
+from youtube_feeds import FeedClient
+from youtube_websub import WebSubSubscriber, websub_config
+from youtube_quota import QuotaLedger, QuotaExceeded, COMMAND_RESERVE, DAILY_QUOTA, next_reset
+
+# Cadence adaptative : la boucle tourne chaque minute mais chaque chaîne a son propre intervalle
+POLL_MIN_INTERVAL = 120 # Autour des heures de publication habituelles de la chaîne
+POLL_BASE_INTERVAL = 300
+POLL_MAX_INTERVAL = 3600 # Chaînes inactives depuis longtemps
+POLL_BUDGET_PER_HOUR = int(os.getenv("YOUTUBE_POLL_BUDGET", "600")) # Vérifications (requêtes de flux) par heure
+MAX_CONCURRENT_REQUESTS = 8 # Requêtes YouTube simultanées (taille du pool de threads dédié)
+REQUEST_TIMEOUT = 15 # secondes
+# En mode WebSub, le polling ne sert plus qu'à rattraper les notifications manquées
+RECONCILE_INTERVAL_MINUTES = 30
+# Le hub notifie aussi les modifications d'anciennes vidéos : au-delà de cet âge, une vidéo poussée n'est pas annoncée
+WEBSUB_MAX_VIDEO_AGE = timedelta(hours=12)
+# Vidéos sorties pendant un arrêt du bot : annoncées au redémarrage si elles ont moins de 2 jours
+CATCH_UP_MAX_AGE = timedelta(days=2)
+HANDLE_CACHE_TTL = 30 * 24 * 3600 # secondes
 
 class YouTubeMessageModal(ui.Modal):
     def __init__(self, parent_cog, channel_name: str, current_video_message: str, current_short_message: str):
@@ -79,6 +104,12 @@ class YouTubeNotifier(commands.Cog):
             self.client = MongoClient(self.mongo_uri)
             self.db = self.client["askar_bot"]
             self.collection = self.db["youtube_notifications"]
+            # Dernière vidéo vue par chaîne : la déduplication survit aux redémarrages
+            self.channel_state = self.db["youtube_channel_state"]
+            # Handles -> ID de chaîne, expirés automatiquement par MongoDB (index TTL créé dans cog_load)
+            self.handles = self.db["youtube_handles"]
+            self.quota = QuotaLedger(self.db["youtube_quota"])
+            self.cadence = AdaptiveCadence(self.db["notifier_activity"], "youtube", POLL_MIN_INTERVAL, POLL_BASE_INTERVAL, POLL_MAX_INTERVAL, POLL_BUDGET_PER_HOUR)
             logging.info("Cog 'YouTubeNotifier': Connexion à MongoDB réussie.")
         except Exception as e:
             logging.error(f"Cog 'YouTubeNotifier': Erreur lors de la connexion à MongoDB : {e}")
@@ -90,111 +121,342 @@ class YouTubeNotifier(commands.Cog):
             logging.error("Erreur critique : Clé API YouTube manquante.")
             raise ValueError("La variable d'environnement YOUTUBE_API_KEY est requise.")
         
+        self.youtube = None # Construit dans cog_load, hors de la boucle d'événements
+        # Pool dédié aux appels bloquants de googleapiclient, pour ne pas saturer l'exécuteur par défaut
+        self.executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="youtube")
+        self.thread_local = threading.local()
+        # Flux Atom publics : détection sans quota, l'API ne sert qu'à confirmer les nouvelles vidéos
+        self.feeds = FeedClient()
+
+        # Dictionnaire pour suivre les vidéos déjà notifiées {channel_id: video_id}, rechargé depuis youtube_channel_state
+        self.notified_videos = {}
+        # ID de la playlist d'uploads d'une chaîne, rechargé depuis les alertes
+        self.channel_uploads_ids = {}
+        # Date de publication de la dernière vidéo connue, pour ignorer les modifications d'anciennes vidéos
+        self.latest_published = {}
+        self.sending = set() # {video_id} notifications en cours (polling, réconciliation et WebSub)
+        self.websub_config = websub_config() # None = mode polling seul
+        self.websub = None
+        self.quota_warned_day = None
+
+    async def cog_load(self):
+        """Construit le client YouTube (lecture du document de découverte) dans un thread, puis démarre la boucle."""
         try:
-            self.youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=self.youtube_api_key)
+            self.youtube = await asyncio.to_thread(googleapiclient.discovery.build, "youtube", "v3", developerKey=self.youtube_api_key)
             logging.info("Cog 'YouTubeNotifier': Client YouTube API initialisé avec succès.")
         except Exception as e:
             logging.error(f"Cog 'YouTubeNotifier': Échec de l'initialisation du client YouTube API : {e}")
             raise
 
-        # Dictionnaire pour suivre les vidéos déjà notifiées {channel_id: video_id}
-        self.notified_videos = {}
-        # Cache pour stocker l'ID de la playlist d'uploads d'une chaîne
-        self.channel_uploads_ids = {}
-        # Cache pour les handles YouTube -> channel ID
-        self.handle_cache = {}
-
+        # Requête bloquante (sélection du serveur) : hors de la boucle, pour ne pas retarder les autres extensions
+        await asyncio.to_thread(self.handles.create_index, "cached_at", expireAfterSeconds=HANDLE_CACHE_TTL)
+        await self.quota.refresh()
+        await self.cadence.load()
+        await self.load_channel_state()
+        if self.websub_config:
+            await self.start_websub()
         self.check_videos.start()
 
     def cog_unload(self):
         self.check_videos.cancel()
-
-    @tasks.loop(minutes=5)
+        self.executor.shutdown(wait=False)
+        self.bot.loop.create_task(self.feeds.close())
+        if self.websub:
+            self.bot.loop.create_task(self.websub.stop())
+
+    async def load_channel_state(self):
+        """Recharge les dernières vidéos vues et les playlists d'uploads : un redémarrage ne coûte aucun quota."""
+        def load():
+            return list(self.channel_state.find({})), list(self.collection.find({"uploads_playlist_id": {"$ne": None}}, {"youtube_channel_id": 1, "uploads_playlist_id": 1}))
+        states, alerts = await asyncio.to_thread(load)
+        for state in states:
+            published_at = state["published_at"]
+            if published_at.tzinfo is None:
+                published_at = published_at.replace(tzinfo=timezone.utc)
+            self.notified_videos[state["_id"]] = state["last_video_id"]
+            self.latest_published[state["_id"]] = published_at
+        for alert in alerts:
+            self.channel_uploads_ids[alert["youtube_channel_id"]] = alert["uploads_playlist_id"]
+        logging.info(f"Cog 'YouTubeNotifier': dernière vidéo connue rechargée pour {len(states)} chaîne(s).")
+
+    async def save_channel_state(self, channel_id: str):
+        try:
+            await asyncio.to_thread(
+                self.channel_state.update_one,
+                {"_id": channel_id},
+                {"$set": {"last_video_id": self.notified_videos[channel_id], "published_at": self.latest_published[channel_id]}},
+                upsert=True
+            )
+        except Exception as e:
+            logging.error(f"Impossible d'enregistrer la dernière vidéo de la chaîne YouTube {channel_id} : {e}")
+
+    async def start_websub(self):
+        """Démarre le récepteur WebSub ; le polling passe en réconciliation basse fréquence."""
+        config = self.websub_config
+        # Un port par processus du cluster ; un récepteur qui n'est pas leader transmet les notifications au leader
+        self.websub = WebSubSubscriber(config['callback'], config['secret'], self.handle_websub, port=config['port'] + cluster_id(self.bot))
+        await self.websub.start()
+        subscribe(self.bot, "youtube_websub", self.on_remote_websub)
+        self.check_videos.change_interval(minutes=RECONCILE_INTERVAL_MINUTES)
+        logging.info(f"Cog 'YouTubeNotifier': mode WebSub activé, réconciliation toutes les {RECONCILE_INTERVAL_MINUTES} minutes.")
+
+    def thread_http(self) -> httplib2.Http:
+        # httplib2 n'est pas thread-safe : une connexion par thread du pool
+        http = getattr(self.thread_local, "http", None)
+        if http is None:
+            http = self.thread_local.http = httplib2.Http(timeout=REQUEST_TIMEOUT)
+        return http
+
+    async def execute(self, request, use_reserve: bool = False):
+        """
+        Exécute une requête googleapiclient dans le pool dédié, après l'avoir imputée sur le quota du jour.
+        Le polling (use_reserve=False) ne peut pas entamer la réserve gardée pour les commandes.
+        """
+        method = request.methodId.removeprefix("youtube.")
+        self.quota.check(method, use_reserve)
+        await self.quota.charge(method)
+        return await self.bot.loop.run_in_executor(self.executor, lambda: request.execute(http=self.thread_http()))
+
+    @tasks.loop(minutes=1)
     async def check_videos(self):
+        # En mode cluster, un seul processus interroge l'API YouTube
+        if not is_leader(self.bot):
+            if self.websub:
+                # Le hub peut vérifier l'abonnement auprès de n'importe quel processus : tous connaissent les chaînes suivies
+                self.websub.wanted = {alert['youtube_channel_id'] for alert in self.collection.find({}, {"youtube_channel_id": 1})}
+            return
+
         all_alerts = list(self.collection.find({}))
         if not all_alerts:
             return
 
+        # Les flux ne coûtent pas de quota : quand il est épuisé, on continue sans confirmation ni repli sur l'API
+        await self.quota.refresh()
+        if self.quota.remaining() <= COMMAND_RESERVE and self.quota_warned_day != self.quota.day:
+            self.quota_warned_day = self.quota.day
+            logging.warning(f"Quota YouTube presque épuisé ({self.quota.remaining()} unités), seuls les flux Atom sont utilisés jusqu'à la remise à zéro.")
+
+        # Une chaîne suivie par plusieurs serveurs n'est vérifiée qu'une fois
+        alerts_by_channel = {}
         for alert in all_alerts:
-            channel_id = alert['youtube_channel_id']
-            channel_name = alert['youtube_channel_name']
-            
+            alerts_by_channel.setdefault(alert['youtube_channel_id'], []).append(alert)
+
+        if self.websub:
+            # Abonnements au hub alignés sur les alertes, puis réconciliation de toutes les chaînes
+            await self.websub.sync(set(alerts_by_channel))
+            due_channels = list(alerts_by_channel)
+        else:
+            # Seules les chaînes arrivées à échéance sont vérifiées à ce tick
+            due_channels = self.cadence.due(alerts_by_channel)
+        if not due_channels:
+            return
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self.check_channel(channel_id, alerts_by_channel[channel_id]) for channel_id in due_channels))
+        elapsed = time.perf_counter() - started
+
+        durations = [duration for duration, _, _ in results]
+        new_videos = sum(1 for _, is_new, _ in results if is_new)
+        errors = sum(1 for _, _, failed in results if failed)
+        slowest = max(durations)
+        feed_stats = self.feeds.take_stats()
+        logging.info(
+            f"YouTube : {len(due_channels)} chaîne(s) vérifiée(s) en {elapsed:.1f}s "
+            f"(moyenne {sum(durations) / len(durations):.2f}s, max {slowest:.2f}s), "
+            f"{new_videos} nouvelle(s) vidéo(s), {errors} erreur(s) ; "
+            f"flux : {feed_stats['requests']} requête(s), {feed_stats['not_modified']} inchangé(s), {feed_stats['bytes'] / 1024:.1f} Ko."
+        )
+
+    async def check_channel(self, channel_id: str, alerts: list[dict]) -> tuple[float, bool, bool]:
+        """Vérifie la dernière vidéo d'une chaîne. Retourne (durée, nouvelle vidéo, erreur)."""
+        started = time.perf_counter()
+        channel_name = alerts[0]['youtube_channel_name']
+        try:
+            # 1. Dernière vidéo : par le flux Atom (gratuit), ou par l'API si le flux est indisponible
             try:
-                # 1. Obtenir l'ID de la playlist "Uploads" de la chaîne (avec cache)
-                if channel_id not in self.channel_uploads_ids:
-                    channel_request = self.youtube.channels().list(part="contentDetails", id=channel_id)
-                    channel_response = await self.bot.loop.run_in_executor(None, channel_request.execute)
-                    self.channel_uploads_ids[channel_id] = channel_response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
-                
-                uploads_playlist_id = self.channel_uploads_ids[channel_id]
-
-                # 2. Récupérer la dernière vidéo de cette playlist
-                playlist_request = self.youtube.playlistItems().list(
-                    part="snippet,contentDetails",
-                    playlistId=uploads_playlist_id,
-                    maxResults=1
-                )
-                playlist_response = await self.bot.loop.run_in_executor(None, playlist_request.execute)
-
-                if not playlist_response.get("items"):
-                    logging.warning(f"Aucune vidéo trouvée pour la chaîne YouTube {channel_name} ({channel_id}).")
-                    continue
-
-                latest_video = playlist_response["items"][0]
-                video_id = latest_video["contentDetails"]["videoId"]
-                video_title = latest_video["snippet"]["title"]
-                video_url = f"https://www.youtube.com/watch?v={video_id}"
-
-                # 3. Vérifier si c'est une nouvelle vidéo
-                if self.notified_videos.get(channel_id) != video_id:
-                    # Initialisation pour éviter de notifier au premier démarrage
-                    if channel_id not in self.notified_videos:
-                        self.notified_videos[channel_id] = video_id
-                        logging.info(f"Initialisation de la dernière vidéo pour {channel_name} : {video_id}")
-                        continue
-
-                    logging.info(f"Nouvelle vidéo détectée pour {channel_name}: {video_title}")
-                    self.notified_videos[channel_id] = video_id
-
-                    # Déterminer si c'est un Short
-                    is_short = "#short" in video_title.lower() or "#shorts" in latest_video["snippet"]["description"].lower()
-                    video_type = "Short" if is_short else "Vidéo"
-                    video_url = f"https://www.youtube.com/shorts/{video_id}" if is_short else f"https://www.youtube.com/watch?v={video_id}"
-
-                    # 4. Envoyer la notification
-                    discord_channel = self.bot.get_channel(alert['discord_channel_id'])
-                    if not discord_channel:
-                        continue
-
-                    # Construire le message de notification
-                    role_id = alert.get('short_role_id') if is_short else alert.get('video_role_id')
-                    role = discord_channel.guild.get_role(role_id) if role_id else None
-                    role_mention = f"-# {role.mention}" if role else ""
-
-                    custom_message_template = alert.get('custom_short_message') if is_short else alert.get('custom_video_message')
-
-                    if is_short:
-                        link_text = "Short"
-                        default_message = f"**{channel_name}** a publié un nouveau [**{link_text}**]({video_url}) ! 🎬"
-                    else:
-                        link_text = "Vidéo"
-                        default_message = f"**{channel_name}** a publié une nouvelle [**{link_text}**]({video_url}) ! 📹"
-
-                    if custom_message_template:
-                        # Le placeholder {mention} est remplacé par le texte formaté du rôle
-                        content_message = custom_message_template.format(channel=channel_name, mention=role_mention)
-                    else:
-                        content_message = f"{default_message}\n{role_mention}"
-
-                    try:
-                        await discord_channel.send(content=content_message.strip())
-                    except discord.Forbidden:
-                        logging.warning(f"Permission manquante pour envoyer un message dans le salon {discord_channel.id}")
-
-            except googleapiclient.errors.HttpError as e:
-                logging.error(f"Erreur API YouTube pour {channel_name}: {e}")
+                entries = await self.feeds.latest_entries(channel_id)
+                from_feed = True
             except Exception as e:
-                logging.error(f"Erreur inattendue lors de la vérification de {channel_name}: {e}")
+                logging.warning(f"Flux YouTube indisponible pour {channel_name}, utilisation de l'API : {e}")
+                latest_video = await self.latest_video_from_api(channel_id)
+                entries = [latest_video] if latest_video else []
+                from_feed = False
+
+            if not entries:
+                logging.warning(f"Aucune vidéo trouvée pour la chaîne YouTube {channel_name} ({channel_id}).")
+                return time.perf_counter() - started, False, False
+
+            # Plusieurs vidéos peuvent être sorties depuis la dernière vue (bot arrêté) : de la plus ancienne à la plus récente
+            candidates = reversed(entries) if channel_id in self.notified_videos else entries[:1]
+            is_new = False
+            for video in candidates:
+                is_new = await self.handle_latest_video(channel_id, alerts, video, confirm=from_feed) or is_new
+            return time.perf_counter() - started, is_new, False
+
+        except QuotaExceeded as e:
+            logging.warning(f"Vérification de {channel_name} ignorée : {e}")
+        except googleapiclient.errors.HttpError as e:
+            logging.error(f"Erreur API YouTube pour {channel_name}: {e}")
+        except Exception as e:
+            logging.error(f"Erreur inattendue lors de la vérification de {channel_name}: {e}")
+        return time.perf_counter() - started, False, True
+
+    async def handle_latest_video(self, channel_id: str, alerts: list[dict], latest_video: dict, confirm: bool, initialize: bool = True) -> bool:
+        """Notifie la vidéo si elle est nouvelle pour cette chaîne. Retourne True si une notification est partie."""
+        channel_name = alerts[0]['youtube_channel_name']
+        video_id = latest_video["video_id"]
+
+        # 2. Vérifier si c'est une nouvelle vidéo
+        if self.notified_videos.get(channel_id) == video_id or video_id in self.sending:
+            return False
+        if channel_id in self.latest_published and latest_video["published_at"] <= self.latest_published[channel_id]:
+            return False # Ancienne vidéo modifiée (titre, description...)
+        # Initialisation pour éviter de notifier une vidéo déjà en ligne à l'ajout de la chaîne
+        too_old = datetime.now(timezone.utc) - latest_video["published_at"] > CATCH_UP_MAX_AGE
+        if (initialize and channel_id not in self.notified_videos) or too_old:
+            self.notified_videos[channel_id] = video_id
+            self.latest_published[channel_id] = latest_video["published_at"]
+            await self.save_channel_state(channel_id)
+            logging.info(f"Initialisation de la dernière vidéo pour {channel_name} : {video_id}")
+            return False
+
+        # Réserve la vidéo avant toute attente : deux notifications WebSub, ou WebSub et polling simultanés, ne l'annoncent qu'une fois
+        self.sending.add(video_id)
+        previous_state = (self.notified_videos.get(channel_id), self.latest_published.get(channel_id))
+        try:
+            # 3. Nouvelle vidéo vue dans un flux : confirmation par l'API (1 unité), sauf si le quota est bas
+            if confirm and not self.quota.is_tight():
+                latest_video = await self.confirm_video(video_id) or latest_video
+
+            video_title = latest_video["title"]
+            logging.info(f"Nouvelle vidéo détectée pour {channel_name}: {video_title}")
+            self.notified_videos[channel_id] = video_id
+            self.latest_published[channel_id] = latest_video["published_at"]
+            await self.save_channel_state(channel_id)
+            await self.cadence.record(channel_id, latest_video["published_at"])
+
+            # Déterminer si c'est un Short
+            is_short = "#short" in video_title.lower() or "#shorts" in latest_video["description"].lower()
+
+            # 4. Envoyer la notification à tous les serveurs abonnés, en parallèle
+            results = await asyncio.gather(*(self.send_video_notification(alert, video_id, is_short) for alert in alerts), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logging.error(f"Erreur lors de l'envoi d'une notification YouTube pour {channel_name}: {result}")
+            if all(isinstance(result, Exception) for result in results):
+                # Aucun serveur notifié : la vidéo redevient nouvelle pour la prochaine vérification
+                await self.restore_channel_state(channel_id, previous_state)
+                return False
+            return True
+        except Exception:
+            await self.restore_channel_state(channel_id, previous_state)
+            raise
+        finally:
+            self.sending.discard(video_id)
+
+    async def restore_channel_state(self, channel_id: str, state: tuple):
+        """Annule la réservation d'une vidéo non notifiée : l'état précédent de la chaîne est rétabli (en mémoire et en base)."""
+        last_video_id, published_at = state
+        if last_video_id is not None:
+            self.notified_videos[channel_id] = last_video_id
+            self.latest_published[channel_id] = published_at
+            await self.save_channel_state(channel_id)
+            return
+        self.notified_videos.pop(channel_id, None)
+        self.latest_published.pop(channel_id, None)
+        try:
+            await asyncio.to_thread(self.channel_state.delete_one, {"_id": channel_id})
+        except Exception as e:
+            logging.error(f"Impossible de réinitialiser la dernière vidéo de la chaîne YouTube {channel_id} : {e}")
+
+    async def handle_websub(self, channel_id: str, entry: dict):
+        """Notification reçue par le récepteur WebSub de ce processus."""
+        if not is_leader(self.bot):
+            # L'état des vidéos notifiées est tenu par le leader : on lui transmet la notification
+            publish(self.bot, "youtube_websub", {"channel_id": channel_id, "entry": {**entry, "published_at": entry["published_at"].isoformat()}})
+            return
+        await self.process_websub(channel_id, entry)
+
+    def on_remote_websub(self, payload: dict):
+        if is_leader(self.bot):
+            entry = {**payload["entry"], "published_at": datetime.fromisoformat(payload["entry"]["published_at"])}
+            self.bot.loop.create_task(self.process_websub(payload["channel_id"], entry))
+
+    async def process_websub(self, channel_id: str, entry: dict):
+        if datetime.now(timezone.utc) - entry["published_at"] > WEBSUB_MAX_VIDEO_AGE:
+            return
+        alerts = list(self.collection.find({"youtube_channel_id": channel_id}))
+        if alerts:
+            # Une notification poussée annonce une publication : pas d'initialisation silencieuse
+            await self.handle_latest_video(channel_id, alerts, entry, confirm=True, initialize=False)
+
+    def video_from_snippet(self, video_id: str, snippet: dict) -> dict:
+        return {
+            "video_id": video_id,
+            "title": snippet["title"],
+            "description": snippet.get("description", ""),
+            "published_at": datetime.fromisoformat(snippet["publishedAt"].replace("Z", "+00:00")),
+        }
+
+    async def latest_video_from_api(self, channel_id: str) -> dict | None:
+        """Dernière vidéo de la playlist d'uploads via l'API (1 unité de quota)."""
+        if channel_id not in self.channel_uploads_ids and channel_id.startswith("UC"):
+            # La playlist d'uploads se déduit de l'ID de chaîne (UC... -> UU...), sans coût de quota
+            self.channel_uploads_ids[channel_id] = "UU" + channel_id[2:]
+        elif channel_id not in self.channel_uploads_ids:
+            channel_response = await self.execute(self.youtube.channels().list(part="contentDetails", id=channel_id))
+            self.channel_uploads_ids[channel_id] = channel_response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+            await asyncio.to_thread(self.collection.update_many, {"youtube_channel_id": channel_id}, {"$set": {"uploads_playlist_id": self.channel_uploads_ids[channel_id]}})
+
+        playlist_response = await self.execute(self.youtube.playlistItems().list(
+            part="snippet,contentDetails",
+            playlistId=self.channel_uploads_ids[channel_id],
+            maxResults=1
+        ))
+        if not playlist_response.get("items"):
+            return None
+        item = playlist_response["items"][0]
+        return self.video_from_snippet(item["contentDetails"]["videoId"], item["snippet"])
+
+    async def confirm_video(self, video_id: str) -> dict | None:
+        """Récupère les informations officielles d'une vidéo (titre, description complète) pour classer Short/Vidéo."""
+        try:
+            response = await self.execute(self.youtube.videos().list(part="snippet", id=video_id))
+        except QuotaExceeded:
+            return None
+        if not response.get("items"):
+            return None
+        return self.video_from_snippet(video_id, response["items"][0]["snippet"])
+
+    async def send_video_notification(self, alert: dict, video_id: str, is_short: bool):
+        channel_name = alert['youtube_channel_name']
+        video_url = f"https://www.youtube.com/shorts/{video_id}" if is_short else f"https://www.youtube.com/watch?v={video_id}"
+        discord_channel = get_messageable(self.bot, alert['discord_channel_id'], alert.get('guild_id'))
+
+        # Construire le message de notification
+        role_id = alert.get('short_role_id') if is_short else alert.get('video_role_id')
+        mention = role_mention(discord_channel.guild, role_id)
+        mention_line = f"-# {mention}" if mention else ""
+
+        custom_message_template = alert.get('custom_short_message') if is_short else alert.get('custom_video_message')
+
+        if is_short:
+            link_text = "Short"
+            default_message = f"**{channel_name}** a publié un nouveau [**{link_text}**]({video_url}) ! 🎬"
+        else:
+            link_text = "Vidéo"
+            default_message = f"**{channel_name}** a publié une nouvelle [**{link_text}**]({video_url}) ! 📹"
+
+        if custom_message_template:
+            # Le placeholder {mention} est remplacé par le texte formaté du rôle
+            content_message = custom_message_template.format(channel=channel_name, mention=mention_line)
+        else:
+            content_message = f"{default_message}\n{mention_line}"
+
+        try:
+            await discord_channel.send(content=content_message.strip())
+        except discord.Forbidden:
+            logging.warning(f"Permission manquante pour envoyer un message dans le salon {discord_channel.id}")
 
     @check_videos.before_loop
     async def before_check_videos(self):
@@ -207,31 +469,33 @@ class YouTubeNotifier(commands.Cog):
     @app_commands.checks.has_permissions(administrator=True)
     async def add_youtube_alert(self, interaction: discord.Interaction, channel_url: str, channel: discord.TextChannel, video_role: discord.Role = None, short_role: discord.Role = None):
         await interaction.response.defer(ephemeral=True)
+        cached = None
         try:
             # Extraire l'ID ou le nom custom de l'URL
             if "/channel/" in channel_url:
                 channel_id = channel_url.split("/channel/")[1].split("/")[0]
-                request = self.youtube.channels().list(part="snippet", id=channel_id)
+                request = self.youtube.channels().list(part="snippet,contentDetails", id=channel_id)
             elif "/@" in channel_url:
                 handle = channel_url.split("/@")[1].split("/")[0]
                 # Le paramètre forUsername est déprécié. On doit utiliser la recherche.
                 # On vérifie d'abord notre cache
-                if handle in self.handle_cache:
-                    request = self.youtube.channels().list(part="snippet", id=self.handle_cache[handle])
+                cached = self.handles.find_one({"_id": handle.lower()})
+                if cached:
+                    request = self.youtube.channels().list(part="snippet,contentDetails", id=cached["channel_id"])
                 else:
                     # On recherche la chaîne par son handle
                     search_request = self.youtube.search().list(part="snippet", q=f"@{handle}", type="channel", maxResults=1)
-                    search_response = await self.bot.loop.run_in_executor(None, search_request.execute)
+                    search_response = await self.execute(search_request, use_reserve=True)
                     if not search_response.get("items"):
                         await interaction.followup.send(f"❌ Impossible de trouver une chaîne avec le handle `@{handle}`.")
                         return
                     channel_id = search_response["items"][0]["id"]["channelId"]
-                    request = self.youtube.channels().list(part="snippet", id=channel_id)
+                    request = self.youtube.channels().list(part="snippet,contentDetails", id=channel_id)
             else:
                 await interaction.followup.send("❌ URL de chaîne YouTube invalide.")
                 return
 
-            response = await self.bot.loop.run_in_executor(None, request.execute)
+            response = await self.execute(request, use_reserve=True)
             if not response.get("items"):
                 await interaction.followup.send("❌ Impossible de trouver cette chaîne YouTube via l'API.")
                 return
@@ -239,10 +503,15 @@ class YouTubeNotifier(commands.Cog):
             yt_channel_info = response["items"][0]
             yt_channel_id = yt_channel_info["id"]
             yt_channel_name = yt_channel_info["snippet"]["title"]
+            uploads_playlist_id = yt_channel_info["contentDetails"]["relatedPlaylists"]["uploads"]
 
             # Mettre en cache le handle si on l'a trouvé via la recherche
-            if "/@" in channel_url:
-                self.handle_cache[handle] = yt_channel_id
+            if "/@" in channel_url and not cached:
+                self.handles.update_one(
+                    {"_id": handle.lower()},
+                    {"$set": {"channel_id": yt_channel_id, "cached_at": datetime.now(timezone.utc)}},
+                    upsert=True
+                )
 
             if self.collection.find_one({"youtube_channel_id": yt_channel_id, "guild_id": interaction.guild_id}):
                 await interaction.followup.send(f"❌ Une alerte pour **{yt_channel_name}** existe déjà.")
@@ -252,6 +521,7 @@ class YouTubeNotifier(commands.Cog):
                 "guild_id": interaction.guild_id,
                 "youtube_channel_id": yt_channel_id,
                 "youtube_channel_name": yt_channel_name,
+                "uploads_playlist_id": uploads_playlist_id,
                 "discord_channel_id": channel.id,
                 "video_role_id": video_role.id if video_role else None,
                 "short_role_id": short_role.id if short_role else None,
@@ -259,8 +529,11 @@ class YouTubeNotifier(commands.Cog):
                 "custom_short_message": None
             }
             self.collection.insert_one(new_alert)
+            self.channel_uploads_ids[yt_channel_id] = uploads_playlist_id
             await interaction.followup.send(f"✅ Alerte activée pour **{yt_channel_name}** dans {channel.mention}.")
 
+        except QuotaExceeded:
+            await interaction.followup.send(f"❌ Le quota YouTube du jour est épuisé. Réessayez après sa remise à zéro ({discord.utils.format_dt(next_reset(), 't')}).")
         except Exception as e:
             logging.error(f"Erreur lors de l'ajout d'une alerte YouTube : {e}")
             await interaction.followup.send("❌ Une erreur est survenue. Vérifiez l'URL et réessayez.")
@@ -316,21 +589,16 @@ class YouTubeNotifier(commands.Cog):
     @app_commands.describe(channel_name="Le nom de la chaîne YouTube à retirer")
     @app_commands.checks.has_permissions(administrator=True)
     async def remove_youtube_alert(self, interaction: discord.Interaction, channel_name: str):
-        result = self.collection.delete_one({"youtube_channel_name": channel_name, "guild_id": interaction.guild_id})
-
-        if result.deleted_count > 0:
-            # Nettoyer les dictionnaires en mémoire
-            # (Cette partie est plus complexe si plusieurs serveurs suivent la même chaîne, mais pour un seul serveur c'est ok)
-            alerts_for_channel = list(self.collection.find({"youtube_channel_name": channel_name}))
-            # Pour nettoyer la mémoire, il faudrait retrouver le channel_id à partir du nom
-            # C'est plus simple de laisser la boucle de vérification gérer les erreurs ou de ne rien faire.
-            # Le cache se videra au redémarrage du bot.
-            if not alerts_for_channel:
-                alert_doc = self.collection.find_one({"youtube_channel_name": channel_name})
-                if alert_doc:
-                    channel_id_to_remove = alert_doc['youtube_channel_id']
-                    self.notified_videos.pop(channel_id_to_remove, None)
-                    self.channel_uploads_ids.pop(channel_id_to_remove, None)
+        removed = self.collection.find_one_and_delete({"youtube_channel_name": channel_name, "guild_id": interaction.guild_id})
+
+        if removed:
+            # Plus aucun serveur ne suit la chaîne : on oublie son état (mémoire et base)
+            channel_id_to_remove = removed['youtube_channel_id']
+            if not self.collection.find_one({"youtube_channel_id": channel_id_to_remove}):
+                self.notified_videos.pop(channel_id_to_remove, None)
+                self.latest_published.pop(channel_id_to_remove, None)
+                self.channel_uploads_ids.pop(channel_id_to_remove, None)
+                self.channel_state.delete_one({"_id": channel_id_to_remove})
             await interaction.response.send_message(f"✅ L'alerte pour **{channel_name}** a été supprimée.", ephemeral=True)
         else:
             await interaction.response.send_message(f"❌ Aucune alerte trouvée pour **{channel_name}**.", ephemeral=True)
@@ -384,8 +652,10 @@ class YouTubeNotifier(commands.Cog):
 
         # Récupération des infos de la chaîne pour l'embed
         try:
+            if self.quota.is_tight():
+                raise QuotaExceeded("quota bas, photo de profil ignorée")
             request = self.youtube.channels().list(part="snippet", id=alert['youtube_channel_id'])
-            response = await self.bot.loop.run_in_executor(None, request.execute)
+            response = await self.execute(request, use_reserve=True)
             channel_info = response["items"][0]
             profile_pic_url = channel_info["snippet"]["thumbnails"]["default"]["url"]
         except Exception as e:
@@ -427,6 +697,27 @@ class YouTubeNotifier(commands.Cog):
         except discord.Forbidden:
             await interaction.followup.send(f"❌ Je n'ai pas la permission d'envoyer de message dans le salon {channel.mention}.")
 
+    @app_commands.command(name="youtube-quota", description="Affiche la consommation du quota de l'API YouTube.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def youtube_quota(self, interaction: discord.Interaction):
+        await self.quota.refresh()
+        remaining = self.quota.remaining()
+        exhaustion = self.quota.projected_exhaustion()
+
+        embed = discord.Embed(title="📊 Quota API YouTube", color=discord.Color.red() if self.quota.is_tight() else discord.Color.green())
+        embed.add_field(name="Consommé", value=f"{self.quota.used} / {DAILY_QUOTA} unités", inline=True)
+        embed.add_field(name="Restant", value=f"{remaining} unités (dont {COMMAND_RESERVE} réservées aux commandes)", inline=True)
+        embed.add_field(name="Remise à zéro", value=discord.utils.format_dt(next_reset(), 'R'), inline=True)
+        embed.add_field(
+            name="Épuisement prévu",
+            value=discord.utils.format_dt(exhaustion, 'R') if exhaustion else "Pas avant la remise à zéro",
+            inline=True
+        )
+        embed.add_field(name="Rythme soutenable", value=f"{self.quota.hourly_allowance():.0f} unités/heure jusqu'à la remise à zéro", inline=True)
+        calls = "\n".join(f"`{method}` : {count} appel(s)" for method, count in sorted(self.quota.calls.items())) or "Aucun appel aujourd'hui"
+        embed.add_field(name="Appels du jour", value=calls, inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @remove_youtube_alert.autocomplete('channel_name')
     @edit_youtube_alert.autocomplete('channel_name')
     @set_youtube_message.autocomplete('channel_name')
@@ -5,6 +5,7 @@ from pymongo import MongoClient  # type: ignore
 import os
 import logging
 import asyncio
+from cluster import is_leader, publish, subscribe
 
 # ID de l'utilisateur autorisé
 AUTHORIZED_USER_ID = 463639826361614336
@@ -29,8 +30,12 @@ class BotStatusManager(commands.Cog):
             logging.error(f"Erreur lors de la connexion à MongoDB : {e}")
             raise
 
-        # Chargement des données depuis la base
-        self.load_status_data()
+    async def cog_load(self):
+        # Chargement des données depuis la base (requête bloquante, exécutée dans un thread)
+        await asyncio.to_thread(self.load_status_data)
+
+        # En mode cluster, le leader fait tourner le cycle et les autres processus appliquent la présence reçue
+        subscribe(self.bot, "presence", self.apply_remote_presence)
 
         # Lancement du cycler si nécessaire
         self.activity_cycler.start()
@@ -78,12 +83,18 @@ class BotStatusManager(commands.Cog):
         except Exception as e:
             logging.error(f"Erreur lors de l'enregistrement des données de statut : {e}")
 
+    def apply_remote_presence(self, payload):
+        """Applique sur les shards de ce processus une présence choisie par le leader du cluster."""
+        activity = discord.Activity(type=discord.ActivityType[payload["type"]], name=payload["name"])
+        self.bot.loop.create_task(self.bot.change_presence(activity=activity, status=discord.Status[payload["status"]]))
+
     @tasks.loop(seconds=10)
     async def activity_cycler(self):
         """Alterner entre plusieurs activités si une liste est définie."""
-        if self.activity_cycle:
+        if self.activity_cycle and is_leader(self.bot):
             activity = self.activity_cycle.pop(0)
             await self.bot.change_presence(activity=activity, status=self.current_status)
+            publish(self.bot, "presence", {"type": activity.type.name, "name": activity.name, "status": self.current_status.name})
             self.activity_cycle.append(activity)  # Remet l'activité à la fin de la liste
 
     @activity_cycler.before_loop
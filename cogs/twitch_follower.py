@@ -6,6 +6,7 @@ import os
 import logging
 from twitchAPI.twitch import Twitch
 from twitchAPI.helper import first
+from twitch_api import HelixClient, get_user_cache
 
 class TwitchFollower(commands.Cog):
     def __init__(self, bot):
@@ -35,6 +36,7 @@ class TwitchFollower(commands.Cog):
             raise ValueError("Les variables d'environnement TWITCH_CLIENT_ID et TWITCH_CLIENT_SECRET sont requises.")
         
         self.twitch = None
+        self.users = None # Cache des utilisateurs Twitch partagé avec TwitchNotifier
         self.bot.loop.create_task(self.initialize_twitch())
 
     async def initialize_twitch(self):
@@ -42,6 +44,7 @@ class TwitchFollower(commands.Cog):
         try:
             self.twitch = await Twitch(self.twitch_client_id, self.twitch_client_secret, target_app_auth_scope=None)
             await self.twitch.authenticate_app([]) # Force l'authentification de l'application
+            self.users = get_user_cache(self.bot, HelixClient(self.twitch))
             logging.info("Cog 'TwitchFollower': Client Twitch API initialisé avec succès.")
         except Exception as e:
             logging.error(f"Cog 'TwitchFollower': Échec de l'initialisation du client Twitch API : {e}")
@@ -104,21 +107,16 @@ class TwitchFollower(commands.Cog):
 
         try:
             # 3. Utiliser l'API Twitch pour obtenir les IDs des utilisateurs
-            users = await self.twitch.get_users(logins=[linked_twitch_username, twitch_username.lower()])
-            user_id = None
-            streamer_id = None
-            async for user in users:
-                if user.login == linked_twitch_username:
-                    user_id = user.id
-                if user.login == twitch_username.lower():
-                    streamer_id = user.id
-
-            if not user_id or not streamer_id:
+            users = await self.users.get_users([linked_twitch_username, twitch_username])
+            user = users[linked_twitch_username.lower()]
+            streamer = users[twitch_username.lower()]
+
+            if not user or not streamer:
                 await interaction.followup.send("❌ Un des pseudos Twitch (le tien ou celui du streamer) est invalide.")
                 return
 
             # 4. Vérifier si l'utilisateur suit la chaîne
-            follow_relation = await first(self.twitch.get_users_follows(from_id=user_id, to_id=streamer_id))
+            follow_relation = await first(self.twitch.get_users_follows(from_id=user.id, to_id=streamer.id))
             is_following = follow_relation is not None
 
             member = interaction.user
@@ -8,6 +8,8 @@ import logging
 import os
 import math
 import asyncio
+from bot_config import ensure_chunked
+from cluster import is_leader
 
 # Définition des limites d'XP/LVL pour chaque type d'interaction
 XP_LIMITS = {
@@ -108,7 +110,8 @@ class XPSystem(commands.Cog):
                 upsert=True
             )
 
-            logging.info(f"🔹 {xp_amount:+} XP pour {user_name} (ID: {user_id}) (source: {source}) | Total: {new_xp} XP | Niveau: {new_level}")
+            # Ligne très fréquente : échantillonnée par start.py (catégorie "xp_gain")
+            logging.info(f"🔹 {xp_amount:+} XP pour {user_name} (ID: {user_id}) (source: {source}) | Total: {new_xp} XP | Niveau: {new_level}", extra={"sample_key": "xp_gain"})
             return old_level, new_level
         except Exception as e:
             logging.error(f"Erreur lors de la mise à jour des données d'XP : {e}")
@@ -128,6 +131,12 @@ class XPSystem(commands.Cog):
                 guild = self.bot.get_guild(level_role["guild_id"])
                 if guild:
                     member = guild.get_member(int(user_id))
+                    if member is None:
+                        # Le cache des membres n'est pas forcément complet (chunking à la demande)
+                        try:
+                            member = await guild.fetch_member(int(user_id))
+                        except discord.HTTPException:
+                            member = None
                     role = guild.get_role(level_role["role_id"])
                     if member and role and role not in member.roles:
                         try:
@@ -175,7 +184,8 @@ class XPSystem(commands.Cog):
         """
         await self.bot.wait_until_ready()
 
-        if self.initial_sync_done:
+        # Les données XP sont globales : en mode cluster, seul le leader les resynchronise
+        if self.initial_sync_done or not is_leader(self.bot):
             return
 
         logging.info("Démarrage de la resynchronisation des niveaux de tous les utilisateurs...")
@@ -556,6 +566,7 @@ class XPSystem(commands.Cog):
 
             changes = [] # Liste pour stocker les modifications de cette resync
 
+            await ensure_chunked(guild)
             for member in guild.members:
                 if member.bot:
                     continue
@@ -604,6 +615,7 @@ class XPSystem(commands.Cog):
 
         count = 0
         changes = []
+        await ensure_chunked(guild)
         for member in guild.members:
             if member.bot:
                 continue
@@ -1,95 +1,156 @@
-import json
-import requests # type: ignore
 import re
 import os
+import time
+import asyncio
+import logging
 
+import aiohttp
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
 from pymongo import MongoClient
+from cluster import is_leader, get_messageable
 
 # Connexion à MongoDB
 client = MongoClient(os.getenv("MONGO_URI"))
 db = client["youtube_notify_db"]
 collection = db["youtube_channels"]
 
+# --- Récupération des pages de chaîne ---
+CHANNEL_URL = os.getenv("YOUTUBE_CHANNEL_URL", "https://www.youtube.com/channel")
+MAX_CONNECTIONS = 10
+MAX_CONCURRENT_CHANNELS = 5
+REQUEST_TIMEOUT = 15 # secondes
+CHUNK_SIZE = 16384
+# Le premier "videoId" de la page est la vidéo la plus récente : inutile de lire la suite
+VIDEO_ID_PATTERN = re.compile(rb'"videoId":"([\w-]+)"')
+PATTERN_OVERLAP = 64 # octets gardés d'un morceau à l'autre, pour un "videoId" coupé en deux
+BACKOFF_BASE = 60 # secondes, doublé à chaque échec consécutif d'une chaîne
+BACKOFF_MAX = 3600
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; AskarBot)", "Accept-Language": "fr-FR,fr;q=0.9"}
+
+
+class ChannelPageScraper:
+    """Lit l'ID de la dernière vidéo (ou du dernier Short) d'une page de chaîne, sans bloquer la boucle d'événements."""
+
+    def __init__(self):
+        self.session = None
+        self.validators = {} # {url: (etag, last_modified, dernier videoId)}
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                headers=HEADERS
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def latest_video_id(self, url: str) -> str | None:
+        session = await self.get_session()
+        headers = {}
+        etag, last_modified, cached_id = self.validators.get(url, (None, None, None))
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return cached_id
+            response.raise_for_status()
+            video_id = None
+            tail = b""
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                buffer = tail + chunk
+                match = VIDEO_ID_PATTERN.search(buffer)
+                if match:
+                    video_id = match.group(1).decode()
+                    break # La connexion est libérée sans télécharger le reste de la page
+                tail = buffer[-PATTERN_OVERLAP:]
+            self.validators[url] = (response.headers.get("ETag"), response.headers.get("Last-Modified"), video_id)
+            return video_id
+
+
 class YouTubeNotifier(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.scraper = ChannelPageScraper()
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHANNELS)
+        self.failures = {} # {youtube_channel_id: échecs consécutifs}
+        self.retry_at = {} # {youtube_channel_id: horodatage avant lequel la chaîne n'est pas revérifiée}
         self.checkforvideos.start()
 
+    def cog_unload(self):
+        self.checkforvideos.cancel()
+        self.bot.loop.create_task(self.scraper.close())
+
     @tasks.loop(seconds=30)
     async def checkforvideos(self):
-        print("Now Checking!")
-
-        # Récupère les rôles par défaut s'ils existent
-        default_roles = collection.find_one({"_id": "default_roles"})
-        default_video_role_id = default_roles.get("video_role_id") if default_roles else None
-        default_short_role_id = default_roles.get("short_role_id") if default_roles else None
-
-        for doc in collection.find({"_id": {"$ne": "default_roles"}}):  # Exclut la doc des rôles par défaut
-            youtube_channel_id = doc["_id"]
-            channel_name = doc["channel_name"]
-            latest_video_url_stored = doc.get("latest_video_url", "none")
-            latest_short_url_stored = doc.get("latest_short_url", "none")
-            discord_channel_id = doc["notifying_discord_channel"]
-            video_role_id = doc.get("video_role_id")
-            short_role_id = doc.get("short_role_id")
-
-            discord_channel = self.bot.get_channel(int(discord_channel_id))
-            if not discord_channel:
-                print(f"⚠️ Canal Discord introuvable : {discord_channel_id}")
-                continue
-
-            # 🔍 Vérification des vidéos classiques
-            print(f"🔍 Checking Videos for {channel_name}")
-            video_html = requests.get(f"https://www.youtube.com/channel/{youtube_channel_id}/videos").text
+        if not is_leader(self.bot):
+            return
+
+        docs = await asyncio.to_thread(lambda: list(collection.find({"_id": {"$ne": "default_roles"}})))  # Exclut la doc des rôles par défaut
+
+        now = time.time()
+        due_docs = [doc for doc in docs if self.retry_at.get(doc["_id"], 0) <= now]
+        results = await asyncio.gather(*(self.check_channel(doc) for doc in due_docs), return_exceptions=True)
+        for doc, result in zip(due_docs, results):
+            if isinstance(result, Exception):
+                logging.error(f"Erreur lors de la notification YouTube pour {doc['channel_name']} : {result}")
+
+    async def check_channel(self, doc: dict):
+        youtube_channel_id = doc["_id"]
+        channel_name = doc["channel_name"]
+        discord_channel_id = doc["notifying_discord_channel"]
+
+        # En mode cluster, le salon peut appartenir à un serveur géré par un autre processus : envoi via REST
+        discord_channel = get_messageable(self.bot, int(discord_channel_id), doc.get("guild_id"))
+
+        async with self.semaphore:
             try:
-                latest_video_id = re.search('(?<="videoId":").*?(?=")', video_html).group()
-                latest_video_url = f"https://www.youtube.com/watch?v={latest_video_id}"
-            except:
-                latest_video_url = None
-
-            if latest_video_url and latest_video_url != latest_video_url_stored:
-                collection.update_one(
-                    {"_id": youtube_channel_id},
-                    {"$set": {"latest_video_url": latest_video_url}}
+                # Vidéos classiques et Shorts en parallèle
+                latest_video_id, latest_short_id = await asyncio.gather(
+                    self.scraper.latest_video_id(f"{CHANNEL_URL}/{youtube_channel_id}/videos"),
+                    self.scraper.latest_video_id(f"{CHANNEL_URL}/{youtube_channel_id}/shorts")
                 )
-                role_mention = f"<@&{video_role_id}>" if video_role_id else "@NOMENTION"
-                msg = f"**{channel_name}** a publié une nouvelle **vidéo** ! 📹\n{latest_video_url}\n-# {role_mention}"
-                message = await discord_channel.send(msg)
-
-                # 💬 Publie automatiquement si c’est un salon d’annonce
-                if isinstance(discord_channel, discord.TextChannel) and discord_channel.is_news():
-                    try:
-                        await message.publish()
-                    except discord.Forbidden:
-                        print(f"⚠️ Impossible de publier le message dans le salon d'annonce {discord_channel.name}")
-
-            # 🔍 Vérification des Shorts
-            print(f"🔍 Checking Shorts for {channel_name}")
-            shorts_html = requests.get(f"https://www.youtube.com/channel/{youtube_channel_id}/shorts").text
+            except Exception as e:
+                failures = self.failures.get(youtube_channel_id, 0) + 1
+                self.failures[youtube_channel_id] = failures
+                delay = min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX)
+                self.retry_at[youtube_channel_id] = time.time() + delay
+                logging.warning(f"Page YouTube de {channel_name} indisponible ({e}), nouvel essai dans {delay}s.")
+                return
+        self.failures.pop(youtube_channel_id, None)
+        self.retry_at.pop(youtube_channel_id, None)
+
+        if latest_video_id:
+            latest_video_url = f"https://www.youtube.com/watch?v={latest_video_id}"
+            if latest_video_url != doc.get("latest_video_url", "none"):
+                await asyncio.to_thread(collection.update_one, {"_id": youtube_channel_id}, {"$set": {"latest_video_url": latest_video_url}})
+                role_mention = f"<@&{doc.get('video_role_id')}>" if doc.get("video_role_id") else "@NOMENTION"
+                await self.announce(discord_channel, f"**{channel_name}** a publié une nouvelle **vidéo** ! 📹\n{latest_video_url}\n-# {role_mention}")
+
+        if latest_short_id:
+            latest_short_url = f"https://www.youtube.com/shorts/{latest_short_id}"
+            if latest_short_url != doc.get("latest_short_url", "none"):
+                await asyncio.to_thread(collection.update_one, {"_id": youtube_channel_id}, {"$set": {"latest_short_url": latest_short_url}})
+                role_mention = f"<@&{doc.get('short_role_id')}>" if doc.get("short_role_id") else "@NOMENTION"
+                await self.announce(discord_channel, f"**{channel_name}** a publié un nouveau **Short** ! 🎬\n{latest_short_url}\n-# {role_mention}")
+
+    async def announce(self, discord_channel, msg: str):
+        message = await discord_channel.send(msg)
+
+        # 💬 Publie automatiquement si c’est un salon d’annonce
+        if isinstance(discord_channel, discord.TextChannel) and discord_channel.is_news():
             try:
-                latest_short_id = re.search('(?<="videoId":").*?(?=")', shorts_html).group()
-                latest_short_url = f"https://www.youtube.com/shorts/{latest_short_id}"
-            except:
-                latest_short_url = None
-
-            if latest_short_url and latest_short_url != latest_short_url_stored:
-                collection.update_one(
-                    {"_id": youtube_channel_id},
-                    {"$set": {"latest_short_url": latest_short_url}}
-                )
-                role_mention = f"<@&{short_role_id}>" if short_role_id else "@NOMENTION"
-                msg = f"**{channel_name}** a publié un nouveau **Short** ! 🎬\n{latest_short_url}\n-# {role_mention}"
-                message = await discord_channel.send(msg)
-
-                # 💬 Publie automatiquement si c’est un salon d’annonce
-                if isinstance(discord_channel, discord.TextChannel) and discord_channel.is_news():
-                    try:
-                        await message.publish()
-                    except discord.Forbidden:
-                        print(f"⚠️ Impossible de publier le message dans le salon d'annonce {discord_channel.name}")
+                await message.publish()
+            except discord.Forbidden:
+                logging.warning(f"Impossible de publier le message dans le salon d'annonce {discord_channel.name}")
 
     @app_commands.command(name="set_alert", description="Ajoute une chaîne YouTube à surveiller.")
     async def set_alert(self, interaction: discord.Interaction, channel_id: str, channel_name: str, notif_channel: discord.TextChannel):
@@ -105,6 +166,7 @@ class YouTubeNotifier(commands.Cog):
             "latest_video_url": "none",
             "latest_short_url": "none",
             "notifying_discord_channel": str(notif_channel.id),  # ✅ Utilisation du salon défini
+            "guild_id": interaction.guild_id,
             "video_role_id": None,
             "short_role_id": None,
             "twitch_role_id": None
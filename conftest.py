@@ -0,0 +1 @@
+# Racine du dépôt dans sys.path : les tests importent les modules du bot comme start.py le fait
@@ -0,0 +1,116 @@
+"""
+Outils partagés par les cogs de modération : analyse des durées (1d, 2h30m, 0s...).
+
+Les durées sont des convertisseurs utilisables directement comme annotations de commandes hybrides :
+commands.Converter pour les commandes à préfixe, app_commands.Transformer (avec autocomplétion) pour les
+commandes slash. La validation (format, bornes) et la conversion en secondes se font en une seule étape, et
+le résultat de l'analyse est mémorisé (les mêmes valeurs reviennent sans cesse : 1h, 1d, 7d...).
+"""
+import re
+from functools import lru_cache
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+DURATION_FORMAT = re.compile(r"(?:\d+[smhd])+") # La chaîne entière doit respecter le format
+DURATION_PATTERN = re.compile(r"(\d+)([smhd])")
+UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+UNIT_NAMES = (("j", 86400), ("h", 3600), ("min", 60), ("s", 1))
+MAX_DELETE_MESSAGES = 604800 # 7 jours, limite imposée par Discord
+SUGGESTED_UNITS = ("m", "h", "d")
+
+
+@lru_cache(maxsize=512)
+def parse_duration(duration: str) -> int | None:
+    """Convertit une durée (ex: 1d, 2h30m, 0s) en secondes ; None si le format est invalide."""
+    text = duration.strip().lower()
+    if text in ("0", "0s"):
+        return 0
+    if not DURATION_FORMAT.fullmatch(text):
+        return None
+    return sum(int(value) * UNIT_SECONDS[unit] for value, unit in DURATION_PATTERN.findall(text))
+
+
+def format_duration(seconds: int) -> str:
+    """Affichage lisible d'une durée en secondes (ex: 2 h 30 min)."""
+    if seconds <= 0:
+        return "0 s"
+    parts = []
+    for name, size in UNIT_NAMES:
+        value, seconds = divmod(seconds, size)
+        if value:
+            parts.append(f"{value} {name}")
+    return " ".join(parts)
+
+
+class InvalidDuration(commands.BadArgument):
+    """Durée invalide ou hors bornes ; le message est destiné à l'utilisateur."""
+
+
+def duration_error_message(error: Exception) -> str | None:
+    """Message d'une durée invalide, que l'erreur vienne d'une commande à préfixe ou d'une commande slash."""
+    error = getattr(error, "original", error) # HybridCommandError
+    if isinstance(error, app_commands.TransformerError):
+        error = error.__cause__
+    return str(error) if isinstance(error, InvalidDuration) else None
+
+
+class Duration(commands.Converter, app_commands.Transformer):
+    """Durée en secondes, bornée. Les sous-classes fixent les bornes et le message d'erreur."""
+    min_seconds = 1
+    max_seconds = None
+    aliases = {} # {texte: secondes} acceptés en plus du format standard
+    presets = ("10m", "1h", "1d", "7d")
+    error_message = "❌ Format de durée invalide. Utilisez `s` (secondes), `m` (minutes), `h` (heures), `d` (jours). Ex: `1d`, `2h30m`."
+
+    def parse(self, argument: str) -> int:
+        seconds = self.aliases.get(argument.strip().lower())
+        if seconds is None:
+            seconds = parse_duration(argument)
+        if seconds is None or not self.in_bounds(seconds):
+            raise InvalidDuration(self.error_message)
+        return seconds
+
+    def in_bounds(self, seconds: int) -> bool:
+        return seconds >= self.min_seconds and (self.max_seconds is None or seconds <= self.max_seconds)
+
+    async def convert(self, ctx: commands.Context, argument: str) -> int:
+        return self.parse(argument)
+
+    async def transform(self, interaction: discord.Interaction, value: str) -> int:
+        return self.parse(value)
+
+    async def autocomplete(self, interaction: discord.Interaction, value: str) -> list[app_commands.Choice[str]]:
+        value = value.strip().lower()
+        if not value:
+            candidates = list(self.presets)
+        elif value.isdigit():
+            # "3" -> 3m, 3h, 3d
+            candidates = [f"{value}{unit}" for unit in SUGGESTED_UNITS]
+        else:
+            candidates = [value]
+        choices = []
+        for candidate in candidates:
+            seconds = self.aliases.get(candidate, parse_duration(candidate))
+            if seconds is not None and self.in_bounds(seconds):
+                choices.append(app_commands.Choice(name=f"{candidate} ({format_duration(seconds)})", value=candidate))
+        return choices[:25]
+
+
+class BanDuration(Duration):
+    """Durée d'un ban temporaire."""
+
+
+class DeleteMessagesDuration(Duration):
+    """Ancienneté des messages à supprimer lors d'un ban (0 à 7 jours)."""
+    min_seconds = 0
+    max_seconds = MAX_DELETE_MESSAGES
+    aliases = {"all": MAX_DELETE_MESSAGES} # Discord ne permet pas plus de 7 jours
+    presets = ("0s", "1h", "1d", "7d")
+    error_message = "❌ Durée de suppression de messages invalide ou supérieure à 7 jours. Utilisez `s`, `m`, `h`, `d` (ex: `1d`, `2h30m`, `0s`)."
+
+
+class JoinWindow(Duration):
+    """Fenêtre d'arrivée des membres ciblés par une sanction groupée."""
+    presets = ("5m", "15m", "1h", "1d")
+    error_message = "❌ Format de durée invalide pour `joined_within`. Utilisez `s`, `m`, `h`, `d` (ex: `10m`, `1h`)."
@@ -0,0 +1,84 @@
+"""
+File de tâches différées partagée : un tas (min-heap) trié par échéance, traité par une seule tâche asyncio.
+
+Remplace le schéma "une tâche qui dort par élément" : les jobs arrivés à échéance en même temps (à
+`batch_window` secondes près) sont passés ensemble au handler, qui peut les traiter en une seule requête.
+L'annulation est paresseuse : le job est oublié et son entrée dans le tas ignorée quand elle en sort.
+"""
+import time
+import heapq
+import asyncio
+import logging
+
+
+class DelayedJobQueue:
+    def __init__(self, handler, batch_window: float = 0.0, name: str = "jobs"):
+        self.handler = handler # async handler(list[(clé, données)])
+        self.batch_window = batch_window
+        self.name = name
+        self.heap = [] # [(échéance, numéro, clé)]
+        self.jobs = {} # {clé: (échéance, numéro, données)} ; une clé n'a qu'un job actif
+        self.counter = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def schedule(self, key, due: float, data=None):
+        """Planifie (ou replanifie) le job `key` à l'horodatage `due` (secondes, time.time())."""
+        self.counter += 1
+        self.jobs[key] = (due, self.counter, data)
+        heapq.heappush(self.heap, (due, self.counter, key))
+        if self.heap[0][1] == self.counter:
+            self.wakeup.set() # Nouvelle échéance la plus proche : la boucle doit recalculer son attente
+
+    def schedule_in(self, key, delay: float, data=None):
+        self.schedule(key, time.time() + delay, data)
+
+    def cancel(self, key):
+        self.jobs.pop(key, None)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    def is_current(self, entry) -> bool:
+        due, number, key = entry
+        job = self.jobs.get(key)
+        return job is not None and job[1] == number
+
+    async def run(self):
+        while True:
+            # Entrées annulées ou remplacées en tête du tas
+            while self.heap and not self.is_current(self.heap[0]):
+                heapq.heappop(self.heap)
+
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            limit = time.time() + self.batch_window
+            batch = []
+            while self.heap and self.heap[0][0] <= limit:
+                entry = heapq.heappop(self.heap)
+                if self.is_current(entry):
+                    batch.append((entry[2], self.jobs.pop(entry[2])[2]))
+            if not batch:
+                continue
+            try:
+                await self.handler(batch)
+            except Exception as e:
+                logging.error(f"Erreur lors du traitement d'un lot de {len(batch)} tâche(s) '{self.name}' : {e}")
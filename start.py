@@ -1,32 +1,141 @@
 import os
+import asyncio
+import time
+import json
+import hashlib
 from dotenv import load_dotenv
 import discord
 from discord.ext import commands
 from discord import app_commands
+from pymongo import MongoClient
 import logging
-from logging.handlers import RotatingFileHandler
+from cluster import ClusterNode
+from bot_config import EXTENSION_WAVES, DEFERRED_EXTENSIONS, all_extensions, get_profile_name, build_client_options, format_memory_report
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import queue
+import atexit
+
+load_dotenv()
 
 # --- Configuration avancée du logging ---
-# 1. Créer le logger principal
+# Les cogs appellent logging.info(...) depuis la boucle d'événements : ils ne font que déposer l'entrée
+# dans une file. Le formatage et les écritures (console PuTTY, fichier) se font dans le thread du QueueListener,
+# pour qu'un disque lent ou une console bloquée ne retarde jamais le traitement des événements Discord.
+#
+# Variables d'environnement (optionnelles) :
+# - LOG_LEVELS : niveaux par module, ex. "xp_system=WARNING,tempban=DEBUG,discord=WARNING"
+# - LOG_SAMPLE_RATES : n'écrit qu'une ligne sur N pour une catégorie, ex. "xp_gain=20"
+# - LOG_FORMAT : "json" pour une sortie structurée (une ligne JSON par entrée)
+DEFAULT_LOG_LEVEL = logging.INFO
+DEFAULT_SAMPLE_RATES = {"xp_gain": 10}
+
+
+def parse_log_mapping(value: str) -> dict:
+    """Convertit "a=1,b=2" en {"a": "1", "b": "2"}."""
+    mapping = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        key, _, val = item.partition("=")
+        mapping[key.strip()] = val.strip()
+    return mapping
+
+
+class ModuleLevelFilter(logging.Filter):
+    """Applique un niveau minimal par module (nom du fichier, ex. "xp_system") ou par logger (ex. "discord")."""
+    def __init__(self, overrides: dict, default_level: int):
+        super().__init__()
+        self.overrides = overrides
+        self.default_level = default_level
+
+    def filter(self, record):
+        level = self.overrides.get(record.module)
+        if level is None:
+            level = self.overrides.get(record.name.split(".")[0], self.default_level)
+        return record.levelno >= level
+
+
+class SamplingFilter(logging.Filter):
+    """N'écrit qu'une entrée sur N pour les lignes marquées extra={"sample_key": ...} (jamais pour WARNING et plus)."""
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self.counters = {}
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        rate = self.rates.get(key, 1)
+        if key is None or rate <= 1 or record.levelno >= logging.WARNING:
+            return True
+        count = self.counters.get(key, 0)
+        self.counters[key] = count + 1
+        if count % rate:
+            return False
+        record.msg = f"{record.getMessage()} (échantillon 1/{rate})"
+        record.args = None
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler qui ne formate pas dans la boucle d'événements (le formatage est fait par le listener)."""
+    def prepare(self, record):
+        # On fige seulement le message (les arguments peuvent changer après l'appel)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "module": record.module,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+# 1. Niveaux par module et échantillonnage
+level_overrides = {name: logging.getLevelName(level.upper()) for name, level in parse_log_mapping(os.getenv("LOG_LEVELS", "")).items()}
+level_overrides = {name: level for name, level in level_overrides.items() if isinstance(level, int)}
+sample_rates = dict(DEFAULT_SAMPLE_RATES)
+sample_rates.update({key: int(rate) for key, rate in parse_log_mapping(os.getenv("LOG_SAMPLE_RATES", "")).items() if rate.isdigit()})
+
+# 2. Créer le logger principal (niveau le plus bas demandé, le filtre applique ensuite le niveau de chaque module)
 logger = logging.getLogger()
-logger.setLevel(logging.INFO) # Niveau de log minimal à traiter
+logger.setLevel(min([DEFAULT_LOG_LEVEL, *level_overrides.values()]))
 
-# 2. Créer un formateur pour uniformiser le style des logs
-log_format = logging.Formatter('%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s', datefmt='%d-%m-%Y %H:%M:%S')
+# 3. Créer un formateur pour uniformiser le style des logs
+if os.getenv("LOG_FORMAT", "").lower() == "json":
+    log_format = JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S')
+else:
+    log_format = logging.Formatter('%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s', datefmt='%d-%m-%Y %H:%M:%S')
 
-# 3. Créer un handler pour la console (ce que tu vois dans PuTTY)
+# 4. Créer un handler pour la console (ce que tu vois dans PuTTY)
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(log_format)
-logger.addHandler(console_handler)
 
-# 4. Créer un handler pour les fichiers rotatifs (pour l'historique)
+# 5. Créer un handler pour les fichiers rotatifs (pour l'historique)
 # Crée jusqu'à 5 fichiers de 5MB chacun.
 file_handler = RotatingFileHandler('bot.log', maxBytes=5*1024*1024, backupCount=5, encoding='utf-8')
 file_handler.setFormatter(log_format)
-logger.addHandler(file_handler)
 
-load_dotenv()
+# 6. La file : seul DeferredQueueHandler est attaché au logger, les handlers réels tournent dans le listener
+log_queue = queue.SimpleQueue()
+queue_handler = DeferredQueueHandler(log_queue)
+queue_handler.addFilter(ModuleLevelFilter(level_overrides, DEFAULT_LOG_LEVEL))
+queue_handler.addFilter(SamplingFilter(sample_rates))
+logger.addHandler(queue_handler)
+
+log_listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop) # Vide la file avant l'arrêt du processus
+
 token = os.getenv('ASKAR_TOKEN')
+# Serveur de développement optionnel : les commandes y sont synchronisées (instantané) au lieu d'être globales
+dev_guild_id = os.getenv('DEV_GUILD_ID')
 
 # --- Gestionnaire d'erreurs pour les commandes d'application ---
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
@@ -41,24 +150,136 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
 
 
 class MyBot(commands.Bot):
-    async def setup_hook(self):
-        for extension in ['fun.random','fun.ping','fun.mimir','fun.poke','fun.sun','xp_system',
-                          'notifications.youtube_notifier', 'notifications.twitch_notifier',
-                          'twitch_follower', 'server.join_server', 'server.leave_server', 'moderation.kick',
-                          'moderation.ban', 'moderation.softban', 'moderation.tempban', 'moderation.unban',
-                          'moderation.warn', 'logs.log_core', 'logs.events_messages', 'logs.events_server',
-                          'logs.events_members', 'logs.events_voice', 'logs.events_commands']:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.startup_timings = {} # {extension: secondes}
+        self.deferred_load_task = None
+        self.ready_once = False # on_ready est rappelé à chaque reconnexion à la gateway
+
+    async def load_timed_extension(self, extension: str):
+        """Charge une extension et mesure le temps passé (import + setup + cog_load)."""
+        start = time.perf_counter()
+        try:
             await self.load_extension(f'cogs.{extension}')
-            logging.info(f'Loaded: cogs.{extension}')
+        finally:
+            self.startup_timings[extension] = time.perf_counter() - start
+        logging.info(f'Loaded: cogs.{extension} ({self.startup_timings[extension] * 1000:.0f} ms)')
+
+    async def load_extension_wave(self, extensions: list[str]) -> list[Exception]:
+        """Charge un groupe d'extensions en parallèle et retourne les erreurs rencontrées."""
+        results = await asyncio.gather(*(self.load_timed_extension(ext) for ext in extensions), return_exceptions=True)
+        errors = []
+        for extension, result in zip(extensions, results):
+            if isinstance(result, Exception):
+                logging.error(f'Échec du chargement de cogs.{extension} :', exc_info=result)
+                errors.append(result)
+        return errors
+
+    async def load_deferred_extensions(self):
+        await self.load_extension_wave(DEFERRED_EXTENSIONS)
+        self.log_startup_report(DEFERRED_EXTENSIONS, title="extensions différées")
+
+    def log_startup_report(self, extensions: list[str], title: str, total: float = None):
+        """Affiche le temps de chargement de chaque extension, de la plus lente à la plus rapide."""
+        timings = sorted(((ext, self.startup_timings.get(ext, 0.0)) for ext in extensions), key=lambda item: item[1], reverse=True)
+        lines = [f"  {ext:<32} {elapsed * 1000:>8.0f} ms" for ext, elapsed in timings]
+        header = f"Rapport de démarrage ({title})"
+        if total is not None:
+            header += f" - total {total * 1000:.0f} ms"
+        logging.info(header + "\n" + "\n".join(lines))
+
+    async def setup_hook(self):
+        # Élection du leader et canal inter-processus avant les cogs, qui en dépendent
+        await self.cluster.start()
+
+        start = time.perf_counter()
+        errors = []
+        for wave in EXTENSION_WAVES:
+            errors += await self.load_extension_wave(wave)
+
+        self.log_startup_report([ext for wave in EXTENSION_WAVES for ext in wave], title="extensions principales", total=time.perf_counter() - start)
+        if errors:
+            # Comme avant : une extension principale qui ne charge pas empêche le démarrage
+            raise errors[0]
+
+        self.deferred_load_task = asyncio.create_task(self.load_deferred_extensions())
+
+    def command_tree_hash(self, guild: discord.Object = None) -> str:
+        """Empreinte du schéma des commandes d'application (ce qui serait envoyé à Discord lors d'un sync)."""
+        payload = [command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)]
+        serialized = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    async def sync_command_tree(self):
+        """Synchronise l'arbre des commandes uniquement si son schéma a changé depuis le dernier sync."""
+        guild = None
+        if dev_guild_id:
+            guild = discord.Object(id=int(dev_guild_id))
+            self.tree.copy_global_to(guild=guild)
+        scope = f"guild:{guild.id}" if guild else "global"
+        tree_hash = self.command_tree_hash(guild)
+
+        # Clé propre à l'application : un bot de dev et un bot de prod sur la même base ne partagent pas l'empreinte
+        meta_id = f"command_tree:{self.application_id}:{scope}"
+        mongo_uri = os.getenv("MONGO_URI")
+        client = MongoClient(mongo_uri) if mongo_uri else None
+        collection = client["askar_bot"]["bot_meta"] if client else None
+        try:
+            try:
+                stored = await asyncio.to_thread(collection.find_one, {"_id": meta_id}) if collection is not None else None
+            except Exception as e:
+                logging.warning(f"Impossible de lire l'empreinte de l'arbre des commandes : {e}")
+                stored = None
+
+            if os.getenv("FORCE_TREE_SYNC") != "1" and stored and stored.get("hash") == tree_hash:
+                logging.info(f"Arbre des commandes inchangé ({scope}), synchronisation ignorée.")
+                return
+
+            synced = await self.tree.sync(guild=guild)
+            logging.info(f"Arbre des commandes synchronisé ({scope}) : {len(synced)} commande(s).")
+            if collection is not None:
+                try:
+                    await asyncio.to_thread(
+                        collection.update_one,
+                        {"_id": meta_id},
+                        {"$set": {"hash": tree_hash, "synced_at": time.time()}},
+                        upsert=True
+                    )
+                except Exception as e:
+                    logging.warning(f"Impossible d'enregistrer l'empreinte de l'arbre des commandes : {e}")
+        finally:
+            if client is not None:
+                client.close()
+
+    async def close(self):
+        await self.cluster.stop()
+        await super().close()
 
     async def on_ready(self):
-        await bot.tree.sync()
+        if self.ready_once:
+            # Simple reconnexion : rien à resynchroniser ni à réinitialiser
+            logging.info(f'Reconnecté à la gateway en tant que {self.user}.')
+            return
+        self.ready_once = True
+
+        # Les commandes des extensions différées doivent être présentes avant la synchronisation
+        if self.deferred_load_task and not self.deferred_load_task.done():
+            await self.deferred_load_task
+        try:
+            # L'arbre est global : un seul processus du cluster le synchronise
+            if self.cluster.cluster_id == 0:
+                await self.sync_command_tree()
+        except Exception as e:
+            logging.error(f"Erreur lors de la synchronisation de l'arbre des commandes : {e}")
         logging.info(f'STARTING BOT !')
         try:
             await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.playing, name =f"{bot.command_prefix}help"))
         except:
             logging.warning(f"Le status discord ne s'est pas initialisé correctement...")
 
+        member_count = sum(guild.member_count or 0 for guild in self.guilds)
+        logging.info(f"Profil de cache actif : '{profile_name}'.\n" + format_memory_report(member_count, len(self.guilds)))
+
         logging.info(f'Lancé en tant que {self.user} !')
         logging.info(f'Version de discord.py: {discord.__version__}')
         
@@ -74,8 +295,18 @@ class MyBot(commands.Bot):
         user = ctx.author
         logging.info(f"Commande '{ctx.prefix}{command_name}' utilisée par {user} (ID: {user.id})")
 
-intents = discord.Intents.all()
-bot = MyBot(command_prefix='.', intents=intents)
+class MyShardedBot(MyBot, commands.AutoShardedBot):
+    """Variante multi-shards utilisée par le lanceur cluster.py (une plage de shards par processus)."""
+
+
+# Plage de shards et pairs transmis par cluster.py (nœud autonome si lancé directement)
+cluster_node = ClusterNode.from_env()
+bot_class = MyBot if cluster_node.standalone else MyShardedBot
+
+# Intents et caches calculés selon le profil (variable BOT_PROFILE : full, standard, minimal)
+profile_name = get_profile_name()
+bot = bot_class(command_prefix='.', **build_client_options(profile_name, all_extensions()), **cluster_node.shard_options())
+bot.cluster = cluster_node
 
 # On attache le gestionnaire d'erreurs directement à l'arbre des commandes.
 bot.tree.on_error = on_app_command_error
@@ -0,0 +1,49 @@
+import pytest
+from moderation_utils import parse_duration, BanDuration, DeleteMessagesDuration, InvalidDuration, MAX_DELETE_MESSAGES
+from cogs.moderation.mass import split_targets
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("30s", 30),
+    ("10m", 600),
+    ("2h30m", 9000),
+    ("1d", 86400),
+    (" 1H ", 3600),
+])
+def test_parse_duration_accepts_full_match(text, seconds):
+    assert parse_duration(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["1d garbage", "1x2h", "-3d", "1d2", "30", "abc", ""])
+def test_parse_duration_rejects_junk(text):
+    assert parse_duration(text) is None
+
+
+@pytest.mark.parametrize("text", ["0", "0s"])
+def test_parse_duration_zero(text):
+    assert parse_duration(text) == 0
+
+
+def test_delete_messages_all_alias():
+    assert DeleteMessagesDuration().parse("all") == MAX_DELETE_MESSAGES
+    assert DeleteMessagesDuration().parse("ALL") == MAX_DELETE_MESSAGES
+
+
+def test_ban_duration_minimum():
+    assert BanDuration().parse("1s") == 1
+    with pytest.raises(InvalidDuration):
+        BanDuration().parse("0s")
+
+
+def test_delete_messages_maximum():
+    assert DeleteMessagesDuration().parse("0s") == 0
+    assert DeleteMessagesDuration().parse("7d") == MAX_DELETE_MESSAGES
+    with pytest.raises(InvalidDuration):
+        DeleteMessagesDuration().parse("7d1s")
+
+
+def test_split_targets():
+    targets, reason = split_targets("<@111111111111111111> 222222222222222222 raison du ban")
+    assert targets == "<@111111111111111111> 222222222222222222"
+    assert reason == "raison du ban"
+    assert split_targets("raid 111111111111111111") == ("", "raid 111111111111111111")
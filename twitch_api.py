@@ -0,0 +1,237 @@
+"""
+Client Helix minimal (aiohttp) pour les requêtes Twitch volumineuses.
+
+La bibliothèque twitchAPI n'expose pas les en-têtes de limite de débit : ce client réutilise son jeton
+d'application mais fait lui-même les requêtes, découpées en lots de 100 (limite de Helix), exécutées en
+parallèle sous un limiteur qui suit les en-têtes Ratelimit-Remaining / Ratelimit-Reset.
+L'URL de base est configurable (TWITCH_HELIX_URL) pour pointer vers un serveur de test local.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from types import SimpleNamespace
+import aiohttp
+
+HELIX_URL = os.getenv("TWITCH_HELIX_URL", "https://api.twitch.tv/helix")
+MAX_LOGINS_PER_REQUEST = 100 # Limite imposée par Helix pour user_login / login
+MAX_CONCURRENT_REQUESTS = 8
+REQUEST_TIMEOUT = 10 # secondes : un lot trop lent est abandonné pour ne pas dépasser le cycle d'une minute
+RATE_LIMIT_RESERVE = 5 # Points gardés en réserve pour les autres appels (commandes, twitchAPI)
+USER_CACHE_TTL = 6 * 3600 # Les profils (id, image) changent rarement
+USER_NEGATIVE_TTL = 10 * 60 # Un login inexistant est redemandé après ce délai (compte créé/renommé entre-temps)
+
+
+def chunked(items: list, size: int = MAX_LOGINS_PER_REQUEST) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def stream_from_json(data: dict) -> SimpleNamespace:
+    """Convertit un stream Helix en objet aux mêmes attributs que ceux de twitchAPI."""
+    stream = SimpleNamespace(**data)
+    stream.started_at = datetime.fromisoformat(data["started_at"].replace("Z", "+00:00"))
+    return stream
+
+
+def user_from_json(data: dict) -> SimpleNamespace:
+    return SimpleNamespace(id=data["id"], login=data["login"].lower(), display_name=data.get("display_name"),
+                           profile_image_url=data.get("profile_image_url"))
+
+
+class HelixRateLimiter:
+    """
+    Limite le nombre de requêtes simultanées et met en pause quand le seau de points Twitch est presque vide.
+    L'état du seau est mis à jour à chaque réponse à partir des en-têtes Ratelimit-*.
+    """
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_REQUESTS):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.lock = asyncio.Lock()
+        self.remaining = None # Inconnu tant qu'aucune réponse n'a été reçue
+        self.reset_at = 0.0
+
+    async def acquire(self):
+        await self.semaphore.acquire()
+        async with self.lock:
+            if self.remaining is not None and self.remaining <= RATE_LIMIT_RESERVE:
+                delay = self.reset_at - time.time()
+                if delay > 0:
+                    logging.warning(f"Limite de débit Twitch presque atteinte, pause de {delay:.1f}s.")
+                    await asyncio.sleep(delay)
+                self.remaining = None
+            elif self.remaining is not None:
+                self.remaining -= 1
+
+    def release(self, headers=None):
+        if headers is not None:
+            self.update(headers)
+        self.semaphore.release()
+
+    def update(self, headers):
+        try:
+            self.remaining = int(headers["Ratelimit-Remaining"])
+            self.reset_at = float(headers["Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            pass
+
+
+class HelixClient:
+    def __init__(self, twitch, base_url: str = HELIX_URL, limiter: HelixRateLimiter = None):
+        self.twitch = twitch # Instance twitchAPI authentifiée, utilisée pour le jeton d'application
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or HelixRateLimiter()
+        self.session = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def request(self, endpoint: str, params: list[tuple[str, str]] = None, method: str = "GET", json: dict = None) -> list[dict]:
+        """Requête sur Helix, retourne le champ "data" de la réponse."""
+        return (await self.request_payload(endpoint, params, method, json)).get("data", [])
+
+    async def request_payload(self, endpoint: str, params: list[tuple[str, str]] = None, method: str = "GET", json: dict = None) -> dict:
+        """Requête sur Helix ; réessaie une fois après un 429 (limite) ou un 401 (jeton expiré)."""
+        session = await self.get_session()
+        for attempt in range(2):
+            headers = {"Client-ID": self.twitch.app_id, "Authorization": f"Bearer {self.twitch.get_app_token()}"}
+            await self.limiter.acquire()
+            response_headers = None
+            try:
+                async with session.request(method, f"{self.base_url}/{endpoint}", params=params, json=json, headers=headers) as response:
+                    response_headers = response.headers
+                    if response.status == 429 and attempt == 0:
+                        continue
+                    if response.status == 401 and attempt == 0:
+                        await self.twitch.refresh_used_token()
+                        continue
+                    response.raise_for_status()
+                    if response.status == 204:
+                        return {}
+                    return await response.json()
+            finally:
+                # Le 429 met remaining à 0 : la tentative suivante attend la réinitialisation du seau
+                self.limiter.release(response_headers)
+        return {}
+
+    async def request_all(self, endpoint: str, params: list[tuple[str, str]] = None) -> list[dict]:
+        """Parcourt toutes les pages d'un point d'accès paginé (curseur "after")."""
+        params, items, cursor = list(params or []), [], None
+        while True:
+            payload = await self.request_payload(endpoint, params + ([("after", cursor)] if cursor else []))
+            items += payload.get("data", [])
+            cursor = payload.get("pagination", {}).get("cursor")
+            if not cursor:
+                return items
+
+    async def get_streams(self, logins: list[str]) -> tuple[dict, set]:
+        """
+        Récupère les streams en cours pour une liste de logins, par lots de 100 en parallèle.
+        Retourne ({login: stream}, logins des lots en échec) : un lot en erreur n'empêche pas les autres.
+        """
+        chunks = chunked(sorted(set(logins)))
+        results = await asyncio.gather(
+            *(self.request("streams", [("user_login", login) for login in chunk] + [("first", "100")]) for chunk in chunks),
+            return_exceptions=True
+        )
+
+        live_streams, failed_logins = {}, set()
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                logging.error(f"Échec d'un lot de {len(chunk)} streamers Twitch ({chunk[0]}...) : {result!r}")
+                failed_logins.update(chunk)
+                continue
+            for data in result:
+                live_streams[data["user_login"].lower()] = stream_from_json(data)
+        return live_streams, failed_logins
+
+
+class TwitchUserCache:
+    """
+    Cache partagé des utilisateurs Twitch (id, login, image de profil), avec TTL et cache négatif.
+    Les logins manquants sont demandés par lots de 100, et les demandes simultanées d'un même login
+    attendent la même requête au lieu d'en lancer une nouvelle.
+    """
+    def __init__(self, helix: HelixClient):
+        self.helix = helix
+        self.entries = {} # {login: (expire_à, utilisateur ou None si inexistant)}
+        self.pending = {} # {login: Future} requêtes en cours
+        self.tasks = set() # Références des requêtes lancées (une tâche non référencée peut être détruite)
+
+    async def get_users(self, logins: list[str]) -> dict:
+        """Retourne {login: utilisateur ou None} pour les logins demandés."""
+        now = time.monotonic()
+        result, waiting, to_fetch = {}, {}, []
+        for login in {login.lower() for login in logins}:
+            entry = self.entries.get(login)
+            if entry and entry[0] > now:
+                result[login] = entry[1]
+                continue
+            if login not in self.pending:
+                self.pending[login] = asyncio.get_running_loop().create_future()
+                to_fetch.append(login)
+            waiting[login] = self.pending[login]
+
+        if to_fetch:
+            # Tâche indépendante : si l'appelant est annulé, les autres demandeurs obtiennent quand même leur réponse
+            task = asyncio.create_task(self.fetch(to_fetch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        for login, future in waiting.items():
+            # shield : l'annulation d'un appelant ne doit pas annuler la requête partagée
+            result[login] = await asyncio.shield(future)
+        return result
+
+    async def get_user(self, login: str):
+        return (await self.get_users([login]))[login.lower()]
+
+    async def fetch(self, logins: list[str]):
+        futures = {login: self.pending[login] for login in logins}
+        error = None
+        try:
+            chunks = chunked(logins)
+            results = await asyncio.gather(
+                *(self.helix.request("users", [("login", login) for login in chunk]) for chunk in chunks),
+                return_exceptions=True
+            )
+            now = time.monotonic()
+            for chunk, result in zip(chunks, results):
+                if isinstance(result, BaseException):
+                    # Pas de mise en cache des erreurs : la prochaine demande réessaiera
+                    for login in chunk:
+                        futures[login].set_exception(result)
+                    continue
+                found = {user.login: user for user in map(user_from_json, result)}
+                for login in chunk:
+                    user = found.get(login)
+                    self.entries[login] = (now + (USER_CACHE_TTL if user else USER_NEGATIVE_TTL), user)
+                    futures[login].set_result(user)
+        except Exception as e:
+            error = e
+            logging.error(f"Erreur lors de la lecture des utilisateurs Twitch ({logins[0]}...) : {e!r}")
+        finally:
+            # Aucun demandeur ne doit rester bloqué : chaque Future est résolue (ou annulée) et retirée
+            for login, future in futures.items():
+                if self.pending.get(login) is future:
+                    del self.pending[login]
+                if not future.done():
+                    if error is None:
+                        future.cancel()
+                    else:
+                        future.set_exception(error)
+
+    def invalidate(self, login: str):
+        self.entries.pop(login.lower(), None)
+
+
+def get_user_cache(bot, helix: HelixClient) -> TwitchUserCache:
+    """Cache d'utilisateurs commun à tous les cogs Twitch, créé par le premier qui le demande."""
+    cache = getattr(bot, "twitch_users", None)
+    if cache is None:
+        cache = bot.twitch_users = TwitchUserCache(helix)
+    return cache
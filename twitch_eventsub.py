@@ -0,0 +1,351 @@
+"""
+Mode EventSub (webhook) pour la détection des lives Twitch.
+
+Twitch envoie stream.online / stream.offline en HTTP POST signé (HMAC-SHA256) vers TWITCH_EVENTSUB_CALLBACK.
+Le transport webhook est utilisé car il fonctionne avec le jeton d'application du bot (le transport
+websocket exige un jeton utilisateur). Variables d'environnement :
+  - TWITCH_EVENTSUB_CALLBACK : URL publique HTTPS (ex: https://bot.exemple.fr/eventsub), relayée vers le bot
+  - TWITCH_EVENTSUB_SECRET : secret de signature (10 à 100 caractères)
+  - TWITCH_EVENTSUB_PORT : port local d'écoute (8080 par défaut, + CLUSTER_ID en mode cluster)
+Sans ces variables, TwitchNotifier reste en mode polling.
+
+Test hors ligne :
+    python twitch_eventsub.py receive --port 8080                                    # récepteur seul, affiche les événements
+    python twitch_eventsub.py fake --port 8081 --callback http://127.0.0.1:8080/eventsub
+Le faux serveur émule les points d'accès Helix utilisés (users, streams, eventsub/subscriptions, avec en-têtes
+Ratelimit-*) ; TWITCH_HELIX_URL=http://127.0.0.1:8081/helix y redirige le bot. Taper "online <login>" ou
+"offline <login>" dans sa console envoie l'événement signé au récepteur.
+"""
+import os
+import sys
+import json
+import hmac
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from aiohttp import web
+import aiohttp
+
+EVENTSUB_TYPES = ("stream.online", "stream.offline")
+EVENTSUB_PATH = "/eventsub"
+DEFAULT_PORT = 8080
+MESSAGE_MAX_AGE = 600 # secondes : Twitch recommande de rejeter les messages plus anciens (rejeu)
+SEEN_MESSAGES_MAX = 1000 # Twitch peut renvoyer un même message, on garde les derniers IDs traités
+ACTIVE_STATUSES = ("enabled", "webhook_callback_verification_pending")
+
+
+def eventsub_config() -> dict | None:
+    """Configuration du mode EventSub depuis l'environnement, ou None si le mode n'est pas activé."""
+    callback = os.getenv("TWITCH_EVENTSUB_CALLBACK")
+    secret = os.getenv("TWITCH_EVENTSUB_SECRET")
+    if not callback or not secret:
+        return None
+    return {"callback": callback, "secret": secret, "port": int(os.getenv("TWITCH_EVENTSUB_PORT", DEFAULT_PORT))}
+
+
+def sign(secret: str, message_id: str, timestamp: str, body: bytes) -> str:
+    digest = hmac.new(secret.encode(), message_id.encode() + timestamp.encode() + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Horodatage EventSub (RFC3339, jusqu'à la nanoseconde) -> datetime UTC."""
+    value = value.rstrip("Z")
+    if "." in value:
+        seconds, fraction = value.split(".", 1)
+        value = f"{seconds}.{fraction[:6]}"
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+class EventSubReceiver:
+    """Serveur HTTP qui vérifie et décode les messages EventSub, puis appelle handler(type, event)."""
+    def __init__(self, secret: str, handler, port: int = DEFAULT_PORT, host: str = "0.0.0.0"):
+        self.secret = secret
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.seen = OrderedDict()
+        self.runner = None
+        self.tasks = set() # Traitements en cours (une tâche non référencée peut être détruite)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(EVENTSUB_PATH, self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logging.info(f"Récepteur EventSub à l'écoute sur le port {self.port}.")
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        message_id = request.headers.get("Twitch-Eventsub-Message-Id", "")
+        timestamp = request.headers.get("Twitch-Eventsub-Message-Timestamp", "")
+        signature = request.headers.get("Twitch-Eventsub-Message-Signature", "")
+
+        if not hmac.compare_digest(sign(self.secret, message_id, timestamp, body), signature):
+            logging.warning("EventSub : signature invalide, message rejeté.")
+            return web.Response(status=403)
+        try:
+            age = (datetime.now(timezone.utc) - parse_timestamp(timestamp)).total_seconds()
+        except ValueError:
+            return web.Response(status=400)
+        if age > MESSAGE_MAX_AGE:
+            logging.warning(f"EventSub : message {message_id} trop ancien ({int(age)}s), ignoré.")
+            return web.Response(status=204)
+        if message_id in self.seen:
+            return web.Response(status=204) # Renvoi d'un message déjà traité
+
+        payload = json.loads(body)
+        message_type = request.headers.get("Twitch-Eventsub-Message-Type")
+        if message_type == "webhook_callback_verification":
+            logging.info(f"EventSub : abonnement {payload['subscription']['type']} vérifié.")
+            return web.Response(text=payload["challenge"], content_type="text/plain")
+
+        self.seen[message_id] = True
+        if len(self.seen) > SEEN_MESSAGES_MAX:
+            self.seen.popitem(last=False)
+
+        if message_type == "revocation":
+            subscription = payload["subscription"]
+            logging.warning(f"EventSub : abonnement {subscription['type']} révoqué ({subscription['status']}), il sera recréé à la prochaine réconciliation.")
+        elif message_type == "notification":
+            # Réponse immédiate (Twitch attend une réponse en quelques secondes), traitement en arrière-plan
+            task = asyncio.create_task(self.dispatch(payload["subscription"]["type"], payload["event"]))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return web.Response(status=204)
+
+    async def dispatch(self, subscription_type: str, event: dict):
+        try:
+            await self.handler(subscription_type, event)
+        except Exception as e:
+            logging.error(f"EventSub : erreur lors du traitement de {subscription_type} : {e}")
+
+
+async def sync_subscriptions(helix, callback: str, secret: str, user_ids: set[str]):
+    """
+    Aligne les abonnements EventSub sur les streamers suivis : crée ceux qui manquent,
+    supprime ceux des streamers qui ne sont plus suivis ou en échec (révoqués, vérification ratée...).
+    """
+    existing = {}
+    for subscription in await helix.request_all("eventsub/subscriptions"):
+        if subscription["transport"].get("callback") != callback or subscription["type"] not in EVENTSUB_TYPES:
+            continue
+        key = (subscription["type"], subscription["condition"].get("broadcaster_user_id"))
+        if subscription["status"] in ACTIVE_STATUSES and key not in existing:
+            existing[key] = subscription["id"]
+        else:
+            existing[("obsolete", subscription["id"])] = subscription["id"]
+
+    wanted = {(subscription_type, user_id) for user_id in user_ids for subscription_type in EVENTSUB_TYPES}
+    to_create = wanted - existing.keys()
+    to_delete = [subscription_id for key, subscription_id in existing.items() if key not in wanted]
+
+    requests = [
+        helix.request("eventsub/subscriptions", method="POST", json={
+            "type": subscription_type,
+            "version": "1",
+            "condition": {"broadcaster_user_id": user_id},
+            "transport": {"method": "webhook", "callback": callback, "secret": secret},
+        })
+        for subscription_type, user_id in to_create
+    ] + [helix.request("eventsub/subscriptions", [("id", subscription_id)], method="DELETE") for subscription_id in to_delete]
+
+    results = await asyncio.gather(*requests, return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if to_create or to_delete:
+        logging.info(f"EventSub : {len(to_create)} abonnement(s) créé(s), {len(to_delete)} supprimé(s), {len(errors)} erreur(s).")
+    for error in errors[:5]:
+        logging.error(f"EventSub : échec d'une requête d'abonnement : {error!r}")
+
+
+# --- Outils de test hors ligne ---
+
+class FakeTwitch:
+    """Émule les points d'accès Helix utilisés par le bot et envoie des notifications EventSub signées."""
+    def __init__(self, callback: str, secret: str):
+        self.callback = callback
+        self.secret = secret
+        self.subscriptions = {} # {id: abonnement}
+        self.live = {} # {login: stream}
+        self.points = 800
+        self.reset_at = time.time() + 60
+        self.session = None
+        self.tasks = set() # Vérifications d'abonnement en cours
+
+    @staticmethod
+    def user_id(login: str) -> str:
+        return str(zlib.crc32(login.encode()))
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.rate_limit_headers])
+        app.router.add_get("/helix/users", self.get_users)
+        app.router.add_get("/helix/streams", self.get_streams)
+        app.router.add_get("/helix/eventsub/subscriptions", self.list_subscriptions)
+        app.router.add_post("/helix/eventsub/subscriptions", self.create_subscription)
+        app.router.add_delete("/helix/eventsub/subscriptions", self.delete_subscription)
+        return app
+
+    @web.middleware
+    async def rate_limit_headers(self, request, handler):
+        if time.time() > self.reset_at:
+            self.points, self.reset_at = 800, time.time() + 60
+        self.points = max(self.points - 1, 0)
+        response = await handler(request)
+        response.headers["Ratelimit-Limit"] = "800"
+        response.headers["Ratelimit-Remaining"] = str(self.points)
+        response.headers["Ratelimit-Reset"] = str(int(self.reset_at))
+        return response
+
+    async def get_users(self, request):
+        logins = request.query.getall("login", [])
+        return web.json_response({"data": [
+            {"id": self.user_id(login), "login": login, "display_name": login, "profile_image_url": f"https://example.invalid/{login}.png"}
+            for login in logins if not login.startswith("ghost")
+        ]})
+
+    async def get_streams(self, request):
+        logins = request.query.getall("user_login", [])
+        return web.json_response({"data": [self.live[login.lower()] for login in logins if login.lower() in self.live]})
+
+    async def list_subscriptions(self, request):
+        return web.json_response({"data": list(self.subscriptions.values()), "pagination": {}})
+
+    async def create_subscription(self, request):
+        body = await request.json()
+        subscription = {
+            "id": f"sub-{len(self.subscriptions) + 1}-{int(time.time() * 1000)}",
+            "status": "webhook_callback_verification_pending",
+            "type": body["type"],
+            "version": body["version"],
+            "condition": body["condition"],
+            "transport": {"method": "webhook", "callback": body["transport"]["callback"]},
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.subscriptions[subscription["id"]] = subscription
+        task = asyncio.create_task(self.verify(subscription))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.json_response({"data": [subscription]}, status=202)
+
+    async def delete_subscription(self, request):
+        self.subscriptions.pop(request.query.get("id"), None)
+        return web.Response(status=204)
+
+    async def post(self, message_type: str, payload: dict) -> tuple[int, str]:
+        """Envoie un message EventSub signé au récepteur, retourne (statut HTTP, corps)."""
+        body = json.dumps(payload).encode()
+        message_id = f"msg-{time.time_ns()}"
+        timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        headers = {
+            "Content-Type": "application/json",
+            "Twitch-Eventsub-Message-Id": message_id,
+            "Twitch-Eventsub-Message-Timestamp": timestamp,
+            "Twitch-Eventsub-Message-Signature": sign(self.secret, message_id, timestamp, body),
+            "Twitch-Eventsub-Message-Type": message_type,
+        }
+        async with self.session.post(self.callback, data=body, headers=headers) as response:
+            return response.status, await response.text()
+
+    async def verify(self, subscription: dict):
+        challenge = f"challenge-{time.time_ns()}"
+        try:
+            status, text = await self.post("webhook_callback_verification", {"challenge": challenge, "subscription": subscription})
+            verified = status == 200 and text == challenge
+        except aiohttp.ClientError:
+            verified = False
+        subscription["status"] = "enabled" if verified else "webhook_callback_verification_failed"
+        logging.info(f"Faux Twitch : abonnement {subscription['type']} {subscription['condition']} -> {subscription['status']}")
+
+    def start_stream(self, login: str):
+        """Met un streamer en live côté Helix, sans envoyer d'événement."""
+        login = login.lower()
+        self.live[login] = {
+            "id": str(time.time_ns()), "user_id": self.user_id(login), "user_login": login, "user_name": login,
+            "game_name": "Just Chatting", "type": "live", "title": f"Live de test de {login}",
+            "started_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "thumbnail_url": f"https://static-cdn.jtvnw.net/previews-ttv/live_user_{login}-{{width}}x{{height}}.jpg",
+        }
+
+    async def set_live(self, login: str, online: bool):
+        login = login.lower()
+        user_id = self.user_id(login)
+        if online:
+            self.start_stream(login)
+        else:
+            self.live.pop(login, None)
+
+        subscription_type = "stream.online" if online else "stream.offline"
+        targets = [s for s in self.subscriptions.values()
+                   if s["type"] == subscription_type and s["status"] == "enabled" and s["condition"].get("broadcaster_user_id") == user_id]
+        # Sans abonnement on envoie quand même l'événement, pour tester le récepteur seul
+        subscription = targets[0] if targets else {"id": "sub-test", "type": subscription_type, "version": "1", "status": "enabled",
+                                                   "condition": {"broadcaster_user_id": user_id}}
+        event = {"broadcaster_user_id": user_id, "broadcaster_user_login": login, "broadcaster_user_name": login}
+        if online:
+            event.update({"id": self.live[login]["id"], "type": "live", "started_at": self.live[login]["started_at"]})
+        started = time.perf_counter()
+        status, _ = await self.post("notification", {"subscription": subscription, "event": event})
+        logging.info(f"Faux Twitch : {subscription_type} {login} -> HTTP {status} en {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+async def run_fake(port: int, callback: str, secret: str):
+    fake = FakeTwitch(callback, secret)
+    fake.session = aiohttp.ClientSession()
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    logging.info(f"Faux Twitch sur http://127.0.0.1:{port}/helix, notifications vers {callback}. Commandes : online <login> | offline <login>")
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                await asyncio.Event().wait() # stdin fermé : on continue de servir Helix
+            parts = line.split()
+            if len(parts) == 2 and parts[0] in ("online", "offline"):
+                try:
+                    await fake.set_live(parts[1], parts[0] == "online")
+                except aiohttp.ClientError as e:
+                    logging.error(f"Faux Twitch : récepteur injoignable : {e}")
+    finally:
+        for task in fake.tasks:
+            task.cancel()
+        await fake.session.close()
+        await runner.cleanup()
+
+
+async def run_receiver(port: int, secret: str):
+    async def show(subscription_type, event):
+        logging.info(f"Événement reçu : {subscription_type} {event}")
+    receiver = EventSubReceiver(secret, show, port=port)
+    await receiver.start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%d-%m-%Y %H:%M:%S')
+    parser = argparse.ArgumentParser(description="Outils de test hors ligne du mode EventSub.")
+    parser.add_argument("mode", choices=["fake", "receive"])
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--callback", default=f"http://127.0.0.1:{DEFAULT_PORT}{EVENTSUB_PATH}")
+    parser.add_argument("--secret", default=os.getenv("TWITCH_EVENTSUB_SECRET", "secret-de-test-local"))
+    args = parser.parse_args()
+    try:
+        if args.mode == "fake":
+            asyncio.run(run_fake(args.port or 8081, args.callback, args.secret))
+        else:
+            asyncio.run(run_receiver(args.port or DEFAULT_PORT, args.secret))
+    except KeyboardInterrupt:
+        pass
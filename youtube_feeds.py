@@ -0,0 +1,180 @@
+"""
+Détection des nouvelles vidéos YouTube par le flux Atom public (feeds/videos.xml?channel_id=...), sans quota.
+
+Les flux sont demandés via une session aiohttp partagée (connexions réutilisées, nombre limité), avec
+If-None-Match / If-Modified-Since : un flux inchangé coûte une réponse 304 vide. Le XML est analysé au fil de
+l'eau (XMLPullParser) et la lecture s'arrête dès que les premières entrées (les plus récentes) sont lues.
+
+Test hors ligne :
+    python youtube_feeds.py --port 8082
+puis YOUTUBE_FEED_URL=http://127.0.0.1:8082/feeds/videos.xml ; taper "upload <channel_id> [short]" dans la
+console du serveur publie une vidéo factice dans le flux de la chaîne.
+"""
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.etree.ElementTree import XMLPullParser
+from xml.sax.saxutils import escape
+import aiohttp
+from aiohttp import web
+
+FEED_URL = os.getenv("YOUTUBE_FEED_URL", "https://www.youtube.com/feeds/videos.xml")
+MAX_CONNECTIONS = 20
+REQUEST_TIMEOUT = 10
+CHUNK_SIZE = 4096
+ENTRIES_TO_READ = 3 # Les entrées sont triées de la plus récente à la plus ancienne
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+YT = "{http://www.youtube.com/xml/schemas/2015}"
+MEDIA = "{http://search.yahoo.com/mrss/}"
+
+
+def parse_entry(element) -> dict:
+    description = element.find(f"{MEDIA}group/{MEDIA}description")
+    return {
+        "video_id": element.findtext(f"{YT}videoId"),
+        "title": element.findtext(f"{ATOM}title", ""),
+        "description": (description.text or "") if description is not None else "",
+        "published_at": datetime.fromisoformat(element.findtext(f"{ATOM}published")),
+    }
+
+
+class FeedClient:
+    def __init__(self, base_url: str = FEED_URL):
+        self.base_url = base_url
+        self.session = None
+        self.validators = {} # {channel_id: (etag, last_modified)}
+        self.entries = {} # {channel_id: dernières entrées lues}, réutilisées sur un 304
+        self.stats = {"requests": 0, "not_modified": 0, "bytes": 0}
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=MAX_CONNECTIONS),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def latest_entries(self, channel_id: str) -> list[dict]:
+        """Retourne les entrées les plus récentes du flux d'une chaîne (les dernières connues si inchangé)."""
+        session = await self.get_session()
+        headers = {}
+        etag, last_modified = self.validators.get(channel_id, (None, None))
+        if channel_id in self.entries:
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        self.stats["requests"] += 1
+        async with session.get(self.base_url, params={"channel_id": channel_id}, headers=headers) as response:
+            if response.status == 304:
+                self.stats["not_modified"] += 1
+                return self.entries[channel_id]
+            response.raise_for_status()
+
+            parser = XMLPullParser(events=("end",))
+            entries = []
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                self.stats["bytes"] += len(chunk)
+                parser.feed(chunk)
+                for _, element in parser.read_events():
+                    if element.tag == f"{ATOM}entry":
+                        entries.append(parse_entry(element))
+                if len(entries) >= ENTRIES_TO_READ:
+                    break # Inutile de télécharger le reste du flux
+            if len(entries) < ENTRIES_TO_READ:
+                parser.close()
+                entries += [parse_entry(element) for _, element in parser.read_events() if element.tag == f"{ATOM}entry"]
+
+            self.validators[channel_id] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            self.entries[channel_id] = entries[:ENTRIES_TO_READ]
+            return self.entries[channel_id]
+
+    def take_stats(self) -> dict:
+        stats, self.stats = self.stats, {"requests": 0, "not_modified": 0, "bytes": 0}
+        return stats
+
+
+# --- Serveur de flux local pour les tests ---
+
+class FeedFixtureServer:
+    def __init__(self):
+        self.videos = {} # {channel_id: [(video_id, titre, date)]}, plus récente en premier
+
+    def render(self, channel_id: str) -> bytes:
+        entries = "".join(
+            f"""
+ <entry>
+  <id>yt:video:{video_id}</id>
+  <yt:videoId>{video_id}</yt:videoId>
+  <yt:channelId>{channel_id}</yt:channelId>
+  <title>{escape(title)}</title>
+  <link rel="alternate" href="https://www.youtube.com/watch?v={video_id}"/>
+  <published>{published.isoformat()}</published>
+  <media:group><media:title>{escape(title)}</media:title><media:description>{escape(title)}</media:description></media:group>
+ </entry>"""
+            for video_id, title, published in self.videos.get(channel_id, [])
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns:media="http://search.yahoo.com/mrss/" xmlns="http://www.w3.org/2005/Atom">\n'
+            f' <title>Chaîne {channel_id}</title>{entries}\n</feed>\n'
+        ).encode()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        channel_id = request.query.get("channel_id", "")
+        if channel_id not in self.videos:
+            return web.Response(status=404)
+        body = self.render(channel_id)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        last_modified = format_datetime(self.videos[channel_id][0][2] if self.videos[channel_id] else datetime(2020, 1, 1, tzinfo=timezone.utc), usegmt=True)
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag, "Last-Modified": last_modified})
+        return web.Response(body=body, content_type="application/atom+xml", headers={"ETag": etag, "Last-Modified": last_modified})
+
+    def upload(self, channel_id: str, short: bool = False):
+        video_id = hashlib.sha1(f"{channel_id}{time.time_ns()}".encode()).hexdigest()[:11]
+        title = f"Vidéo de test {video_id}" + (" #shorts" if short else "")
+        self.videos.setdefault(channel_id, []).insert(0, (video_id, title, datetime.now(timezone.utc).replace(microsecond=0)))
+        del self.videos[channel_id][15:] # Les flux YouTube contiennent les 15 dernières vidéos
+        logging.info(f"Flux local : {channel_id} a publié {video_id} ({'short' if short else 'vidéo'}).")
+
+
+async def run_fixture(port: int):
+    fixture = FeedFixtureServer()
+    app = web.Application()
+    app.router.add_get("/feeds/videos.xml", fixture.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    logging.info(f"Flux local sur http://127.0.0.1:{port}/feeds/videos.xml. Commande : upload <channel_id> [short]")
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            await asyncio.Event().wait()
+        parts = line.split()
+        if len(parts) in (2, 3) and parts[0] == "upload":
+            fixture.upload(parts[1], short=len(parts) == 3 and parts[2] == "short")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%d-%m-%Y %H:%M:%S')
+    parser = argparse.ArgumentParser(description="Serveur de flux YouTube local pour tester la détection par flux.")
+    parser.add_argument("--port", type=int, default=8082)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_fixture(args.port))
+    except KeyboardInterrupt:
+        pass
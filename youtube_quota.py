@@ -0,0 +1,105 @@
+"""
+Suivi du quota journalier de l'API YouTube Data (10 000 unités par défaut, remis à zéro à minuit, heure du Pacifique).
+
+Chaque appel est enregistré avec son coût dans askar_bot.youtube_quota (un document par jour de quota), ce qui
+permet de brider le polling selon ce qu'il reste, de garder une réserve pour les commandes (ajout de chaîne)
+et d'estimer l'heure d'épuisement.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception: # Base de fuseaux absente (Windows sans tzdata)
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+COMMAND_RESERVE = 500 # Unités que le polling ne peut pas consommer (ajouts de chaînes, tests)
+TIGHT_THRESHOLD = 0.2 # Sous 20 % restants, on évite les appels facultatifs
+# Coûts officiels par méthode (https://developers.google.com/youtube/v3/determine_quota_cost)
+METHOD_COSTS = {
+    "channels.list": 1,
+    "playlistItems.list": 1,
+    "videos.list": 1,
+    "search.list": 100,
+}
+
+
+def quota_day(moment: datetime = None) -> str:
+    moment = moment or datetime.now(timezone.utc)
+    return moment.astimezone(QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+
+def next_reset(moment: datetime = None) -> datetime:
+    local = (moment or datetime.now(timezone.utc)).astimezone(QUOTA_TIMEZONE)
+    return (local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class QuotaExceeded(Exception):
+    """Appel refusé car il entamerait la réserve ou dépasserait le quota du jour."""
+
+
+class QuotaLedger:
+    def __init__(self, collection, daily_quota: int = DAILY_QUOTA):
+        self.collection = collection
+        self.daily_quota = daily_quota
+        self.day = quota_day()
+        self.used = 0
+        self.calls = {} # {méthode: nombre d'appels}
+
+    async def refresh(self):
+        """Relit le compteur du jour (les autres processus du cluster consomment aussi le quota)."""
+        day = quota_day()
+        doc = await asyncio.to_thread(self.collection.find_one, {"_id": day})
+        self.day = day
+        self.used = doc.get("used", 0) if doc else 0
+        self.calls = doc.get("calls", {}) if doc else {}
+
+    def remaining(self) -> int:
+        if self.day != quota_day():
+            return self.daily_quota # Nouveau jour de quota, pas encore relu
+        return max(self.daily_quota - self.used, 0)
+
+    def is_tight(self) -> bool:
+        return self.remaining() < self.daily_quota * TIGHT_THRESHOLD
+
+    def check(self, method: str, use_reserve: bool = False):
+        reserve = 0 if use_reserve else COMMAND_RESERVE
+        if METHOD_COSTS.get(method, 1) > self.remaining() - reserve:
+            raise QuotaExceeded(f"Quota YouTube insuffisant pour {method} ({self.remaining()} unités restantes).")
+
+    async def charge(self, method: str):
+        cost = METHOD_COSTS.get(method, 1)
+        day = quota_day()
+        if day != self.day:
+            self.day, self.used, self.calls = day, 0, {}
+        self.used += cost
+        self.calls[method] = self.calls.get(method, 0) + 1
+        try:
+            await asyncio.to_thread(
+                self.collection.update_one,
+                {"_id": day},
+                {"$inc": {"used": cost, f"calls.{method}": 1}},
+                upsert=True
+            )
+        except Exception as e:
+            logging.error(f"Impossible d'enregistrer la consommation de quota YouTube : {e}")
+
+    def hourly_allowance(self) -> float:
+        """Unités par heure que le polling peut dépenser pour tenir jusqu'à la remise à zéro."""
+        hours_left = max((next_reset() - datetime.now(timezone.utc)).total_seconds() / 3600, 1)
+        return max(self.remaining() - COMMAND_RESERVE, 0) / hours_left
+
+    def projected_exhaustion(self) -> datetime | None:
+        """Heure d'épuisement au rythme actuel, ou None si le quota tiendra jusqu'à la remise à zéro."""
+        now = datetime.now(timezone.utc)
+        day_start = next_reset(now) - timedelta(days=1)
+        elapsed_hours = (now - day_start).total_seconds() / 3600
+        if self.used == 0 or elapsed_hours <= 0:
+            return None
+        rate = self.used / elapsed_hours
+        exhaustion = now + timedelta(hours=self.remaining() / rate)
+        return exhaustion if exhaustion < next_reset(now) else None
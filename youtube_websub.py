@@ -0,0 +1,275 @@
+"""
+Mode WebSub (PubSubHubbub) pour les nouvelles vidéos YouTube.
+
+Le bot s'abonne auprès du hub pour le flux de chaque chaîne suivie ; le hub appelle ensuite l'URL de callback
+à chaque publication (corps Atom signé en HMAC avec le secret de l'abonnement). Les abonnements expirent
+(lease) et sont renouvelés peu avant l'échéance via la file de tâches différées. Variables d'environnement :
+  - YOUTUBE_WEBSUB_CALLBACK : URL publique (ex: https://bot.exemple.fr/websub), relayée vers le bot
+  - YOUTUBE_WEBSUB_SECRET : secret HMAC des notifications
+  - YOUTUBE_WEBSUB_PORT : port local d'écoute (8090 par défaut, + CLUSTER_ID en mode cluster)
+  - YOUTUBE_WEBSUB_HUB : URL du hub (celui de Google par défaut)
+Sans callback ni secret, YouTubeNotifier reste en mode polling.
+
+Test hors ligne :
+    python youtube_websub.py --port 8091
+puis YOUTUBE_WEBSUB_HUB=http://127.0.0.1:8091/subscribe ; taper "upload <channel_id>" dans la console du hub
+simulé envoie une notification signée à tous les abonnés de la chaîne.
+"""
+import os
+import sys
+import hmac
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from datetime import datetime, timezone
+from xml.etree.ElementTree import fromstring, ParseError
+from urllib.parse import urlparse, parse_qs
+import aiohttp
+from aiohttp import web
+from scheduler import DelayedJobQueue
+from youtube_feeds import ATOM, YT, parse_entry
+
+HUB_URL = os.getenv("YOUTUBE_WEBSUB_HUB", "https://pubsubhubbub.appspot.com/subscribe")
+TOPIC_URL = "https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
+WEBSUB_PATH = "/websub"
+DEFAULT_PORT = 8090
+LEASE_SECONDS = 5 * 24 * 3600 # Le hub de Google accorde au plus ~10 jours
+RENEW_MARGIN = 12 * 3600 # Renouvellement une demi-journée avant l'expiration
+
+
+def websub_config() -> dict | None:
+    """Configuration du mode WebSub depuis l'environnement, ou None si le mode n'est pas activé."""
+    callback = os.getenv("YOUTUBE_WEBSUB_CALLBACK")
+    secret = os.getenv("YOUTUBE_WEBSUB_SECRET")
+    if not callback or not secret:
+        return None
+    return {"callback": callback, "secret": secret, "port": int(os.getenv("YOUTUBE_WEBSUB_PORT", DEFAULT_PORT))}
+
+
+def topic_channel_id(topic: str) -> str | None:
+    return parse_qs(urlparse(topic).query).get("channel_id", [None])[0]
+
+
+def signature_matches(secret: str, body: bytes, header: str) -> bool:
+    """Vérifie l'en-tête X-Hub-Signature ("sha1=..." pour le hub de Google, sha256/sha512 acceptés)."""
+    algorithm, _, digest = header.partition("=")
+    if algorithm not in ("sha1", "sha256", "sha512") or not digest:
+        return False
+    expected = hmac.new(secret.encode(), body, getattr(hashlib, algorithm)).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+
+class WebSubSubscriber:
+    """Récepteur HTTP (vérifications du hub, notifications) et gestion des abonnements/leases."""
+    def __init__(self, callback: str, secret: str, handler, port: int = DEFAULT_PORT, hub_url: str = HUB_URL, host: str = "0.0.0.0"):
+        self.callback = callback
+        self.secret = secret
+        self.handler = handler # async handler(channel_id, entrée du flux)
+        self.port = port
+        self.hub_url = hub_url
+        self.host = host
+        self.wanted = set() # Chaînes qui doivent être abonnées
+        self.leases = {} # {channel_id: expiration (time.time())}
+        self.renewals = DelayedJobQueue(self.renew, batch_window=60, name="renouvellements WebSub")
+        self.runner = None
+        self.session = None
+        self.tasks = set() # Traitements en cours (une tâche non référencée peut être détruite)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get(WEBSUB_PATH, self.verify)
+        app.router.add_post(WEBSUB_PATH, self.notify)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        self.renewals.start()
+        logging.info(f"Récepteur WebSub à l'écoute sur le port {self.port}.")
+
+    async def stop(self):
+        self.renewals.stop()
+        for task in self.tasks:
+            task.cancel()
+        if self.session:
+            await self.session.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+    # --- Abonnements ---
+
+    async def request(self, channel_id: str, mode: str):
+        data = {
+            "hub.callback": self.callback,
+            "hub.topic": TOPIC_URL.format(channel_id=channel_id),
+            "hub.mode": mode,
+            "hub.verify": "async",
+        }
+        if mode == "subscribe":
+            data.update({"hub.secret": self.secret, "hub.lease_seconds": str(LEASE_SECONDS)})
+        async with self.session.post(self.hub_url, data=data) as response:
+            if response.status not in (202, 204):
+                raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status, message=await response.text())
+
+    async def sync(self, channel_ids: set[str]):
+        """Abonne les chaînes suivies sans lease valide, désabonne celles qui ne sont plus suivies."""
+        now = time.time()
+        removed = self.wanted - channel_ids
+        self.wanted = set(channel_ids)
+        to_subscribe = [channel_id for channel_id in channel_ids if self.leases.get(channel_id, 0) <= now]
+        requests = [self.request(channel_id, "subscribe") for channel_id in to_subscribe]
+        requests += [self.request(channel_id, "unsubscribe") for channel_id in removed]
+        for channel_id in removed:
+            self.leases.pop(channel_id, None)
+            self.renewals.cancel(channel_id)
+
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if requests:
+            logging.info(f"WebSub : {len(to_subscribe)} abonnement(s) demandé(s), {len(removed)} désabonnement(s), {len(errors)} erreur(s).")
+        for error in errors[:5]:
+            logging.error(f"WebSub : échec d'une requête au hub : {error!r}")
+
+    async def renew(self, jobs: list[tuple]):
+        channel_ids = [channel_id for channel_id, _ in jobs if channel_id in self.wanted]
+        results = await asyncio.gather(*(self.request(channel_id, "subscribe") for channel_id in channel_ids), return_exceptions=True)
+        for channel_id, result in zip(channel_ids, results):
+            if isinstance(result, Exception):
+                # La lease n'est pas prolongée : la prochaine réconciliation réessaiera
+                logging.error(f"WebSub : renouvellement impossible pour {channel_id} : {result!r}")
+
+    # --- Récepteur ---
+
+    async def verify(self, request: web.Request) -> web.Response:
+        """Vérification d'intention du hub : on ne confirme que les abonnements qu'on a demandés."""
+        mode = request.query.get("hub.mode")
+        channel_id = topic_channel_id(request.query.get("hub.topic", ""))
+        challenge = request.query.get("hub.challenge")
+        if not challenge or not channel_id:
+            return web.Response(status=400)
+
+        if mode == "subscribe" and channel_id in self.wanted:
+            lease = int(request.query.get("hub.lease_seconds", LEASE_SECONDS))
+            self.leases[channel_id] = time.time() + lease
+            self.renewals.schedule_in(channel_id, max(lease - RENEW_MARGIN, lease / 2))
+            return web.Response(text=challenge, content_type="text/plain")
+        if mode == "unsubscribe" and channel_id not in self.wanted:
+            return web.Response(text=challenge, content_type="text/plain")
+        return web.Response(status=404)
+
+    async def notify(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if not signature_matches(self.secret, body, request.headers.get("X-Hub-Signature", "")):
+            # Le spec WebSub demande de répondre 2xx et d'ignorer le message
+            logging.warning("WebSub : signature invalide, notification ignorée.")
+            return web.Response(status=202)
+        try:
+            root = fromstring(body)
+        except ParseError:
+            return web.Response(status=400)
+
+        for element in root.iter(f"{ATOM}entry"):
+            channel_id = element.findtext(f"{YT}channelId")
+            if channel_id in self.wanted:
+                task = asyncio.create_task(self.dispatch(channel_id, parse_entry(element)))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        return web.Response(status=204)
+
+    async def dispatch(self, channel_id: str, entry: dict):
+        try:
+            await self.handler(channel_id, entry)
+        except Exception as e:
+            logging.error(f"WebSub : erreur lors du traitement d'une notification pour {channel_id} : {e}")
+
+
+# --- Hub simulé pour les tests ---
+
+class HubSimulator:
+    def __init__(self, lease_seconds: int):
+        self.lease_seconds = lease_seconds
+        self.subscriptions = {} # {(callback, channel_id): secret}
+        self.session = None
+        self.tasks = set() # Vérifications en cours
+
+    async def subscribe(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        callback, topic, mode = form.get("hub.callback"), form.get("hub.topic"), form.get("hub.mode")
+        channel_id = topic_channel_id(topic or "")
+        if not callback or not channel_id or mode not in ("subscribe", "unsubscribe"):
+            return web.Response(status=400)
+        task = asyncio.create_task(self.verify(callback, topic, channel_id, mode, form.get("hub.secret")))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.Response(status=202)
+
+    async def verify(self, callback: str, topic: str, channel_id: str, mode: str, secret: str):
+        challenge = hashlib.sha1(str(time.time_ns()).encode()).hexdigest()
+        params = {"hub.mode": mode, "hub.topic": topic, "hub.challenge": challenge, "hub.lease_seconds": str(self.lease_seconds)}
+        try:
+            async with self.session.get(callback, params=params) as response:
+                confirmed = response.status == 200 and await response.text() == challenge
+        except aiohttp.ClientError:
+            confirmed = False
+        if confirmed and mode == "subscribe":
+            self.subscriptions[(callback, channel_id)] = secret
+        elif confirmed:
+            self.subscriptions.pop((callback, channel_id), None)
+        logging.info(f"Hub simulé : {mode} {channel_id} -> {'confirmé' if confirmed else 'refusé'}")
+
+    async def upload(self, channel_id: str):
+        video_id = hashlib.sha1(f"{channel_id}{time.time_ns()}".encode()).hexdigest()[:11]
+        now = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">\n'
+            f' <entry><id>yt:video:{video_id}</id><yt:videoId>{video_id}</yt:videoId><yt:channelId>{channel_id}</yt:channelId>'
+            f'<title>Vidéo de test {video_id}</title><published>{now}</published><updated>{now}</updated></entry>\n</feed>\n'
+        ).encode()
+        for (callback, subscribed_channel), secret in list(self.subscriptions.items()):
+            if subscribed_channel != channel_id:
+                continue
+            signature = "sha1=" + hmac.new((secret or "").encode(), body, hashlib.sha1).hexdigest()
+            started = time.perf_counter()
+            try:
+                async with self.session.post(callback, data=body, headers={"Content-Type": "application/atom+xml", "X-Hub-Signature": signature}) as response:
+                    logging.info(f"Hub simulé : {video_id} -> {callback} HTTP {response.status} en {(time.perf_counter() - started) * 1000:.1f} ms")
+            except aiohttp.ClientError as e:
+                logging.error(f"Hub simulé : abonné injoignable ({callback}) : {e}")
+
+
+async def run_hub(port: int, lease_seconds: int):
+    hub = HubSimulator(lease_seconds)
+    hub.session = aiohttp.ClientSession()
+    app = web.Application()
+    app.router.add_post("/subscribe", hub.subscribe)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    logging.info(f"Hub simulé sur http://127.0.0.1:{port}/subscribe (lease {lease_seconds}s). Commande : upload <channel_id>")
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                await asyncio.Event().wait()
+            parts = line.split()
+            if len(parts) == 2 and parts[0] == "upload":
+                await hub.upload(parts[1])
+    finally:
+        for task in hub.tasks:
+            task.cancel()
+        await hub.session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%d-%m-%Y %H:%M:%S')
+    parser = argparse.ArgumentParser(description="Hub WebSub simulé pour tester le mode WebSub hors ligne.")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--lease", type=int, default=LEASE_SECONDS, help="Durée des leases accordées (secondes), courte pour tester le renouvellement")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_hub(args.port, args.lease))
+    except KeyboardInterrupt:
+        pass